@@ -5,29 +5,60 @@ Telegram Bot для скачивания видео/фото из соцсете
 
 # ==================== ИМПОРТЫ ====================
 import asyncio
+import copy
+import functools
+import ipaddress
 import json
 import logging
+import math
 import os
 import random
 import re
-from urllib.parse import quote
+import signal
+import time
+from urllib.parse import quote, urlsplit
 
 import aiohttp
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
+    BufferedInputFile,
     FSInputFile,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     KeyboardButton,
     ReplyKeyboardMarkup,
 )
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 import config
-
-# yt-dlp импортируется локально в функциях чтобы ускорить старт
+import metrics
+import progress
+import routing
+import tracing
+from circuit_breaker import CircuitBreakerRegistry
+from download_pool import DownloadScheduler, QueueFullError, run_ytdlp
+from fair_scheduler import FairScheduler
+from fsm_storage import create_fsm_storage
+from http_client import HttpSessionManager
+from job_queue import Job, JobQueue
+from job_store import RUNNING, JobStore
+from media_links import MediaLinkExtractor
+from provider_health import ProviderHealth
+from routing import detect_platform, get_timeout
+from result_cache import ResultCache
+from single_flight import SingleFlight
+from storage import InMemoryFile, RemoteFile, StorageFullError, StorageManager
+from telegram_sender import OutboundLimiter
+from traffic_recorder import TrafficRecorder
+from url_canonical import UrlCanonicalizer
+from racing import race
+
+# yt-dlp импортируется лениво (download_pool.run_ytdlp) чтобы ускорить старт
 
 # ==================== КОНФИГУРАЦИЯ ====================
 logging.basicConfig(level=logging.INFO)
@@ -37,20 +68,8 @@ logger = logging.getLogger(__name__)
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB для Telegram
 MIN_FILE_SIZE = 1024  # 1KB минимум
 FILENAME_MAX_LEN = 80  # Макс. длина имени файла
-TIMEOUT_DEFAULT = 90
-TIMEOUT_INSTAGRAM = 180
-TIMEOUT_TIKTOK = 120
-TIMEOUT_PINTEREST = 120
-TIMEOUT_FACEBOOK = 120
-
-# Паттерны платформ
-PLATFORM_PATTERNS = {
-    "tiktok": ["tiktok.com", "vt.tiktok.com", "vm.tiktok.com", "m.tiktok.com"],
-    "instagram": ["instagram.com"],
-    "pinterest": ["pinterest.com"],
-    "facebook": ["facebook.com", "fb.watch"],
-    "youtube": ["youtube.com", "youtu.be"],
-}
+QUEUE_FULL_MESSAGE = "❌ Бот перегружен, попробуйте через минуту"
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
 
 # Загрузка токена
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -69,7 +88,72 @@ if not TOKEN:
 
 # Инициализация бота
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
+
+# Все исходящие запросы к чатам - через лимиты Bot API (429 повторяются автоматически)
+outbound_limiter = OutboundLimiter()
+bot.session.middleware(outbound_limiter)
+dp = Dispatcher(storage=create_fsm_storage())
+
+# Общий пул HTTP-соединений (сессия создается в main()) с circuit breaker на хост
+circuit_breakers = CircuitBreakerRegistry()
+http_pool = HttpSessionManager(breakers=circuit_breakers)
+
+# Статистика зеркал для адаптивного порядка перебора (загружается в main())
+provider_health = ProviderHealth()
+
+# Кеш file_id уже отправленных файлов
+result_cache = ResultCache()
+
+# Каноничные ссылки и объединение одинаковых одновременных запросов
+url_canonicalizer = UrlCanonicalizer(http=http_pool)
+downloads_in_flight = SingleFlight()
+
+# Пул для блокирующих загрузок yt-dlp
+download_scheduler = DownloadScheduler()
+
+# Папки задач, квота диска и уборка брошенных файлов
+storage = StorageManager()
+
+# Очередь задач: обработчики ставят, воркеры (JOB_WORKERS на процесс) выполняют
+job_queue = JobQueue()
+
+# Журнал задач (статус, попытки, провайдеры) - для продолжения после перезапуска
+job_store = JobStore()
+
+# Справедливое распределение задач между пользователями и сообщения "#N в очереди"
+fair_scheduler = FairScheduler()
+queue_positions_shown: dict[str, int] = {}
+
+# Трассы задач (экспортер - из TRACING_EXPORTER)
+tracer = tracing.Tracer()
+
+# Запись трафика для benchmarks.replay (TRAFFIC_RECORD_ENABLED)
+traffic_recorder = TrafficRecorder()
+
+# Состояние пулов, очередей и кеша - снимается в момент запроса /metrics
+metrics.REGISTRY.gauge("savebot_ytdlp_queued", "Задачи yt-dlp в очереди пула", lambda: download_scheduler.queued)
+metrics.REGISTRY.gauge("savebot_ytdlp_running", "Задачи yt-dlp в работе", lambda: download_scheduler.running)
+metrics.REGISTRY.gauge(
+    "savebot_ytdlp_rejected_total", "Отказы пула yt-dlp из-за полной очереди",
+    lambda: download_scheduler.rejected, kind="counter",
+)
+metrics.REGISTRY.gauge("savebot_jobs_running", "Задачи в работе на этом узле", lambda: fair_scheduler.running)
+metrics.REGISTRY.gauge("savebot_jobs_pending", "Задачи, ждущие воркера на этом узле", fair_scheduler.pending)
+metrics.REGISTRY.gauge(
+    "savebot_jobs_failed_total", "Задачи, завершенные с ошибкой", lambda: job_queue.failed, kind="counter",
+)
+metrics.REGISTRY.gauge("savebot_downloads_in_flight", "Уникальные скачивания в процессе", downloads_in_flight.in_flight)
+metrics.REGISTRY.gauge(
+    "savebot_cache_hits_total", "Попадания в кеш file_id", lambda: result_cache.hits, kind="counter",
+)
+metrics.REGISTRY.gauge(
+    "savebot_cache_misses_total", "Промахи кеша file_id", lambda: result_cache.misses, kind="counter",
+)
+metrics.REGISTRY.gauge("savebot_cache_hit_ratio", "Доля попаданий в кеш file_id", result_cache.hit_ratio)
+metrics.REGISTRY.gauge(
+    "savebot_telegram_retries_total", "Повторы запросов к Telegram после 429",
+    lambda: outbound_limiter.retries, kind="counter",
+)
 
 
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
@@ -87,24 +171,60 @@ def _mask_proxy(proxy: str) -> str:
         return "(invalid proxy)"
 
 
-def detect_platform(url: str) -> str | None:
-    """Определяет платформу по URL."""
-    url_lower = url.lower()
-    for platform, patterns in PLATFORM_PATTERNS.items():
-        if any(p in url_lower for p in patterns):
-            return platform
-    return None
+def too_large_message(size: int | None = None) -> str:
+    """Сообщение о превышении лимита Telegram (size=None - точный размер неизвестен)."""
+    size_mb = f"{size/1024/1024:.1f}MB" if size else f"более {MAX_FILE_SIZE // (1024*1024)}MB"
+    return f"❌ Файл слишком большой ({size_mb}). Максимум: 50MB"
 
 
-def get_timeout(platform: str | None) -> int:
-    """Возвращает таймаут для платформы."""
-    timeouts = {
-        "instagram": TIMEOUT_INSTAGRAM,
-        "tiktok": TIMEOUT_TIKTOK,
-        "pinterest": TIMEOUT_PINTEREST,
-        "facebook": TIMEOUT_FACEBOOK,
-    }
-    return timeouts.get(platform, TIMEOUT_DEFAULT)
+def get_race_fanout(platform: str | None) -> int:
+    """Сколько зеркал опрашивать одновременно для платформы."""
+    if not config.RACE_ENABLED:
+        return 1
+    return config.RACE_FANOUT.get(platform, config.RACE_FANOUT_DEFAULT)
+
+
+def note_provider(provider: str):
+    """Текущий источник загрузки - в журнал задачи и в сообщение с прогрессом."""
+    job_store.note_provider(provider)
+    progress.report(provider=provider)
+
+
+def provider_step(provider: str):
+    """
+    Декоратор download_via_*: отмечает источник (журнал задачи, прогресс),
+    открывает span попытки и пишет в метрики попытку и ее длительность.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            note_provider(provider)
+            with tracing.span(f"provider:{provider}", provider=provider) as span, \
+                    metrics.PROVIDER_LATENCY.time(provider=provider):
+                try:
+                    success, result = await fn(*args, **kwargs)
+                except Exception:
+                    metrics.PROVIDER_ATTEMPTS.inc(provider=provider, result="error")
+                    raise
+                if span is not None and not success:
+                    span.fail(str(result))
+            metrics.PROVIDER_ATTEMPTS.inc(provider=provider, result="success" if success else "failure")
+            return success, result
+        return wrapper
+    return decorator
+
+
+def failure_reason(error: str) -> str:
+    """Причина неудачи для метрик по тексту ошибки для пользователя."""
+    if error == QUEUE_FULL_MESSAGE:
+        return "queue_full"
+    if "время ожидания" in error:
+        return "timeout"
+    if "слишком большой" in error:
+        return "too_large"
+    if "нет видео" in error or "не был скачан" in error or "слишком маленький" in error:
+        return "not_found"
+    return "error"
 
 
 def get_proxy_config():
@@ -122,31 +242,199 @@ def get_proxy_config():
 
 
 # ==================== API МЕТОДЫ СКАЧИВАНИЯ ====================
-async def download_from_direct_url(url: str, format_type: str, platform: str) -> tuple[bool, str]:
-    """Скачивает файл по прямой URL."""
+async def submit_ytdlp(platform: str | None, url: str, ydl_opts: dict, timeout: float) -> str:
+    """yt-dlp в пуле загрузок с прогрессом в сообщении и метриками. Возвращает путь к файлу."""
+    cancel_token = download_scheduler.new_cancel_token()
+    progress.attach(cancel_token.progress)
+    with tracing.span("yt-dlp", platform=platform) as span:
+        submitted = time.time()
+        try:
+            with metrics.STAGE_LATENCY.time(stage="download", provider="yt-dlp"):
+                file_path = await download_scheduler.submit(
+                    platform, run_ytdlp, url, ydl_opts, cancel_token,
+                    timeout=timeout, cancel_token=cancel_token
+                )
+        finally:
+            if span is not None:
+                # Фазы отмечает progress hook в процессе пула
+                phases = dict(cancel_token.progress)
+                started = phases.get("started_at")
+                download_started = phases.get("download_started_at")
+                download_finished = phases.get("download_finished_at")
+                now = time.time()
+                tracing.add_span("yt-dlp.queue", submitted, started or now)
+                tracing.add_span("yt-dlp.extract", started, download_started or now)
+                tracing.add_span("yt-dlp.download", download_started, download_finished or now)
+                tracing.add_span("yt-dlp.postprocess", download_finished, now)
+        if os.path.exists(file_path):
+            size = os.path.getsize(file_path)
+            metrics.BYTES_DOWNLOADED.inc(size, source="yt-dlp")
+            tracing.annotate(bytes=size)
+    return file_path
+
+
+async def read_prefix(stream: aiohttp.StreamReader, limit: int) -> bytes:
+    """Читает из потока не больше limit байт (меньше - только при конце потока)."""
+    buf = bytearray()
+    while len(buf) < limit:
+        chunk = await stream.read(limit - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+async def stream_to_file(response: aiohttp.ClientResponse, file_path: str, head: bytes = b"") -> int | None:
+    """
+    Пишет тело ответа на диск (head - уже прочитанное начало).
+    Возвращает число байт или None, если превышен MAX_FILE_SIZE (файл удаляется).
+    """
+    downloaded = len(head)
+    with open(file_path, 'wb') as f:
+        if head:
+            f.write(head)
+        if downloaded <= MAX_FILE_SIZE:
+            async for chunk in response.content.iter_chunked(config.DIRECT_DOWNLOAD_CHUNK_SIZE):
+                downloaded += len(chunk)
+                if downloaded > MAX_FILE_SIZE:
+                    break
+                f.write(chunk)
+                progress.report(downloaded, response.content_length)
+    
+    if downloaded > MAX_FILE_SIZE:
+        os.remove(file_path)
+        logger.info(f"Download aborted after {downloaded} bytes: over size limit")
+        return None
+    return downloaded
+
+
+async def receive_media(
+    response: aiohttp.ClientResponse, prefix: str, ext: str, head: bytes = b""
+) -> str | InMemoryFile | None:
+    """
+    Принимает тело ответа с медиа (head - уже прочитанное начало).
+    До SMALL_MEDIA_MAX_BYTES файл остается в памяти, больше - пишется
+    в tmpfs (если размер известен и помещается) или на диск.
+    None - превышен MAX_FILE_SIZE.
+    """
+    length = response.content_length
+    if length is None or length <= config.SMALL_MEDIA_MAX_BYTES:
+        buf = bytearray(head)
+        while len(buf) <= config.SMALL_MEDIA_MAX_BYTES:
+            chunk = await response.content.read(config.DIRECT_DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                return InMemoryFile(bytes(buf), f"{prefix}{ext}")
+            buf += chunk
+            progress.report(len(buf), length)
+        # Не поместилось в память - уже прочитанное уходит в начало файла
+        head = bytes(buf)
+    
+    file_path = storage.unique_path(prefix, ext, size_hint=length)
+    if await stream_to_file(response, file_path, head) is None:
+        return None
+    return file_path
+
+
+def media_size(media: str | InMemoryFile | RemoteFile) -> int:
+    """Размер файла на диске, в памяти или по ссылке (по Content-Length)."""
+    if isinstance(media, str):
+        return os.path.getsize(media)
+    return media.size
+
+
+def _is_public_host(host: str) -> bool:
+    """Telegram не достучится до localhost/частных адресов и хостов с привязкой ссылки к IP."""
+    if not host or host == "localhost":
+        return False
+    if any(host == h or host.endswith("." + h) for h in config.URL_PASSTHROUGH_EXCLUDED_HOSTS):
+        return False
+    try:
+        return ipaddress.ip_address(host).is_global
+    except ValueError:
+        return True
+
+
+async def probe_passthrough(url: str, format_type: str, platform: str | None) -> RemoteFile | None:
+    """
+    HEAD-проверка прямой ссылки: публичная, нужный тип и размер в пределах
+    лимита Telegram на загрузку по URL. Тогда файл не качаем - отдаем ссылку.
+    """
+    if not config.URL_PASSTHROUGH_ENABLED:
+        return None
+    if format_type == "jpg":
+        expected_type, max_size = "image/", config.URL_PASSTHROUGH_PHOTO_MAX_BYTES
+    else:
+        expected_type, max_size = "video/", config.URL_PASSTHROUGH_MAX_BYTES
+    
+    try:
+        async with http_pool.request(
+            "HEAD", url,
+            headers={'User-Agent': config.DESKTOP_USER_AGENT},
+            allow_redirects=True,
+            timeout=aiohttp.ClientTimeout(total=config.URL_PASSTHROUGH_HEAD_TIMEOUT)
+        ) as response:
+            final_url = str(response.url)
+            size = response.content_length
+            content_type = response.headers.get('Content-Type', '').lower()
+            if response.status != 200 or not size or not content_type.startswith(expected_type):
+                return None
+    except Exception as e:
+        logger.info(f"Passthrough HEAD failed: {str(e)[:100]}")
+        return None
+    
+    if not MIN_FILE_SIZE < size <= max_size or not _is_public_host(urlsplit(final_url).hostname or ""):
+        return None
+    logger.info(f"URL passthrough: {size} bytes via {urlsplit(final_url).netloc}")
+    return RemoteFile(final_url, size, platform)
+
+
+async def download_from_direct_url(
+    url: str, format_type: str, platform: str, passthrough: bool = True
+) -> tuple[bool, str | InMemoryFile | RemoteFile]:
+    """
+    Скачивает файл по прямой URL потоково.
+    Прерывается, как только размер превысит лимит Telegram (по Content-Length
+    еще до скачивания, иначе - по счетчику байт). Мелкие файлы - в памяти.
+    Если Telegram может забрать файл по ссылке сам - возвращает RemoteFile без скачивания.
+    """
+    if passthrough:
+        remote = await probe_passthrough(url, format_type, platform)
+        if remote:
+            return True, remote
+    
     try:
-        download_dir = os.path.join(os.path.expanduser("~"), "Downloads", "telegram_bot")
-        os.makedirs(download_dir, exist_ok=True)
-        
         ext = ".mp4" if format_type == "mp4" else ".jpg"
-        filename = f"{platform}_{hash(url) % 1000000}{ext}"
-        file_path = os.path.join(download_dir, filename)
         
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
-            async with session.get(url, headers={'User-Agent': config.DESKTOP_USER_AGENT}) as response:
+        with tracing.span("download", source=platform) as span, \
+                metrics.STAGE_LATENCY.time(stage="download", provider=platform):
+            async with http_pool.get(
+                url,
+                headers={'User-Agent': config.DESKTOP_USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=60)
+            ) as response:
                 if response.status != 200:
                     return False, f"❌ Ошибка: статус {response.status}"
                 
-                with open(file_path, 'wb') as f:
-                    async for chunk in response.content.iter_chunked(1024):
-                        f.write(chunk)
+                if response.content_length and response.content_length > MAX_FILE_SIZE:
+                    logger.info(f"Direct download skipped: Content-Length {response.content_length}")
+                    return False, too_large_message(response.content_length)
                 
-                if os.path.getsize(file_path) > MIN_FILE_SIZE:
-                    return True, file_path
+                media = await receive_media(response, platform, ext)
+                if media is None:
+                    return False, too_large_message()
+                
+                size = media_size(media)
+                metrics.BYTES_DOWNLOADED.inc(size, source="direct")
+                if span is not None:
+                    span.set(bytes=size)
+                if size > MIN_FILE_SIZE:
+                    return True, media
                 else:
-                    os.remove(file_path)
+                    if isinstance(media, str):
+                        os.remove(media)
                     return False, "❌ Файл слишком маленький"
     except Exception as e:
+        # Недокачанный файл удалится вместе с папкой задачи
         return False, f"❌ Ошибка: {str(e)}"
 
 
@@ -158,12 +446,13 @@ async def handle_redirect_url(
     if current_depth >= max_redirects:
         return False, f"❌ Слишком много редиректов для {platform}"
     
-    try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-            async with session.get(
+    with tracing.span("redirect", depth=current_depth, host=urlsplit(redirect_url).netloc):
+        try:
+            async with http_pool.get(
                 redirect_url,
                 headers={'User-Agent': config.DESKTOP_USER_AGENT},
-                allow_redirects=True
+                allow_redirects=True,
+                timeout=aiohttp.ClientTimeout(total=30)
             ) as response:
                 if response.status != 200:
                     return False, f"❌ Ошибка редиректа: статус {response.status}"
@@ -184,15 +473,16 @@ async def handle_redirect_url(
                 
                 # Поиск URL в ответе
                 content = await response.text()
-                video_urls = re.findall(r'https?://[^\s"\'<>]+\.(?:mp4|webm|jpg|jpeg|png)', content)
+                video_urls = routing.MEDIA_URL_RE.findall(content)
                 if video_urls:
                     return await download_from_direct_url(video_urls[0], format_type, platform)
                 
                 return False, "❌ Не удалось найти прямую ссылку"
-    except Exception as e:
-        return False, f"❌ Ошибка обработки редиректа: {str(e)}"
+        except Exception as e:
+            return False, f"❌ Ошибка обработки редиректа: {str(e)}"
 
 
+@provider_step("cobalt")
 async def download_via_cobalt(url: str, format_type: str) -> tuple[bool, str]:
     """Скачивает через Cobalt API."""
     cobalt_instances = [
@@ -216,38 +506,45 @@ async def download_via_cobalt(url: str, format_type: str) -> tuple[bool, str]:
         "youtubeVideoCodec": "h264",
     }
     
-    for api_url in cobalt_instances:
-        try:
-            logger.info(f"Trying Cobalt: {api_url}")
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-                async with session.post(api_url, headers=headers, json=payload) as response:
-                    logger.info(f"Cobalt {api_url} status: {response.status}")
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"Cobalt response: {data}")
+    async def resolve(api_url: str) -> str | None:
+        """Получает у инстанса прямую ссылку на медиа."""
+        logger.info(f"Trying Cobalt: {api_url}")
+        timeout = aiohttp.ClientTimeout(total=20)
+        async with http_pool.post(api_url, headers=headers, json=payload, timeout=timeout) as response:
+            logger.info(f"Cobalt {api_url} status: {response.status}")
+            if response.status == 200:
+                data = await response.json()
+                logger.info(f"Cobalt response: {data}")
+                if data.get("url"):
+                    return data["url"]
+                elif data.get("error"):
+                    logger.warning(f"Cobalt error: {data.get('error')}")
+            else:
+                text = await response.text()
+                logger.warning(f"Cobalt {api_url} failed: {response.status} - {text[:200]}")
+            
+            # Пробуем упрощенный payload
+            if response.status in (400, 422):
+                async with http_pool.post(api_url, headers=headers, json={"url": url}, timeout=timeout) as resp2:
+                    logger.info(f"Cobalt simple payload status: {resp2.status}")
+                    if resp2.status == 200:
+                        data = await resp2.json()
                         if data.get("url"):
-                            return await download_from_direct_url(data["url"], format_type, "cobalt")
-                        elif data.get("error"):
-                            logger.warning(f"Cobalt error: {data.get('error')}")
-                    else:
-                        text = await response.text()
-                        logger.warning(f"Cobalt {api_url} failed: {response.status} - {text[:200]}")
-                    
-                    # Пробуем упрощенный payload
-                    if response.status in (400, 422):
-                        async with session.post(api_url, headers=headers, json={"url": url}) as resp2:
-                            logger.info(f"Cobalt simple payload status: {resp2.status}")
-                            if resp2.status == 200:
-                                data = await resp2.json()
-                                if data.get("url"):
-                                    return await download_from_direct_url(data["url"], format_type, "cobalt")
-        except Exception as e:
-            logger.warning(f"Cobalt {api_url} exception: {str(e)}")
-            continue
+                            return data["url"]
+        return None
+    
+    winner = await race(
+        cobalt_instances, resolve,
+        fan_out=get_race_fanout(detect_platform(url)), name="Cobalt", health=provider_health
+    )
+    if winner:
+        _, media_url = winner
+        return await download_from_direct_url(media_url, format_type, "cobalt")
     
     return False, "SERVER_UNAVAILABLE"
 
 
+@provider_step("tikwm")
 async def download_via_tikwm(url: str) -> tuple[bool, str]:
     """
     Скачивает TikTok через TikWM API и другие альтернативы.
@@ -257,67 +554,72 @@ async def download_via_tikwm(url: str) -> tuple[bool, str]:
         logger.info("Trying TikWM API")
         payload = {'url': url, 'count': 1, 'cursor': 0, 'web': 1}
         
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-            async with session.post("https://www.tikwm.com/api/", data=payload) as response:
-                if response.status == 200:
-                    res_json = await response.json()
-                    if res_json.get('code') == 0:
-                        data = res_json.get('data', {})
-                        # Пробуем разные поля с видео
-                        video_url = (data.get('hdplay') or 
-                                    data.get('play') or 
-                                    data.get('wmplay') or 
-                                    data.get('video_0'))
-                        
-                        if video_url:
-                            if video_url.startswith('/'):
-                                video_url = "https://www.tikwm.com" + video_url
-                            logger.info(f"TikWM found video: {video_url[:60]}...")
-                            return await download_from_direct_url(video_url, "mp4", "tikwm")
-                        
-                        # Пробуем получить URL из других полей
-                        if 'images' in data:
-                            # Это может быть карусель фото
-                            logger.info("TikWM: found image carousel, not video")
-                else:
-                    logger.warning(f"TikWM returned {response.status}")
+        async with http_pool.post(
+            "https://www.tikwm.com/api/",
+            data=payload,
+            timeout=aiohttp.ClientTimeout(total=20)
+        ) as response:
+            if response.status == 200:
+                res_json = await response.json()
+                if res_json.get('code') == 0:
+                    data = res_json.get('data', {})
+                    # Пробуем разные поля с видео
+                    video_url = (data.get('hdplay') or 
+                                data.get('play') or 
+                                data.get('wmplay') or 
+                                data.get('video_0'))
+                    
+                    if video_url:
+                        if video_url.startswith('/'):
+                            video_url = "https://www.tikwm.com" + video_url
+                        logger.info(f"TikWM found video: {video_url[:60]}...")
+                        return await download_from_direct_url(video_url, "mp4", "tikwm")
+                    
+                    # Пробуем получить URL из других полей
+                    if 'images' in data:
+                        # Это может быть карусель фото
+                        logger.info("TikWM: found image carousel, not video")
+            else:
+                logger.warning(f"TikWM returned {response.status}")
     except Exception as e:
         logger.warning(f"TikWM error: {str(e)}")
     
     # SSSTik.io - другой надежный сервис
     try:
         logger.info("Trying SSSTik API")
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-            # Получаем токен
-            async with session.get("https://ssstik.io/ru") as token_resp:
-                if token_resp.status == 200:
-                    html = await token_resp.text()
-                    # Ищем токен в HTML
-                    import re
-                    token_match = re.search(r'name="_token" value="([^"]+)"', html)
-                    if token_match:
-                        token = token_match.group(1)
-                        
-                        # Делаем запрос на скачивание
-                        payload = {
-                            'id': url,
-                            'locale': 'ru',
-                            'tt': token
-                        }
-                        
-                        async with session.post(
-                            "https://ssstik.io/abc?url=dl",
-                            data=payload,
-                            headers={'User-Agent': config.DESKTOP_USER_AGENT}
-                        ) as dl_resp:
-                            if dl_resp.status == 200:
-                                dl_html = await dl_resp.text()
-                                # Ищем ссылку на видео
-                                video_match = re.search(r'href="(https?://[^"]+\.mp4[^"]*)"', dl_html)
-                                if video_match:
-                                    video_url = video_match.group(1)
-                                    logger.info(f"SSSTik found video URL")
-                                    return await download_from_direct_url(video_url, "mp4", "ssstik")
+        timeout = aiohttp.ClientTimeout(total=20)
+        # Получаем токен
+        async with http_pool.get("https://ssstik.io/ru", timeout=timeout) as token_resp:
+            if token_resp.status == 200:
+                html = await token_resp.text()
+                # Ищем токен в HTML
+                token_match = routing.SSSTIK_TOKEN_RE.search(html)
+                if token_match:
+                    token = token_match.group(1)
+                    
+                    # Делаем запрос на скачивание
+                    payload = {
+                        'id': url,
+                        'locale': 'ru',
+                        'tt': token
+                    }
+                    
+                    # Токен привязан к cookies страницы - передаем их явно
+                    async with http_pool.post(
+                        "https://ssstik.io/abc?url=dl",
+                        data=payload,
+                        headers={'User-Agent': config.DESKTOP_USER_AGENT},
+                        cookies=token_resp.cookies,
+                        timeout=timeout
+                    ) as dl_resp:
+                        if dl_resp.status == 200:
+                            dl_html = await dl_resp.text()
+                            # Ищем ссылку на видео
+                            video_match = routing.HREF_VIDEO_RE.search(dl_html)
+                            if video_match:
+                                video_url = video_match.group(1)
+                                logger.info(f"SSSTik found video URL")
+                                return await download_from_direct_url(video_url, "mp4", "ssstik")
     except Exception as e:
         logger.warning(f"SSSTik error: {str(e)}")
     
@@ -326,23 +628,26 @@ async def download_via_tikwm(url: str) -> tuple[bool, str]:
         logger.info("Trying SnapTik API")
         api_url = f"https://snaptik.app/abc?url={url}"
         
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-            async with session.get(api_url, headers={'User-Agent': config.DESKTOP_USER_AGENT}) as response:
-                if response.status == 200:
-                    text = await response.text()
-                    # Ищем video URL
-                    import re
-                    video_match = re.search(r'data-video-url="([^"]+)"', text)
-                    if video_match:
-                        video_url = video_match.group(1)
-                        logger.info(f"SnapTik found video URL")
-                        return await download_from_direct_url(video_url, "mp4", "snaptik")
+        async with http_pool.get(
+            api_url,
+            headers={'User-Agent': config.DESKTOP_USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=20)
+        ) as response:
+            if response.status == 200:
+                text = await response.text()
+                # Ищем video URL
+                video_match = routing.DATA_VIDEO_URL_RE.search(text)
+                if video_match:
+                    video_url = video_match.group(1)
+                    logger.info(f"SnapTik found video URL")
+                    return await download_from_direct_url(video_url, "mp4", "snaptik")
     except Exception as e:
         logger.warning(f"SnapTik error: {str(e)}")
     
     return False, "Все TikTok API не сработали"
 
 
+@provider_step("instagram_api")
 async def download_via_instagram_api(url: str, format_type: str) -> tuple[bool, str]:
     """
     Специализированные методы для Instagram.
@@ -351,69 +656,67 @@ async def download_via_instagram_api(url: str, format_type: str) -> tuple[bool,
     # DownloadGram API
     try:
         logger.info("Trying DownloadGram API")
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=25)) as session:
-            data = {"url": url, "action": "post"}
-            async with session.post(
-                "https://downloadgram.org/wp-json/aio-dl/data",
-                data=data,
-                headers={'User-Agent': config.DESKTOP_USER_AGENT, 'Referer': 'https://downloadgram.org/'}
-            ) as response:
-                if response.status == 200:
-                    try:
-                        result = await response.json()
-                        if result and 'data' in result:
-                            media_data = result['data']
-                            if isinstance(media_data, list) and len(media_data) > 0:
-                                # Берем первое медиа
-                                first_media = media_data[0]
-                                if 'url' in first_media:
-                                    media_url = first_media['url']
-                                    logger.info(f"DownloadGram found media")
-                                    return await download_from_direct_url(media_url, format_type, "downloadgram")
-                    except:
-                        # Пробуем найти URL в тексте
-                        text = await response.text()
-                        import re
-                        urls = re.findall(r'https?://[^\s"<>\']+\.(?:mp4|jpg|jpeg|png)', text)
-                        if urls:
-                            logger.info(f"DownloadGram found URL in text")
-                            return await download_from_direct_url(urls[0], format_type, "downloadgram")
+        data = {"url": url, "action": "post"}
+        async with http_pool.post(
+            "https://downloadgram.org/wp-json/aio-dl/data",
+            data=data,
+            headers={'User-Agent': config.DESKTOP_USER_AGENT, 'Referer': 'https://downloadgram.org/'},
+            timeout=aiohttp.ClientTimeout(total=25)
+        ) as response:
+            if response.status == 200:
+                try:
+                    result = await response.json()
+                    if result and 'data' in result:
+                        media_data = result['data']
+                        if isinstance(media_data, list) and len(media_data) > 0:
+                            # Берем первое медиа
+                            first_media = media_data[0]
+                            if 'url' in first_media:
+                                media_url = first_media['url']
+                                logger.info(f"DownloadGram found media")
+                                return await download_from_direct_url(media_url, format_type, "downloadgram")
+                except:
+                    # Пробуем найти URL в тексте
+                    text = await response.text()
+                    urls = routing.MEDIA_URL_RE.findall(text)
+                    if urls:
+                        logger.info(f"DownloadGram found URL in text")
+                        return await download_from_direct_url(urls[0], format_type, "downloadgram")
     except Exception as e:
         logger.warning(f"DownloadGram error: {str(e)}")
     
     # SnapInsta API
     try:
         logger.info("Trying SnapInsta API")
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=25)) as session:
-            data = {"url": url, "action": "post"}
-            headers = {
-                'User-Agent': config.DESKTOP_USER_AGENT,
-                'Referer': 'https://snapinsta.app/',
-                'X-Requested-With': 'XMLHttpRequest'
-            }
-            
-            async with session.post(
-                "https://snapinsta.app/action.php",
-                data=data,
-                headers=headers
-            ) as response:
-                if response.status == 200:
-                    text = await response.text()
-                    import re
-                    
-                    # Ищем ссылки на видео/фото
-                    video_match = re.search(r'href="(https?://[^"]+\.mp4[^"]*)"', text, re.IGNORECASE)
-                    if video_match:
-                        video_url = video_match.group(1)
-                        logger.info(f"SnapInsta found video")
-                        return await download_from_direct_url(video_url, format_type, "snapinsta")
-                    
-                    # Ищем фото
-                    photo_match = re.search(r'href="(https?://[^"]+\.(?:jpg|jpeg|png)[^"]*)"', text, re.IGNORECASE)
-                    if photo_match and format_type == "jpg":
-                        photo_url = photo_match.group(1)
-                        logger.info(f"SnapInsta found photo")
-                        return await download_from_direct_url(photo_url, format_type, "snapinsta")
+        data = {"url": url, "action": "post"}
+        headers = {
+            'User-Agent': config.DESKTOP_USER_AGENT,
+            'Referer': 'https://snapinsta.app/',
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+        
+        async with http_pool.post(
+            "https://snapinsta.app/action.php",
+            data=data,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=25)
+        ) as response:
+            if response.status == 200:
+                text = await response.text()
+                
+                # Ищем ссылки на видео/фото
+                video_match = routing.HREF_VIDEO_RE.search(text)
+                if video_match:
+                    video_url = video_match.group(1)
+                    logger.info(f"SnapInsta found video")
+                    return await download_from_direct_url(video_url, format_type, "snapinsta")
+                
+                # Ищем фото
+                photo_match = routing.HREF_PHOTO_RE.search(text)
+                if photo_match and format_type == "jpg":
+                    photo_url = photo_match.group(1)
+                    logger.info(f"SnapInsta found photo")
+                    return await download_from_direct_url(photo_url, format_type, "snapinsta")
     except Exception as e:
         logger.warning(f"SnapInsta error: {str(e)}")
     
@@ -421,36 +724,37 @@ async def download_via_instagram_api(url: str, format_type: str) -> tuple[bool,
     try:
         logger.info("Trying ImgInn redirect")
         # ImgInn позволяет смотреть посты без авторизации
-        shortcode = None
-        import re
-        match = re.search(r'/p/([^/]+)', url)
-        if match:
-            shortcode = match.group(1)
+        shortcode = routing.instagram_shortcode(url)
+        if shortcode:
             imginn_url = f"https://imginn.com/p/{shortcode}"
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20)) as session:
-                async with session.get(imginn_url, headers={'User-Agent': config.DESKTOP_USER_AGENT}) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        # Ищем видео
-                        video_match = re.search(r'src="(https?://[^"]+instagram[^"]+\.mp4[^"]*)"', html)
-                        if video_match:
-                            video_url = video_match.group(1)
-                            logger.info(f"ImgInn found video")
-                            return await download_from_direct_url(video_url, format_type, "imginn")
-                        
-                        # Ищем фото
-                        photo_match = re.search(r'src="(https?://[^"]+instagram[^"]+\.(?:jpg|jpeg)[^"]*)"', html)
-                        if photo_match and format_type == "jpg":
-                            photo_url = photo_match.group(1)
-                            logger.info(f"ImgInn found photo")
-                            return await download_from_direct_url(photo_url, format_type, "imginn")
+            async with http_pool.get(
+                imginn_url,
+                headers={'User-Agent': config.DESKTOP_USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=20)
+            ) as response:
+                if response.status == 200:
+                    html = await response.text()
+                    # Ищем видео
+                    video_match = routing.IMGINN_VIDEO_RE.search(html)
+                    if video_match:
+                        video_url = video_match.group(1)
+                        logger.info(f"ImgInn found video")
+                        return await download_from_direct_url(video_url, format_type, "imginn")
+                    
+                    # Ищем фото
+                    photo_match = routing.IMGINN_PHOTO_RE.search(html)
+                    if photo_match and format_type == "jpg":
+                        photo_url = photo_match.group(1)
+                        logger.info(f"ImgInn found photo")
+                        return await download_from_direct_url(photo_url, format_type, "imginn")
     except Exception as e:
         logger.warning(f"ImgInn error: {str(e)}")
     
     return False, "Instagram API не сработали"
 
 
+@provider_step("facebook_api")
 async def download_via_facebook_api(url: str, format_type: str) -> tuple[bool, str]:
     """
     Специализированные методы для Facebook.
@@ -467,38 +771,32 @@ async def download_via_facebook_api(url: str, format_type: str) -> tuple[bool, s
     for api in fb_apis:
         try:
             logger.info(f"Trying Facebook API: {api['url'][:50]}...")
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=25),
-                headers={'User-Agent': config.DESKTOP_USER_AGENT}
-            ) as session:
-                async with session.get(api['url'], allow_redirects=True) as response:
-                    final_url = str(response.url)
-                    
-                    # Если редиректнуло на видео файл
-                    if any(ext in final_url for ext in ['.mp4', '.webm']):
-                        logger.info(f"Facebook API redirected to video")
-                        return await download_from_direct_url(final_url, format_type, "facebook_direct")
-                    
-                    if response.status != 200:
-                        continue
-                    
-                    content = await response.text()
-                    
-                    # Ищем ссылки на видео
-                    video_patterns = [
-                        r'href="(https?://[^"]+facebook[^"]*\.mp4[^"]*)"',
-                        r'href="(https?://[^"]+video[^"]*\.mp4[^"]*)"',
-                        r'src="(https?://[^"]+\.mp4[^"]*)"',
-                        r'url["\']?\s*[:=]\s*["\'](https?://[^"\']+facebook[^"\']+)["\']',
-                    ]
-                    
-                    for pattern in video_patterns:
-                        matches = re.findall(pattern, content, re.IGNORECASE)
-                        for match in matches:
-                            if '.mp4' in match or 'video' in match.lower():
-                                if not any(x in match.lower() for x in ['login', 'auth', 'error']):
-                                    logger.info(f"Found Facebook video URL via pattern")
-                                    return await download_from_direct_url(match, format_type, "facebook_api")
+            async with http_pool.get(
+                api['url'],
+                headers={'User-Agent': config.DESKTOP_USER_AGENT},
+                allow_redirects=True,
+                timeout=aiohttp.ClientTimeout(total=25)
+            ) as response:
+                final_url = str(response.url)
+                
+                # Если редиректнуло на видео файл
+                if any(ext in final_url for ext in ['.mp4', '.webm']):
+                    logger.info(f"Facebook API redirected to video")
+                    return await download_from_direct_url(final_url, format_type, "facebook_direct")
+                
+                if response.status != 200:
+                    continue
+                
+                content = await response.text()
+                
+                # Ищем ссылки на видео
+                for pattern in routing.FACEBOOK_VIDEO_RES:
+                    matches = pattern.findall(content)
+                    for match in matches:
+                        if '.mp4' in match or 'video' in match.lower():
+                            if not any(x in match.lower() for x in ['login', 'auth', 'error']):
+                                logger.info(f"Found Facebook video URL via pattern")
+                                return await download_from_direct_url(match, format_type, "facebook_api")
         except Exception as e:
             logger.warning(f"Facebook API error: {str(e)[:100]}")
             continue
@@ -506,27 +804,14 @@ async def download_via_facebook_api(url: str, format_type: str) -> tuple[bool, s
     return False, "Facebook API не сработали"
 
 
+@provider_step("youtube_api")
 async def download_via_youtube_api(url: str, format_type: str) -> tuple[bool, str]:
     """
     Специализированные методы для YouTube.
     Использует реальные API для скачивания видео.
     """
-    import yt_dlp  # Для получения info и fallback
-    
     # Извлекаем video ID
-    patterns = [
-        r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',
-        r'(?:shorts\/)([0-9A-Za-z_-]{11})',
-        r'(?:youtu\.be\/)([0-9A-Za-z_-]{11})',
-    ]
-    
-    video_id = None
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            video_id = match.group(1)
-            break
-    
+    video_id = routing.youtube_video_id(url)
     if not video_id:
         return False, "Не удалось извлечь YouTube video ID"
     
@@ -552,62 +837,69 @@ async def download_via_youtube_api(url: str, format_type: str) -> tuple[bool, st
         'Accept': 'application/json',
     }
     
-    for api_url in youtube_apis:
-        try:
-            logger.info(f"Trying YouTube API: {api_url}")
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as session:
-                async with session.get(api_url, headers=headers) as response:
-                    if response.status != 200:
-                        logger.warning(f"API {api_url} returned {response.status}")
-                        continue
-                    
-                    content_type = response.headers.get('Content-Type', '')
-                    
-                    # Если вернулся прямой файл (редко, но бывает)
-                    if 'video/' in content_type or 'application/octet-stream' in content_type:
-                        logger.info(f"API returned direct video file")
-                        return await download_from_direct_url(api_url, format_type, "youtube_api")
-                    
-                    # JSON ответ
-                    if 'json' in content_type:
-                        data = await response.json()
-                        
-                        # Invidious формат
-                        if 'formatStreams' in data or 'adaptiveFormats' in data:
-                            formats = data.get('formatStreams', []) + data.get('adaptiveFormats', [])
-                            for fmt in formats:
-                                if 'url' in fmt and 'type' in fmt:
-                                    if 'video' in fmt['type'] and 'mp4' in fmt['type']:
-                                        logger.info(f"Found Invidious video URL")
-                                        return await download_from_direct_url(fmt['url'], format_type, "youtube_invidious")
-                        
-                        # Piped формат  
-                        if 'videoStreams' in data or 'audioStreams' in data:
-                            streams = data.get('videoStreams', [])
-                            if streams:
-                                # Берем первый поток (обычно есть URL)
-                                for stream in streams:
-                                    if stream.get('url'):
-                                        logger.info(f"Found Piped video URL")
-                                        return await download_from_direct_url(stream['url'], format_type, "youtube_piped")
-                        
-                        # YT LemnosLife - только info, но можем построить URL
-                        if 'items' in data:
-                            logger.info(f"YT API confirmed video exists, trying fallback")
-                            # Не дает прямой URL, но подтверждает что видео существует
-                            # Вернемся к yt-dlp с этим знанием
-                            
-        except Exception as e:
-            logger.warning(f"YouTube API {api_url} error: {str(e)}")
-            continue
+    async def resolve(api_url: str) -> tuple[str, str] | None:
+        """Возвращает (прямая ссылка, источник) от Invidious/Piped инстанса."""
+        logger.info(f"Trying YouTube API: {api_url}")
+        async with http_pool.get(
+            api_url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            if response.status != 200:
+                logger.warning(f"API {api_url} returned {response.status}")
+                return None
+            
+            content_type = response.headers.get('Content-Type', '')
+            
+            # Если вернулся прямой файл (редко, но бывает)
+            if 'video/' in content_type or 'application/octet-stream' in content_type:
+                logger.info(f"API returned direct video file")
+                return api_url, "youtube_api"
+            
+            # JSON ответ
+            if 'json' in content_type:
+                data = await response.json()
+                
+                # Invidious формат
+                if 'formatStreams' in data or 'adaptiveFormats' in data:
+                    formats = data.get('formatStreams', []) + data.get('adaptiveFormats', [])
+                    for fmt in formats:
+                        if 'url' in fmt and 'type' in fmt:
+                            if 'video' in fmt['type'] and 'mp4' in fmt['type']:
+                                logger.info(f"Found Invidious video URL")
+                                return fmt['url'], "youtube_invidious"
+                
+                # Piped формат  
+                if 'videoStreams' in data or 'audioStreams' in data:
+                    streams = data.get('videoStreams', [])
+                    if streams:
+                        # Берем первый поток (обычно есть URL)
+                        for stream in streams:
+                            if stream.get('url'):
+                                logger.info(f"Found Piped video URL")
+                                return stream['url'], "youtube_piped"
+                
+                # YT LemnosLife - только info, но можем построить URL
+                if 'items' in data:
+                    logger.info(f"YT API confirmed video exists, trying fallback")
+                    # Не дает прямой URL, но подтверждает что видео существует
+                    # Вернемся к yt-dlp с этим знанием
+        return None
+    
+    winner = await race(
+        youtube_apis, resolve,
+        fan_out=get_race_fanout("youtube"), name="YouTube API", health=provider_health
+    )
+    if winner:
+        _, (media_url, source) = winner
+        return await download_from_direct_url(media_url, format_type, source)
     
     # Fallback: пробуем yt-dlp с прокси (если доступен) и специальными опциями
     logger.info("All YouTube APIs failed, trying yt-dlp with special options")
     
     # Пробуем yt-dlp с другими клиентами
     try:
-        download_dir = os.path.join(os.path.expanduser("~"), "Downloads", "telegram_bot")
-        os.makedirs(download_dir, exist_ok=True)
+        download_dir = storage.current_dir()
         
         # Пробуем разные клиенты YouTube
         clients = ['android', 'web', 'ios', 'mweb']
@@ -629,18 +921,16 @@ async def download_via_youtube_api(url: str, format_type: str) -> tuple[bool, st
                     },
                 }
                 
-                def download():
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=True)
-                        return ydl.prepare_filename(info)
-                
-                loop = asyncio.get_event_loop()
-                file_path = await asyncio.wait_for(loop.run_in_executor(None, download), timeout=60)
+                file_path = await submit_ytdlp(
+                    "youtube", f"https://www.youtube.com/watch?v={video_id}", ydl_opts, timeout=60
+                )
                 
                 if os.path.exists(file_path) and os.path.getsize(file_path) > MIN_FILE_SIZE:
                     logger.info(f"yt-dlp with {client} client succeeded")
                     return True, file_path
                     
+            except QueueFullError:
+                return False, QUEUE_FULL_MESSAGE
             except Exception as e:
                 logger.warning(f"yt-dlp with {client} client failed: {str(e)[:100]}")
                 continue
@@ -651,107 +941,107 @@ async def download_via_youtube_api(url: str, format_type: str) -> tuple[bool, st
     return False, "Все YouTube методы не сработали"
 
 
-async def download_via_alternative_api(url: str, format_type: str) -> tuple[bool, str]:
+@provider_step("alternative_api")
+async def download_via_alternative_api(url: str, format_type: str) -> tuple[bool, str | InMemoryFile]:
     """Скачивает через альтернативные API."""
     platform = detect_platform(url)
     
-    api_lists = {
-        "tiktok": config.TIKTOK_APIS,
-        "instagram": config.INSTAGRAM_APIS,
-        "pinterest": config.PINTEREST_APIS,
-        "facebook": config.FACEBOOK_APIS,
-    }
-    
-    apis = api_lists.get(platform, config.UNIVERSAL_APIS)
+    route = routing.get_platform(platform)
+    apis = route.alt_apis if route and route.alt_apis else config.UNIVERSAL_APIS
     if not platform:
         platform = "universal"
     
-    # Черный список для фильтрации URL
-    blacklist = [
-        'twitter.com', 'facebook.com', 'instagram.com', 'youtube.com', 'googlevideo.com',
-        'ssstwitter', 'snapinsta', 'savefrom', 'snaptik', 'musicaldown', 'ssstik',
-        'fonts.googleapis', 'cdnjs', 'jquery', 'cloudflare', 'analytics',
-    ]
-    
-    for api_url in apis:
-        try:
-            encoded_url = quote(url, safe='')
-            full_url = api_url + encoded_url
+    async def resolve(api_url: str) -> tuple[str, str | InMemoryFile] | None:
+        """
+        Опрашивает зеркало. Возвращает ("file", путь), если зеркало сразу
+        отдало файл, или ("url", ссылка) на найденное в HTML медиа.
+        """
+        encoded_url = quote(url, safe='')
+        full_url = api_url + encoded_url
+        
+        async with http_pool.get(
+            full_url,
+            headers={'User-Agent': config.DESKTOP_USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            # Читаем только начало - по нему решаем, файл это или HTML
+            head = await read_prefix(response.content, 64)
+            content_type = response.headers.get('Content-Type', '').lower()
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                async with session.get(full_url, headers={'User-Agent': config.DESKTOP_USER_AGENT}) as response:
-                    content_bytes = await response.read()
-                    content_type = response.headers.get('Content-Type', '').lower()
-                    
-                    # Проверка на прямой файл
-                    is_file = 'video/' in content_type or 'image/' in content_type
-                    if not is_file and len(content_bytes) > 32:
-                        header = content_bytes[:32]
-                        if (b'ftyp' in header) or header.startswith(b'\xff\xd8') or \
-                           header.startswith(b'\x89PNG') or header.startswith(b'\x1a\x45\xdf\xa3'):
-                            is_file = True
-                    
-                    if is_file:
-                        download_dir = os.path.join(os.path.expanduser("~"), "Downloads", "telegram_bot")
-                        os.makedirs(download_dir, exist_ok=True)
-                        ext = '.mp4' if 'video' in content_type else '.jpg'
-                        filename = f"{platform}_direct_{hash(url)%1000000}{ext}"
-                        file_path = os.path.join(download_dir, filename)
-                        with open(file_path, 'wb') as f:
-                            f.write(content_bytes)
-                        return True, file_path
-                    
-                    if response.status != 200:
-                        continue
-                    
-                    # Декодируем текст
-                    try:
-                        content = content_bytes.decode('utf-8')
-                    except UnicodeDecodeError:
-                        content = content_bytes.decode('latin-1', errors='ignore')
-                    
-                    # Извлечение URL
-                    found_urls = []
-                    raw_urls = re.findall(
-                        r'href=["\'](https?://[^"\']+)["\']|src=["\'](https?://[^"\']+)["\']',
-                        content, re.IGNORECASE
-                    )
-                    
-                    for matches in raw_urls:
-                        match = next((m for m in matches if m), None)
-                        if not match:
-                            continue
-                        
-                        match_lower = match.lower().split('#')[0]
-                        
-                        # Фильтрация
-                        if any(x in match_lower for x in blacklist):
-                            continue
-                        if any(match_lower.endswith(ext) for ext in ['.html', '.php', '.css', '.js']):
-                            continue
-                        
-                        if 'tiktok' in match_lower or 'video' in match_lower or 'cdn' in match_lower:
-                            found_urls.append(match)
-                    
-                    if found_urls:
-                        direct_video = [u for u in found_urls if any(ext in u.lower() for ext in ['.mp4', '.webm'])]
-                        download_url = direct_video[0] if direct_video else found_urls[0]
-                        
-                        if "router.parklogic.com" in download_url or "download?url=" in download_url:
-                            return await handle_redirect_url(download_url, format_type, platform)
-                        
-                        return await download_from_direct_url(download_url, format_type, platform)
-        except Exception:
-            continue
+            # Проверка на прямой файл
+            is_file = 'video/' in content_type or 'image/' in content_type
+            if not is_file and len(head) > 32:
+                header = head[:32]
+                if (b'ftyp' in header) or header.startswith(b'\xff\xd8') or \
+                   header.startswith(b'\x89PNG') or header.startswith(b'\x1a\x45\xdf\xa3'):
+                    is_file = True
+            
+            if is_file:
+                if response.content_length and response.content_length > MAX_FILE_SIZE:
+                    return None
+                ext = '.mp4' if 'video' in content_type else '.jpg'
+                # Остаток тела - в память (мелкие) или сразу в файл
+                media = await receive_media(response, f"{platform}_direct", ext, head)
+                if media is None:
+                    return None
+                return "file", media
+            
+            if response.status != 200:
+                return None
+            
+            # HTML разбирается по мере чтения (не больше лимита) до первой надежной ссылки
+            extractor = MediaLinkExtractor(format_type)
+            received = len(head)
+            extractor.feed(head)
+            while not extractor.done and received < config.ALT_API_HTML_MAX_BYTES:
+                chunk = await response.content.read(
+                    min(config.ALT_API_HTML_CHUNK_SIZE, config.ALT_API_HTML_MAX_BYTES - received)
+                )
+                if not chunk:
+                    break
+                received += len(chunk)
+                extractor.feed(chunk)
+            
+            download_url = extractor.close()
+            if download_url:
+                return "url", download_url
+        return None
+    
+    winner = await race(
+        apis, resolve,
+        fan_out=get_race_fanout(platform), name="Alternative API", health=provider_health
+    )
+    if winner:
+        _, (kind, result) = winner
+        if kind == "file":
+            return True, result
+        
+        if "router.parklogic.com" in result or "download?url=" in result:
+            return await handle_redirect_url(result, format_type, platform)
+        
+        return await download_from_direct_url(result, format_type, platform)
     
     return False, f"❌ Не удалось скачать {platform} через альтернативные API"
 
 
 # ==================== ОСНОВНАЯ ФУНКЦИЯ СКАЧИВАНИЯ ====================
+def counted_download(fn):
+    """Декоратор download_content: итог скачивания по платформе и причине - в метрики."""
+    @functools.wraps(fn)
+    async def wrapper(url: str, format_type: str):
+        platform = detect_platform(url) or "other"
+        success, result = await fn(url, format_type)
+        if success:
+            metrics.DOWNLOADS.inc(platform=platform, result="success")
+        else:
+            metrics.DOWNLOADS.inc(platform=platform, result="failure", reason=failure_reason(str(result)))
+        return success, result
+    return wrapper
+
+
+@counted_download
 async def download_content(url: str, format_type: str) -> tuple[bool, str]:
     """Основная функция скачивания с yt-dlp и fallback на API."""
-    import yt_dlp  # Ленивый импорт
-    
     original_url = url
     platform = detect_platform(url)
     selected_proxy = get_proxy_config()
@@ -767,9 +1057,8 @@ async def download_content(url: str, format_type: str) -> tuple[bool, str]:
             return True, cobalt_result
         logger.info("Cobalt failed for YouTube, falling back to yt-dlp")
     
-    # Базовые опции yt-dlp
-    download_dir = os.path.join(os.path.expanduser("~"), "Downloads", "telegram_bot")
-    os.makedirs(download_dir, exist_ok=True)
+    # Базовые опции yt-dlp (у каждой задачи своя папка - одинаковые названия не пересекаются)
+    download_dir = storage.current_dir()
     
     ydl_opts = {
         'quiet': False,
@@ -799,71 +1088,10 @@ async def download_content(url: str, format_type: str) -> tuple[bool, str]:
     if selected_proxy:
         ydl_opts['proxy'] = selected_proxy
     
-    # Платформенно-специфичные опции
-    if platform == "tiktok":
-        ydl_opts.update({
-            'extractor_args': {
-                'tiktok': {
-                    'api_hostname': 'api16-normal-c-useast1a.tiktokv.com',
-                    'enable_headers': True,
-                    'app_name': 'musical_ly',
-                    'device_id': '7234567890123456789',
-                }
-            },
-            'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
-            'http_headers': {
-                'User-Agent': config.MOBILE_USER_AGENT,
-                'Referer': 'https://www.tiktok.com/',
-            },
-            'socket_timeout': 60,
-            'retries': 3,
-        })
-    
-    elif platform == "instagram":
-        ydl_opts.update({
-            'extractor_args': {'instagram': {'include_ads': False, 'enable_headers': True}},
-            'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
-            'http_headers': {
-                'User-Agent': config.DESKTOP_USER_AGENT,
-                'Referer': 'https://www.instagram.com/',
-            },
-        })
-    
-    elif platform == "pinterest":
-        ydl_opts.update({
-            'format': 'best[ext=jpg]/best[ext=jpeg]/best[ext=png]/best',
-            'http_headers': {
-                'User-Agent': config.DESKTOP_USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            },
-            'socket_timeout': 90,
-        })
-    
-    elif platform == "facebook":
-        ydl_opts.update({
-            'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
-            'http_headers': {
-                'User-Agent': config.DESKTOP_USER_AGENT,
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,video/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            },
-            'socket_timeout': 90,
-        })
-    
-    elif platform == "youtube":
-        # Используем формат без HLS/m3u8 чтобы избежать 403 на фрагментах
-        ydl_opts.update({
-            'format': 'worst[protocol=https][ext=mp4]/worst[protocol=https]/worst[ext=mp4]/worst',
-            'socket_timeout': 60,
-            'retries': 3,
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android', 'web'],
-                    'player_skip': ['webpage', 'config', 'js'],
-                }
-            },
-        })
+    # Платформенно-специфичные опции (routing.Platform.ydl_opts)
+    route = routing.get_platform(platform)
+    if route is not None:
+        ydl_opts.update(copy.deepcopy(route.ydl_opts))
     
     # Формат
     if format_type == "mp4":
@@ -877,20 +1105,17 @@ async def download_content(url: str, format_type: str) -> tuple[bool, str]:
             'postprocessors': [],
         })
     
-    # Скачивание
-    def download():
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            return ydl.prepare_filename(info)
-    
+    # Скачивание (в пуле загрузок, с лимитом на платформу)
     try:
         timeout = get_timeout(platform)
-        loop = asyncio.get_event_loop()
-        file_path = await asyncio.wait_for(loop.run_in_executor(None, download), timeout=timeout)
+        note_provider("yt-dlp")
+        file_path = await submit_ytdlp(platform, url, ydl_opts, timeout=timeout)
         
         # Проверка файла
         if os.path.exists(file_path) and os.path.getsize(file_path) > MIN_FILE_SIZE:
+            metrics.PROVIDER_ATTEMPTS.inc(provider="yt-dlp", result="success")
             return True, file_path
+        metrics.PROVIDER_ATTEMPTS.inc(provider="yt-dlp", result="failure")
         
         # Fallback для YouTube
         if platform == "youtube":
@@ -906,11 +1131,16 @@ async def download_content(url: str, format_type: str) -> tuple[bool, str]:
         return False, "❌ Файл не был скачан или пуст"
     
     except asyncio.TimeoutError:
+        metrics.PROVIDER_ATTEMPTS.inc(provider="yt-dlp", result="error")
         return False, "❌ Превышено время ожидания"
     
+    except QueueFullError:
+        return False, QUEUE_FULL_MESSAGE
+    
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Ошибка yt-dlp: {error_msg}")
+        metrics.PROVIDER_ATTEMPTS.inc(provider="yt-dlp", result="error")
         
         # Fallback на альтернативные API
         error_triggers = [
@@ -960,7 +1190,7 @@ async def download_content(url: str, format_type: str) -> tuple[bool, str]:
         if "No video formats found" in error_msg:
             return False, "❌ На этой странице нет видео/фото"
         
-        clean_error = re.sub(r'\x1b\[[0-9;]*m', '', error_msg)
+        clean_error = ANSI_ESCAPE_RE.sub('', error_msg)
         return False, f"❌ Ошибка: {clean_error[:200]}"
 
 
@@ -969,39 +1199,331 @@ class SaveContent(StatesGroup):
     waiting_for_link = State()
 
 
-async def send_file(message: types.Message, file_path: str, format_type: str):
-    """Отправляет файл пользователю и удаляет его."""
+def _sent_file_id(sent: types.Message) -> tuple[str, str] | None:
+    """Достает (file_id, тип) из отправленного сообщения для кеша."""
+    if sent.video:
+        return sent.video.file_id, "video"
+    if sent.photo:
+        return sent.photo[-1].file_id, "photo"
+    if sent.animation:
+        return sent.animation.file_id, "animation"
+    if sent.document:
+        return sent.document.file_id, "document"
+    return None
+
+
+async def send_file(
+    chat_id: int, file_path: str | InMemoryFile | RemoteFile, format_type: str
+) -> tuple[str, str] | None:
+    """
+    Отправляет файл пользователю и удаляет его. Возвращает (file_id, тип) для кеша.
+    Файл в памяти загружается напрямую из буфера, RemoteFile - передается
+    ссылкой; если Telegram не смог ее забрать, файл скачивается локально.
+    """
+    if isinstance(file_path, RemoteFile):
+        mode = "url"
+    elif isinstance(file_path, InMemoryFile):
+        mode = "memory"
+    else:
+        mode = "file"
     try:
-        file_size = os.path.getsize(file_path)
+        file_size = media_size(file_path)
         
         if file_size > MAX_FILE_SIZE:
-            await message.answer(
-                f"❌ Файл слишком большой ({file_size/1024/1024:.1f}MB). Максимум: 50MB"
-            )
-            return
+            await bot.send_message(chat_id, too_large_message(file_size))
+            return None
         
-        if format_type == "mp4":
-            await message.answer_video(
-                video=FSInputFile(file_path),
-                caption="✅ Видео успешно скачано!"
-            )
-        elif format_type == "jpg":
-            await message.answer_photo(
-                photo=FSInputFile(file_path),
-                caption="✅ Фото успешно скачано!"
-            )
+        if isinstance(file_path, RemoteFile):
+            input_file = file_path.url
+        elif isinstance(file_path, InMemoryFile):
+            input_file = BufferedInputFile(file_path.data, filename=file_path.filename)
         else:
-            await message.answer_document(
-                document=FSInputFile(file_path),
-                caption="✅ Файл успешно скачан!"
-            )
+            input_file = FSInputFile(file_path)
+        
+        with tracing.span("upload", mode=mode, bytes=file_size), \
+                metrics.STAGE_LATENCY.time(stage="upload", provider=mode):
+            if format_type == "mp4":
+                sent = await bot.send_video(
+                    chat_id,
+                    video=input_file,
+                    caption="✅ Видео успешно скачано!"
+                )
+            elif format_type == "jpg":
+                sent = await bot.send_photo(
+                    chat_id,
+                    photo=input_file,
+                    caption="✅ Фото успешно скачано!"
+                )
+            else:
+                sent = await bot.send_document(
+                    chat_id,
+                    document=input_file,
+                    caption="✅ Файл успешно скачан!"
+                )
+        metrics.UPLOADS.inc(mode=mode, result="success")
+        metrics.BYTES_UPLOADED.inc(file_size, mode=mode)
+        return _sent_file_id(sent)
+    except TelegramBadRequest as e:
+        metrics.UPLOADS.inc(mode=mode, result="failure")
+        if not isinstance(file_path, RemoteFile):
+            await bot.send_message(chat_id, f"❌ Ошибка отправки: {str(e)}")
+            return None
+        logger.info(f"Telegram could not fetch URL ({str(e)[:100]}), downloading locally")
+        success, local = await download_from_direct_url(
+            file_path.url, format_type, file_path.platform, passthrough=False
+        )
+        if not success:
+            await bot.send_message(chat_id, local)
+            return None
+        return await send_file(chat_id, local, format_type)
     except Exception as e:
-        await message.answer(f"❌ Ошибка отправки: {str(e)}")
+        metrics.UPLOADS.inc(mode=mode, result="failure")
+        await bot.send_message(chat_id, f"❌ Ошибка отправки: {str(e)}")
+        return None
     finally:
+        if isinstance(file_path, str):
+            try:
+                os.remove(file_path)
+            except:
+                pass
+
+
+async def send_cached(chat_id: int, cached: dict) -> bool:
+    """Пересылает ранее загруженный файл по file_id (без скачивания)."""
+    file_id, kind = cached["file_id"], cached["kind"]
+    try:
+        if kind == "video":
+            await bot.send_video(chat_id, video=file_id, caption="✅ Видео успешно скачано!")
+        elif kind == "photo":
+            await bot.send_photo(chat_id, photo=file_id, caption="✅ Фото успешно скачано!")
+        elif kind == "animation":
+            await bot.send_animation(chat_id, animation=file_id, caption="✅ Видео успешно скачано!")
+        else:
+            await bot.send_document(chat_id, document=file_id, caption="✅ Файл успешно скачан!")
+        return True
+    except Exception as e:
+        logger.warning(f"Cached file_id send failed: {str(e)}")
+        return False
+
+
+async def download_and_send(
+    chat_id: int, url: str, cache_url: str, format_type: str
+) -> tuple[tuple[str, str] | None, str | None]:
+    """
+    Скачивает и отправляет файл, сохраняет file_id в кеш.
+    Все файлы задачи живут в ее папке и удаляются вместе с ней.
+    Возвращает ((file_id, тип) | None, текст ошибки скачивания | None).
+    """
+    try:
+        async with storage.job():
+            success, result = await download_content(url, format_type)
+            if not success:
+                return None, result
+            
+            sent = await send_file(chat_id, result, format_type)
+    except StorageFullError as e:
+        logger.warning(str(e))
+        return None, QUEUE_FULL_MESSAGE
+    if sent:
+        await result_cache.set(cache_url, format_type, *sent)
+    return sent, None
+
+
+async def process_job(job: Job) -> str | None:
+    """
+    Выполняет задачу из очереди: кеш file_id -> объединение одинаковых
+    загрузок -> скачивание и отправка. Возвращает текст ошибки (None - успех).
+    """
+    canonical_url = await url_canonicalizer.canonicalize(job.url)
+    
+    # Эту ссылку уже отправляли - пересылаем file_id
+    cached = await result_cache.get(canonical_url, job.format_type)
+    if cached and await send_cached(job.chat_id, cached):
+        logger.info(f"Result cache hit: {canonical_url[:60]}")
+        tracing.annotate(cache="hit")
+        return None
+    if cached:
+        await result_cache.delete(canonical_url, job.format_type)
+    
+    # Ту же ссылку уже качают для другого пользователя - ждем и пересылаем
+    (sent, error), shared = await downloads_in_flight.do(
+        (canonical_url, job.format_type),
+        lambda: download_and_send(job.chat_id, job.url, canonical_url, job.format_type),
+    )
+    
+    if error:
+        return error
+    if shared:
+        logger.info(f"Coalesced request: {canonical_url[:60]}")
+        tracing.annotate(coalesced=True)
+        if not (sent and await send_cached(job.chat_id, {"file_id": sent[0], "kind": sent[1]})):
+            return "Не удалось отправить файл"
+    return None if sent else "Не удалось отправить файл"
+
+
+async def job_feeder():
+    """
+    Забирает задачи из общей очереди в справедливую локальную, пока готовых
+    к запуску меньше FAIR_PREFETCH: задачи чатов, упершихся в лимит, не
+    занимают окно, и свободный воркер не ждет за ними. Всего в локальной
+    очереди - не больше FAIR_LOCAL_LIMIT, остальное - другим узлам.
+    """
+    while True:
+        while (
+            fair_scheduler.ready() >= config.FAIR_PREFETCH
+            or fair_scheduler.pending() >= config.FAIR_LOCAL_LIMIT
+        ):
+            await fair_scheduler.wait_changed()
+        await fair_scheduler.submit(await job_queue.get())
+
+
+async def claim_heartbeat():
+    """
+    Продлевает взятие задач узла: задача, долго ждущая лимита на чат
+    или долго выполняемая, не уходит другому узлу по visibility timeout.
+    """
+    while True:
+        await asyncio.sleep(config.JOB_QUEUE_HEARTBEAT_INTERVAL)
+        try:
+            await job_queue.touch(fair_scheduler.held())
+        except Exception as e:
+            logger.warning(f"Job claim heartbeat failed: {str(e)[:100]}")
+
+
+async def queue_positions() -> list[tuple[Job, int]]:
+    """
+    Места ожидающих задач: сначала локальная очередь узла (ее задачи начнутся
+    раньше), за ней первые FAIR_POSITION_SHARED_LIMIT задач общей очереди.
+    """
+    result = fair_scheduler.positions()
+    shared = await job_queue.peek(config.FAIR_POSITION_SHARED_LIMIT)
+    result += [(job, len(result) + i) for i, job in enumerate(shared, 1)]
+    return result
+
+
+async def queue_position_updater():
+    """Правит сообщения ожидающих задач "Вы #N в очереди" - не чаще интервала."""
+    while True:
+        await asyncio.sleep(config.FAIR_POSITION_UPDATE_INTERVAL)
+        try:
+            positions = await queue_positions()
+        except Exception as e:
+            logger.warning(f"Queue positions failed: {str(e)[:100]}")
+            continue
+        waiting = {job.job_id for job, _ in positions}
+        # Задачи, ушедшие из очереди без run_job этого узла (их взял другой узел)
+        for job_id in [k for k in queue_positions_shown if k not in waiting]:
+            del queue_positions_shown[job_id]
+        for job, position in positions:
+            if queue_positions_shown.get(job.job_id) == position:
+                continue
+            queue_positions_shown[job.job_id] = position
+            try:
+                await bot.edit_message_text(
+                    f"⏳ Вы #{position} в очереди\n\nСкачивание начнется автоматически",
+                    chat_id=job.chat_id, message_id=job.message_id
+                )
+            except Exception:
+                pass
+
+
+async def job_worker(worker_id: int):
+    """
+    Воркер: берет задачи из справедливой очереди, пока его не отменят.
+    Задача, прерванная остановкой бота, возвращается в общую очередь
+    (run_job); после падения процесса ее подхватывает recover_jobs().
+    """
+    while True:
+        job = await fair_scheduler.next()
         try:
-            os.remove(file_path)
-        except:
+            await run_job(worker_id, job)
+        finally:
+            await fair_scheduler.done(job)
+
+
+async def run_job(worker_id: int, job: Job):
+    """Выполняет одну задачу и отмечает результат в журнале и очереди."""
+    if not await job_store.begin(job):
+        # Дубликат уже завершенной или выполняемой задачи
+        await job_queue.ack(job)
+        return
+    
+    async def edit(text: str):
+        await bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.message_id)
+    
+    if queue_positions_shown.pop(job.job_id, None) is not None:
+        try:
+            await edit("⏳ Скачиваю...")
+        except Exception:
+            pass
+    
+    reporter = progress.ProgressReporter(edit, "видео" if job.format_type == "mp4" else "фото")
+    try:
+        # Одна трасса на задачу: span'ы провайдеров, HTTP, yt-dlp и отправки вложены в нее
+        with tracer.trace(
+            "job", job_id=job.job_id, platform=detect_platform(job.url) or "other",
+            format=job.format_type, worker=worker_id, queue_wait_s=round(time.time() - job.created_at, 3),
+        ) as root:
+            # Прогресс правит сообщение только пока идет загрузка - итог пишется после
+            async with reporter.running():
+                error = await process_job(job)
+            if root is not None and error:
+                root.fail(error)
+    except asyncio.CancelledError:
+        # Остановка бота: задача не выполнена - обратно в очередь, а не ack
+        await job_store.requeue(job)
+        await job_queue.release(job)
+        raise
+    except Exception as e:
+        logger.exception(f"Job {job.job_id} failed in worker {worker_id}")
+        error = str(e)[:200]
+    if error:
+        try:
+            await edit(f"❌ Ошибка:\n{error}")
+        except Exception:
             pass
+    await job_store.finish(job, error is None, error)
+    await job_queue.ack(job, error is None)
+    await record_traffic(job.url, job.format_type, job.created_at, "ok" if error is None else failure_reason(error))
+
+
+async def record_traffic(url: str, format_type: str, started_at: float, outcome: str):
+    """Запрос из callback_handler и его итог - в запись трафика (без самой ссылки)."""
+    if not traffic_recorder.enabled:
+        return
+    canonical_url = await url_canonicalizer.canonicalize(url)
+    traffic_recorder.record(
+        detect_platform(url), canonical_url, format_type, started_at, outcome, time.time() - started_at
+    )
+
+
+async def recover_jobs():
+    """
+    После перезапуска: прерванные задачи этого узла (и зависшие чужие)
+    снова ставятся в очередь, а исчерпавшие попытки - завершаются с ошибкой
+    в сообщении "⏳ Скачиваю...". Ожидающие задачи очереди SQLite/Redis
+    хранят сами - в них ничего не ставится повторно.
+    """
+    await job_store.purge()
+    for job, status, attempts, providers in await job_store.outstanding():
+        if attempts >= config.JOB_MAX_ATTEMPTS:
+            error = "Загрузка прервана перезапуском бота. Отправьте ссылку еще раз"
+            await job_store.finish(job, False, error)
+            text = f"❌ Ошибка:\n{error}"
+        elif status == RUNNING or not job_queue.durable:
+            await job_store.requeue(job)
+            # Взятая упавшим воркером задача еще числится "в работе" - возвращаем сразу,
+            # не дожидаясь visibility timeout (без дубликата, если она уже в очереди)
+            await job_queue.release(job)
+            text = "⏳ Бот был перезапущен, продолжаю скачивание..."
+        else:
+            # Ждет в общей очереди
+            continue
+        logger.info(f"Recovered job {job.job_id}: {status}, attempts={attempts}, providers={providers}")
+        try:
+            await bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.message_id)
+        except Exception as e:
+            logger.warning(f"Could not update message for job {job.job_id}: {str(e)[:100]}")
 
 
 HELP_TEXT = """🤖 **Справка по боту**
@@ -1123,6 +1645,18 @@ async def callback_handler(callback: types.CallbackQuery, state: FSMContext):
         format_type = "mp4" if data == "format_mp4" else "jpg"
         label = "видео" if format_type == "mp4" else "фото"
         
+        # Не больше FAIR_USER_BURST задач подряд, дальше - FAIR_USER_RATE в секунду
+        allowed, retry_in = fair_scheduler.allow(callback.from_user.id)
+        if not allowed:
+            await callback.answer(
+                f"⏳ Слишком много запросов. Попробуйте через {math.ceil(retry_in)} сек.",
+                show_alert=True
+            )
+            url = (await state.get_data()).get("link")
+            if url:
+                await record_traffic(url, format_type, time.time(), "throttled")
+            return
+        
         try:
             processing_msg = await callback.message.edit_text(
                 f"⏳ Скачиваю {label}...\n\nЭто может занять до 2 минут"
@@ -1138,12 +1672,18 @@ async def callback_handler(callback: types.CallbackQuery, state: FSMContext):
         url = state_data.get("link")
         
         if url:
-            success, result = await download_content(url, format_type)
-            
-            if success:
-                await send_file(processing_msg, result, format_type)
-            else:
-                await processing_msg.edit_text(f"❌ Ошибка:\n{result}")
+            # Скачивает воркер (в этом процессе или на другом узле), обработчик сразу свободен
+            job = Job(
+                url=url,
+                format_type=format_type,
+                chat_id=processing_msg.chat.id,
+                message_id=processing_msg.message_id,
+                user_id=callback.from_user.id,
+            )
+            # Журнал задач ведут воркеры (intake-узел может быть на другой машине)
+            if config.BOT_ROLE != "intake":
+                await job_store.create(job)
+            await job_queue.put(job)
         
         await state.clear()
         return
@@ -1155,12 +1695,123 @@ async def callback_handler(callback: types.CallbackQuery, state: FSMContext):
 async def status_handler(message: types.Message):
     """Статус бота."""
     await message.answer(
-        "✅ **Статус:** Бот активен и работает!",
+        "✅ **Статус:** Бот активен и работает!\n\n"
+        f"🌐 HTTP пул: {http_pool.format_stats()}\n"
+        f"📡 Провайдеры: {provider_health.format_summary()}\n"
+        f"🔌 Цепи: {circuit_breakers.format_summary()}\n"
+        f"💾 Кеш: {result_cache.format_stats()}\n"
+        f"📥 Загрузки: {download_scheduler.format_stats()}\n"
+        f"🗄 Диск: {storage.format_stats()}\n"
+        f"📋 Очередь: {await job_queue.format_stats()}\n"
+        f"⚖️ Планировщик: {fair_scheduler.format_stats()}\n"
+        f"📤 Отправка: {outbound_limiter.format_stats()}\n"
+        f"🗂 Задачи: {await job_store.format_stats()}\n"
+        f"🔍 Трассы: {tracer.format_stats()}\n"
+        f"🎞 Запись трафика: {traffic_recorder.format_stats()}",
         parse_mode="markdown"
     )
 
 
 # ==================== ЗАПУСК ====================
+async def healthz_handler(request: web.Request) -> web.Response:
+    """Проверка живости реплики для балансировщика."""
+    return web.Response(text="ok")
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Метрики в текстовом формате Prometheus."""
+    return web.Response(
+        body=metrics.REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server() -> web.AppRunner | None:
+    """
+    Отдельный aiohttp-сервер с /metrics на локальном порту - для процессов
+    без webhook-сервера (polling, BOT_ROLE=worker).
+    Порт занят (второй процесс с тем же METRICS_PORT) - бот работает без метрик.
+    """
+    if not config.METRICS_ENABLED:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/healthz", healthz_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.METRICS_HOST, config.METRICS_PORT).start()
+    except OSError as e:
+        logger.warning(f"Metrics disabled: cannot bind {config.METRICS_HOST}:{config.METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"Metrics on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+    return runner
+
+
+async def wait_for_shutdown():
+    """Ждет SIGINT/SIGTERM (для режимов без start_polling)."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop.wait()
+
+
+async def run_polling():
+    """Long polling: один экземпляр бота."""
+    # Если раньше работали через webhook - getUpdates без этого вернет конфликт
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
+
+
+async def run_webhook():
+    """
+    Webhook: aiohttp-сервер за прокси с TLS (наружу - WEBHOOK_URL по https,
+    внутри - http на WEBAPP_HOST:WEBAPP_PORT). Апдейты обрабатываются
+    в фоне, ответ Telegram - сразу, поэтому реплик может быть несколько.
+    """
+    if not config.WEBHOOK_URL:
+        raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_URL")
+    
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=config.WEBHOOK_SECRET or None,
+    ).register(app, path=config.WEBHOOK_PATH)
+    app.router.add_get("/healthz", healthz_handler)
+    if config.METRICS_ENABLED:
+        # Метрики - на том же сервере, отдельный порт не нужен
+        app.router.add_get("/metrics", metrics_handler)
+    setup_application(app, dp, bot=bot)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBAPP_HOST, config.WEBAPP_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {config.WEBAPP_HOST}:{config.WEBAPP_PORT}{config.WEBHOOK_PATH}")
+    
+    try:
+        await bot.set_webhook(
+            config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info("Webhook set")
+        await wait_for_shutdown()
+    finally:
+        if config.WEBHOOK_DELETE_ON_SHUTDOWN:
+            await bot.delete_webhook()
+            logger.info("Webhook deleted")
+        await runner.cleanup()
+
+
 async def main():
     """Запуск бота."""
     logger.info("Бот запущен!")
@@ -1177,7 +1828,59 @@ async def main():
     if proxy:
         logger.info("Proxy configured: %s", _mask_proxy(proxy))
     
-    await dp.start_polling(bot)
+    provider_health.load()
+    autosave_task = asyncio.create_task(provider_health.autosave())
+    janitor_task = asyncio.create_task(storage.janitor())
+    
+    if config.BOT_ROLE not in ("all", "intake", "worker"):
+        raise ValueError(f"Неизвестный BOT_ROLE: {config.BOT_ROLE}")
+    if config.BOT_ROLE != "all" and config.JOB_QUEUE_BACKEND == "memory":
+        raise ValueError("Для раздельных intake/worker нужен JOB_QUEUE_BACKEND sqlite или redis")
+    
+    await http_pool.start()
+    download_scheduler.start()
+    # Webhook-сервер сам отдает /metrics (run_webhook)
+    serves_webhook = config.BOT_ROLE != "worker" and config.BOT_MODE == "webhook"
+    metrics_runner = None if serves_webhook else await start_metrics_server()
+    tracer_task = asyncio.create_task(tracer.run())
+    
+    # Воркеры очереди: intake-узлы только принимают апдейты
+    workers = []
+    if config.BOT_ROLE in ("all", "worker"):
+        await recover_jobs()
+        workers = [asyncio.create_task(job_worker(i)) for i in range(config.JOB_WORKERS)]
+        workers.append(asyncio.create_task(job_feeder()))
+        workers.append(asyncio.create_task(queue_position_updater()))
+        workers.append(asyncio.create_task(claim_heartbeat()))
+        logger.info(f"Started {config.JOB_WORKERS} job worker(s)")
+    try:
+        if config.BOT_ROLE == "worker":
+            await wait_for_shutdown()
+        elif config.BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            await run_polling()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Забранные наперед, но не начатые задачи - обратно в общую очередь
+        for job in fair_scheduler.drain():
+            await job_queue.release(job)
+        autosave_task.cancel()
+        janitor_task.cancel()
+        tracer_task.cancel()
+        await tracer.close()
+        traffic_recorder.flush()
+        provider_health.save()
+        await job_queue.close()
+        await job_store.close()
+        await dp.storage.close()
+        await result_cache.close()
+        await http_pool.close()
+        download_scheduler.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,6 @@
+"""
+Офлайн-бенчмарки бота: локальный стенд вместо внешних сервисов
+(fake_upstream), синтетическая нагрузка на download_content/callback_handler
+(harness) и повтор записанного трафика (replay).
+Запуск из корня репозитория: python -m benchmarks.harness --help
+"""
@@ -0,0 +1,276 @@
+"""
+Локальный стенд внешних сервисов для бенчмарков.
+Один aiohttp-сервер играет роль Cobalt, TikWM, SSSTik/SnapTik, Invidious/Piped,
+зеркал из config.*_APIS, CDN с медиа и Telegram Bot API. Бот ходит в него
+по http через подмененный резолвер (см. harness.UpstreamResolver), хост в запросе -
+настоящий (api.cobalt.tools, www.tikwm.com, ...), а разбор ответов в app.py
+работает без изменений. Задержка, доля отказов, число редиректов до файла
+и размер файла задаются профилем.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from aiohttp import web
+
+MEDIA_HOST = "cdn.bench.test"
+
+COBALT_HOSTS = {"api.cobalt.tools", "cobalt.api.ghst.dev", "api.boxiv.xyz", "cobalt.sm6.zone"}
+INVIDIOUS_HOSTS = {"iv.datura.network", "vid.puffyan.us", "iv.nboeck.de", "iv.melmac.space"}
+PIPED_HOSTS = {"pipedapi.kavin.rocks", "api.piped.projectkreators.com"}
+PLATFORMS = ("tiktok", "instagram", "facebook", "pinterest", "youtube")
+
+# Ссылки, которые зеркала обычно вставляют в страницу рядом с медиа
+PAGE_NOISE = (
+    '<link href="https://fonts.googleapis.com/css?family=Roboto">'
+    '<script src="https://cdnjs.cloudflare.com/ajax/libs/jquery/3.7.1/jquery.min.js"></script>'
+    '<a href="https://savefrom.net/help.html">Помощь</a>'
+)
+
+
+class UpstreamProfile:
+    """Поведение стенда (передается в дочерний процесс как dict)."""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        failure_rate: float = 0.0,
+        redirects: int = 0,
+        payload_bytes: int = 512 * 1024,
+        tg_latency: float = 0.02,
+        tg_429_rate: float = 0.0,
+        ytdlp_latency: float = 1.0,
+        ytdlp_failure_rate: float = 0.5,
+        seed: int | None = None,
+    ):
+        self.latency = latency  # Сек. до ответа внешнего сервиса (среднее)
+        self.jitter = jitter
+        self.failure_rate = failure_rate  # Доля ответов 503 от сервисов и CDN
+        self.redirects = redirects  # Редиректов CDN до самого файла
+        self.payload_bytes = payload_bytes
+        self.tg_latency = tg_latency
+        self.tg_429_rate = tg_429_rate  # Доля ответов 429 RetryAfter от Telegram
+        self.ytdlp_latency = ytdlp_latency  # Используются подменой yt-dlp в harness
+        self.ytdlp_failure_rate = ytdlp_failure_rate
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UpstreamProfile":
+        return cls(**data)
+
+
+def _platform_of(text: str) -> str:
+    """Платформа исходной ссылки по тексту запроса (для пути медиа на CDN)."""
+    lowered = text.lower()
+    return next((p for p in PLATFORMS if p in lowered), "video")
+
+
+class FakeUpstream:
+    """aiohttp-приложение стенда и счетчики запросов по хостам."""
+
+    def __init__(self, profile: UpstreamProfile):
+        self.profile = profile
+        self.random = random.Random(profile.seed)
+        self.requests: dict[str, int] = {}
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._mp4 = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * max(0, profile.payload_bytes - 12)
+        self._jpg = b"\xff\xd8\xff\xe0" + b"\x00" * max(0, profile.payload_bytes - 4)
+
+    # -------- Общее --------
+    async def _delay(self, mean: float):
+        if mean > 0:
+            await asyncio.sleep(max(0.0, self.random.gauss(mean, self.profile.jitter)))
+
+    def _fails(self) -> bool:
+        return self.random.random() < self.profile.failure_rate
+
+    def media_url(self, platform: str, ext: str = "mp4", hops: int | None = None) -> str:
+        query = urlencode({"hops": self.profile.redirects if hops is None else hops})
+        return f"https://{MEDIA_HOST}/{platform}/{self.random.getrandbits(48):012x}.{ext}?{query}"
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=100 * 1024 * 1024)
+        app.router.add_route("*", "/{tail:.*}", self.dispatch)
+        return app
+
+    async def dispatch(self, request: web.Request) -> web.StreamResponse:
+        try:
+            return await self.route(request)
+        except ConnectionResetError:
+            # Бот отменил проигравшую в гонке попытку, не дождавшись ответа
+            return web.Response(status=499)
+
+    async def route(self, request: web.Request) -> web.StreamResponse:
+        host = request.host.split(":")[0]
+        if request.path.startswith("/bot"):
+            return await self.telegram(request)
+        if host in ("127.0.0.1", "localhost"):
+            # Служебные адреса самого стенда
+            if request.path == "/healthz":
+                return web.Response(text="ok")
+            if request.path == "/stats":
+                return web.json_response(self.requests)
+        self.requests[host] = self.requests.get(host, 0) + 1
+
+        if host == MEDIA_HOST:
+            return await self.media(request)
+        await self._delay(self.profile.latency)
+        if self._fails():
+            return web.Response(status=503, text="Service Unavailable")
+
+        if host in COBALT_HOSTS:
+            return await self.cobalt(request)
+        if host == "www.tikwm.com":
+            return await self.tikwm(request)
+        if host in INVIDIOUS_HOSTS:
+            return self.invidious(request)
+        if host in PIPED_HOSTS:
+            return self.piped(request)
+        if host == "yt.lemnoslife.com":
+            return web.json_response({"items": [{"id": request.query.get("id")}]})
+        if host == "ssstik.io":
+            return await self.ssstik(request)
+        if host == "downloadgram.org" and request.method == "POST":
+            data = await request.post()
+            return web.json_response({"data": [{"url": self.media_url(_platform_of(data.get("url", "")))}]})
+        if host == "snapinsta.app":
+            data = await request.post()
+            return self.page(_platform_of(data.get("url", "")))
+        if host == "imginn.com" and request.path.startswith("/p/"):
+            return web.Response(
+                text=f'<video src="{self.media_url("instagram")}"></video>', content_type="text/html"
+            )
+        if host in ("fdown.net", "getfb.net", "fbdown.net"):
+            raise web.HTTPFound(self.media_url("facebook"))
+        if request.method == "GET":
+            # Зеркала из config.*_APIS: HTML со ссылкой на медиа среди прочих ссылок
+            return self.page(_platform_of(request.query_string))
+        return web.Response(status=404)
+
+    def page(self, platform: str) -> web.Response:
+        media = self.media_url(platform)
+        return web.Response(
+            text=(
+                f"<html><head>{PAGE_NOISE}</head><body>"
+                f'<a href="{media}" data-video-url="{media}">Скачать</a></body></html>'
+            ),
+            content_type="text/html",
+        )
+
+    # -------- Сервисы --------
+    async def cobalt(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"status": "error", "error": {"code": "error.api.invalid_body"}}, status=400)
+        return web.json_response({"status": "tunnel", "url": self.media_url(_platform_of(payload.get("url", "")))})
+
+    async def tikwm(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        play = self.media_url(_platform_of(data.get("url", "tiktok")))
+        return web.json_response({"code": 0, "msg": "success", "data": {"play": play}})
+
+    def invidious(self, request: web.Request) -> web.Response:
+        return web.json_response({"formatStreams": [{"url": self.media_url("youtube"), "type": "video/mp4"}]})
+
+    def piped(self, request: web.Request) -> web.Response:
+        return web.json_response({"videoStreams": [{"url": self.media_url("youtube"), "format": "MPEG_4"}]})
+
+    async def ssstik(self, request: web.Request) -> web.Response:
+        if request.method == "GET" and request.path == "/ru":
+            return web.Response(text='<input name="_token" value="bench">', content_type="text/html")
+        if request.method == "POST":
+            data = await request.post()
+            return self.page(_platform_of(data.get("id", "tiktok")))
+        return self.page(_platform_of(request.query_string))
+
+    async def media(self, request: web.Request) -> web.StreamResponse:
+        """CDN: цепочка редиректов (hops), затем файл размером payload_bytes."""
+        hops = int(request.query.get("hops", 0))
+        if hops > 0:
+            await self._delay(self.profile.latency)
+            query = dict(parse_qsl(request.query_string))
+            query["hops"] = hops - 1
+            raise web.HTTPFound(f"https://{MEDIA_HOST}{request.path}?{urlencode(query)}")
+        await self._delay(self.profile.latency)
+        if self._fails():
+            return web.Response(status=503)
+        is_image = request.path.endswith((".jpg", ".jpeg", ".png"))
+        body = self._jpg if is_image else self._mp4
+        content_type = "image/jpeg" if is_image else "video/mp4"
+        if request.method == "HEAD":
+            return web.Response(headers={"Content-Type": content_type, "Content-Length": str(len(body))})
+        return web.Response(body=body, content_type=content_type)
+
+    # -------- Telegram Bot API --------
+    def _message(self, chat_id: int, **extra) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            **extra,
+        }
+
+    def _file(self, **extra) -> dict:
+        n = next(self._file_ids)
+        return {"file_id": f"bench-file-{n}", "file_unique_id": f"bench-{n}", **extra}
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.path.rsplit("/", 1)[-1].lower()
+        self.requests["telegram"] = self.requests.get("telegram", 0) + 1
+        data = await request.post()
+        for value in data.values():
+            # Загрузка файла: дочитываем тело, как сделал бы настоящий API
+            if isinstance(value, web.FileField):
+                value.file.read()
+        await self._delay(self.profile.tg_latency)
+        if self.random.random() < self.profile.tg_429_rate:
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": "Too Many Requests: retry after 1", "parameters": {"retry_after": 1},
+            })
+
+        chat_id = int(data.get("chat_id", 0) or 0)
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "sendvideo":
+            result = self._message(chat_id, video=self._file(width=720, height=1280, duration=10))
+        elif method == "sendphoto":
+            result = self._message(chat_id, photo=[self._file(width=720, height=1280)])
+        elif method == "sendanimation":
+            result = self._message(chat_id, animation=self._file(width=720, height=1280, duration=10))
+        elif method == "senddocument":
+            result = self._message(chat_id, document=self._file())
+        elif method in ("sendmessage", "editmessagetext"):
+            result = self._message(chat_id, text=data.get("text", ""))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+async def serve(profile: UpstreamProfile, host: str, port: int):
+    runner = web.AppRunner(FakeUpstream(profile).build_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def run(profile: dict, host: str, port: int):
+    """Точка входа дочернего процесса (стенд не делит CPU и память с ботом)."""
+    try:
+        asyncio.run(serve(UpstreamProfile.from_dict(profile), host, port))
+    except KeyboardInterrupt:
+        pass
+
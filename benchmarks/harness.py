@@ -0,0 +1,548 @@
+"""
+Бенчмарк конвейера загрузки на локальном стенде - без сети и настоящего Telegram.
+Стенд (fake_upstream) запускается отдельным процессом; общий HTTP-пул бота
+ходит в него через подмененные резолвер и класс запроса, Telegram Bot API -
+через TelegramAPIServer, yt-dlp заменяется имитацией с задержкой и отказами.
+
+Режимы:
+    download - download_content() напрямую (скачивание без отправки);
+    callback - апдейты с нажатием кнопки формата через Dispatcher:
+               callback_handler -> очередь -> воркеры -> отправка в Telegram.
+
+Отчет: пропускная способность, p50/p95/p99 задержки, пиковые RSS и число
+открытых файловых дескрипторов. Пример:
+    python -m benchmarks.harness --mode callback --requests 500 --concurrency 50 \\
+        --latency 0.1 --failure-rate 0.2 --redirects 2 --payload-kb 2048
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import string
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiogram import Bot, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.methods import EditMessageText, SendAnimation, SendDocument, SendMessage, SendPhoto, SendVideo
+from aiohttp.abc import AbstractResolver
+
+import config
+from benchmarks import fake_upstream
+
+logger = logging.getLogger(__name__)
+
+BENCH_TOKEN = "123456:BENCH"
+ALNUM = string.ascii_letters + string.digits
+YT_ALPHABET = ALNUM + "-_"
+
+# Ссылки-образцы по платформам (в каноническом виде - без раскрытия коротких ссылок)
+URL_MAKERS = {
+    "tiktok": lambda r: f"https://www.tiktok.com/@bench/video/{r.randrange(10**18, 10**19)}",
+    "youtube": lambda r: f"https://www.youtube.com/watch?v={''.join(r.choices(YT_ALPHABET, k=11))}",
+    "instagram": lambda r: f"https://www.instagram.com/p/{''.join(r.choices(ALNUM, k=11))}/",
+    "facebook": lambda r: f"https://www.facebook.com/watch/?v={r.randrange(10**15, 10**16)}",
+    "pinterest": lambda r: f"https://www.pinterest.com/pin/{r.randrange(10**17, 10**18)}/",
+}
+
+# Порт стенда и профиль имитации yt-dlp (задаются в Harness.start)
+_upstream_port: int | None = None
+_ytdlp_profile = {"latency": 1.0, "failure_rate": 0.5, "payload_bytes": 512 * 1024}
+
+
+class UpstreamRequest(aiohttp.ClientRequest):
+    """Запросы бота - без TLS: стенд отвечает по http, хост в запросе остается настоящим."""
+
+    def __init__(self, method: str, url, *args, **kwargs):
+        if url.scheme == "https":
+            url = url.with_scheme("http")
+        super().__init__(method, url, *args, **kwargs)
+
+
+class UpstreamResolver(AbstractResolver):
+    """
+    Любой хост "резолвится" в порт стенда. Пулы соединений, keep-alive
+    и лимиты на хост работают как с настоящими сервисами.
+    """
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> list[dict]:
+        return [{
+            "hostname": host, "host": "127.0.0.1", "port": _upstream_port,
+            "family": socket.AF_INET, "proto": 0, "flags": socket.AI_NUMERICHOST,
+        }]
+
+    async def close(self):
+        pass
+
+
+def fake_ytdlp(url: str, ydl_opts: dict, cancel_token=None) -> str:
+    """Имитация run_ytdlp: задержка, доля отказов (403 - как у блокировок), файл в папке задачи."""
+    rnd = random.Random()
+    latency = _ytdlp_profile["latency"]
+    deadline = time.monotonic() + max(0.0, rnd.gauss(latency, latency / 4))
+    while time.monotonic() < deadline:
+        if cancel_token is not None and cancel_token.cancelled():
+            raise RuntimeError("cancelled by timeout")
+        time.sleep(0.05)
+    if rnd.random() < _ytdlp_profile["failure_rate"]:
+        raise RuntimeError("ERROR: [bench] Unable to extract video data: HTTP Error 403: Forbidden")
+    path = os.path.join(os.path.dirname(ydl_opts["outtmpl"]), f"bench-{rnd.getrandbits(48):012x}.mp4")
+    if cancel_token is not None:
+        cancel_token.track(path)
+    with open(path, "wb") as f:
+        f.write(b"\x00\x00\x00\x18ftypmp42" + b"\x00" * _ytdlp_profile["payload_bytes"])
+    return path
+
+
+class BenchRequest:
+    """Один запрос нагрузки. at - смещение от начала прогона (сек.), None - сразу."""
+
+    def __init__(self, url: str, format_type: str = "mp4", at: float | None = None):
+        self.url = url
+        self.format_type = format_type
+        self.at = at
+
+
+def synthetic_requests(
+    count: int,
+    mix: dict[str, float],
+    distinct: int | None = None,
+    jpg_share: float = 0.0,
+    seed: int | None = None,
+) -> list[BenchRequest]:
+    """
+    count запросов по платформам в пропорции mix. distinct - сколько
+    разных ссылок (повторы проверяют кеш file_id и объединение загрузок).
+    """
+    rnd = random.Random(seed)
+    platforms = list(mix)
+    weights = [mix[p] for p in platforms]
+    pool = [URL_MAKERS[p](rnd) for p in rnd.choices(platforms, weights, k=distinct or count)]
+    if distinct:
+        urls = [rnd.choice(pool) for _ in range(count)]
+    else:
+        urls = pool
+    return [BenchRequest(url, "jpg" if rnd.random() < jpg_share else "mp4") for url in urls]
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Перцентиль по ближайшему рангу."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+
+class ResourceSampler:
+    """Пиковые RSS и число открытых дескрипторов процесса (опрос /proc)."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_fds: int | None = None
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def sample(self):
+        try:
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * self._page_size
+            fds = len(os.listdir("/proc/self/fd"))
+        except OSError:
+            # Не Linux: только пик RSS за все время жизни процесса
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+            fds = None
+        self.peak_rss = max(self.peak_rss, rss)
+        if fds is not None:
+            self.peak_fds = max(self.peak_fds or 0, fds)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+class CompletionWatcher:
+    """
+    Middleware сессии бота: замечает итог задачи по исходящим запросам
+    в чат (отправка файла - успех, сообщение с "❌" - ошибка).
+    """
+
+    def __init__(self):
+        self.waiters: dict[int, asyncio.Future] = {}
+
+    async def __call__(self, make_request, bot, method):
+        result = await make_request(bot, method)
+        future = self.waiters.get(getattr(method, "chat_id", None))
+        if future is not None and not future.done():
+            if isinstance(method, (SendVideo, SendPhoto, SendDocument, SendAnimation)):
+                future.set_result((True, None))
+            elif isinstance(method, (SendMessage, EditMessageText)) and method.text.startswith("❌"):
+                future.set_result((False, method.text))
+        return result
+
+
+class Result:
+    def __init__(self, request: BenchRequest, ok: bool, detail: str | None, latency: float):
+        self.request = request
+        self.ok = ok
+        self.detail = detail
+        self.latency = latency
+
+
+class Report:
+    """Итоги прогона."""
+
+    def __init__(self, mode: str, concurrency: int, results: list[Result], duration: float,
+                 sampler: ResourceSampler, reasons: dict[str, int], stats: dict[str, str]):
+        self.mode = mode
+        self.concurrency = concurrency
+        self.results = results
+        self.duration = duration
+        self.peak_rss = sampler.peak_rss
+        self.peak_fds = sampler.peak_fds
+        self.reasons = reasons
+        self.stats = stats
+
+    def to_dict(self) -> dict:
+        latencies = [r.latency for r in self.results]
+        ok = sum(1 for r in self.results if r.ok)
+        return {
+            "mode": self.mode,
+            "concurrency": self.concurrency,
+            "requests": len(self.results),
+            "ok": ok,
+            "failed": len(self.results) - ok,
+            "failure_reasons": self.reasons,
+            "duration_s": round(self.duration, 3),
+            "throughput_rps": round(len(self.results) / self.duration, 3) if self.duration else None,
+            "latency_s": {
+                name: None if value is None else round(value, 4)
+                for name, value in (
+                    ("p50", percentile(latencies, 0.50)),
+                    ("p95", percentile(latencies, 0.95)),
+                    ("p99", percentile(latencies, 0.99)),
+                    ("max", max(latencies, default=None)),
+                )
+            },
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+            "peak_fds": self.peak_fds,
+            "stats": self.stats,
+        }
+
+    def format(self) -> str:
+        d = self.to_dict()
+        lat = d["latency_s"]
+        reasons = ", ".join(f"{k}={v}" for k, v in sorted(d["failure_reasons"].items())) or "-"
+        lines = [
+            f"mode={d['mode']} requests={d['requests']} concurrency={d['concurrency']}",
+            f"ok={d['ok']} failed={d['failed']} ({reasons})",
+            f"duration={d['duration_s']}s throughput={d['throughput_rps']} req/s",
+            f"latency p50={lat['p50']}s p95={lat['p95']}s p99={lat['p99']}s max={lat['max']}s",
+            f"peak RSS={d['peak_rss_mb']} MB, peak FDs={d['peak_fds']}",
+        ]
+        lines += [f"{name}: {value}" for name, value in d["stats"].items()]
+        return "\n".join(lines)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_app(workdir: str, passthrough: bool = False):
+    """
+    Импортирует app с конфигом для стенда: временные папки и базы,
+    бэкенды в памяти, без сохранения статистики провайдеров.
+    Конфиг меняется до импорта - значения по умолчанию берутся при импорте модулей.
+    """
+    if "app" in sys.modules:
+        return sys.modules["app"]
+    os.environ["TELEGRAM_BOT_TOKEN"] = BENCH_TOKEN
+    config.STORAGE_DIR = os.path.join(workdir, "downloads")
+    config.TMPFS_DIR = None
+    config.PROVIDER_HEALTH_FILE = None
+    config.JOB_STORE_PATH = os.path.join(workdir, "jobs.db")
+    config.JOB_QUEUE_BACKEND = "memory"
+    config.FSM_STORAGE = "memory"
+    config.RESULT_CACHE_BACKEND = "memory"
+    config.DOWNLOAD_EXECUTOR = "thread"  # Имитация yt-dlp берет профиль из памяти процесса
+    config.URL_PASSTHROUGH_ENABLED = passthrough
+    return importlib.import_module("app")
+
+
+class Harness:
+    """Стенд + бот, настроенный на него; прогон нагрузки и отчет."""
+
+    def __init__(
+        self,
+        profile: fake_upstream.UpstreamProfile,
+        mode: str = "download",
+        concurrency: int = 10,
+        timeout: float = 300.0,
+        passthrough: bool = False,
+    ):
+        if mode not in ("download", "callback"):
+            raise ValueError(f"Неизвестный режим: {mode}")
+        self.profile = profile
+        self.mode = mode
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.passthrough = passthrough
+        self.watcher = CompletionWatcher()
+        self.app = None
+        self._process = None
+        self._workers: list[asyncio.Task] = []
+        self._next_user = 10**9
+        self.port = None
+        self.workdir = None
+
+    async def __aenter__(self) -> "Harness":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        global _upstream_port
+        self.workdir = tempfile.mkdtemp(prefix="savebot-bench-")
+        self.port = _free_port()
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=fake_upstream.run, args=(self.profile.to_dict(), "127.0.0.1", self.port), daemon=True
+        )
+        self._process.start()
+        await self._wait_ready()
+
+        _upstream_port = self.port
+        _ytdlp_profile.update(
+            latency=self.profile.ytdlp_latency,
+            failure_rate=self.profile.ytdlp_failure_rate,
+            payload_bytes=self.profile.payload_bytes,
+        )
+
+        app = self.app = load_app(self.workdir, self.passthrough)
+        app.http_pool.request_class = UpstreamRequest
+        app.http_pool.resolver = UpstreamResolver()
+        app.run_ytdlp = fake_ytdlp
+        session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{self.port}"))
+        session.middleware(self.watcher)
+        session.middleware(app.outbound_limiter)
+        app.bot = Bot(token=BENCH_TOKEN, session=session)
+
+        await app.http_pool.start()
+        app.download_scheduler.start()
+        if self.mode == "callback":
+            # Как в main() для BOT_ROLE=all
+            self._workers = [asyncio.create_task(app.job_worker(i)) for i in range(config.JOB_WORKERS)]
+            self._workers.append(asyncio.create_task(app.job_feeder()))
+            self._workers.append(asyncio.create_task(app.queue_position_updater()))
+
+    async def _wait_ready(self):
+        url = f"http://127.0.0.1:{self.port}/healthz"
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                try:
+                    async with session.get(url) as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Стенд не запустился")
+
+    async def upstream_stats(self) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{self.port}/stats") as response:
+                return await response.json()
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        app = self.app
+        if app is not None:
+            await app.http_pool.close()
+            app.download_scheduler.shutdown()
+            await app.bot.session.close()
+            await app.job_queue.close()
+            app.job_store.close()
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    # -------- Один запрос --------
+    async def _download(self, request: BenchRequest) -> tuple[bool, str | None]:
+        async with self.app.storage.job():
+            ok, result = await self.app.download_content(request.url, request.format_type)
+        return ok, None if ok else str(result)
+
+    async def _callback(self, request: BenchRequest) -> tuple[bool, str | None]:
+        app = self.app
+        self._next_user += 1
+        user_id = self._next_user
+        future = asyncio.get_running_loop().create_future()
+        self.watcher.waiters[user_id] = future
+        try:
+            # Ссылка уже прислана, пользователь нажимает кнопку формата
+            state = app.dp.fsm.get_context(bot=app.bot, chat_id=user_id, user_id=user_id)
+            await state.set_data({"link": request.url})
+            update = types.Update.model_validate({
+                "update_id": user_id,
+                "callback_query": {
+                    "id": str(user_id),
+                    "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+                    "chat_instance": "bench",
+                    "data": f"format_{request.format_type}",
+                    "message": {
+                        "message_id": 1,
+                        "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"},
+                        "text": "Выберите формат",
+                    },
+                },
+            }, context={"bot": app.bot})
+            await app.dp.feed_update(app.bot, update)
+            return await future
+        finally:
+            self.watcher.waiters.pop(user_id, None)
+
+    # -------- Прогон --------
+    async def run(self, requests: list[BenchRequest]) -> Report:
+        execute = self._download if self.mode == "download" else self._callback
+        slots = asyncio.Semaphore(self.concurrency)
+        results: list[Result] = []
+        sampler = ResourceSampler()
+        sampler_task = asyncio.create_task(sampler.run())
+        started = time.monotonic()
+
+        async def one(request: BenchRequest):
+            if request.at is not None:
+                # Открытая нагрузка (повтор трафика): задержка считается от момента прихода
+                await asyncio.sleep(max(0.0, started + request.at - time.monotonic()))
+                arrived = time.monotonic()
+            async with slots:
+                if request.at is None:
+                    arrived = time.monotonic()
+                try:
+                    ok, detail = await asyncio.wait_for(execute(request), self.timeout)
+                except asyncio.TimeoutError:
+                    ok, detail = False, "❌ Превышено время ожидания (бенчмарк)"
+                except Exception as e:
+                    ok, detail = False, f"{type(e).__name__}: {e}"
+                results.append(Result(request, ok, detail, time.monotonic() - arrived))
+
+        try:
+            await asyncio.gather(*(one(r) for r in requests))
+        finally:
+            sampler_task.cancel()
+        duration = time.monotonic() - started
+        sampler.sample()
+
+        reasons: dict[str, int] = {}
+        for r in results:
+            if not r.ok:
+                reason = self.app.failure_reason(r.detail or "")
+                reasons[reason] = reasons.get(reason, 0) + 1
+        upstream = await self.upstream_stats()
+        stats = {
+            "http": self.app.http_pool.format_stats(),
+            "yt-dlp pool": self.app.download_scheduler.format_stats(),
+            "cache": self.app.result_cache.format_stats(),
+            "telegram": self.app.outbound_limiter.format_stats(),
+            "upstream": ", ".join(f"{host}={n}" for host, n in sorted(upstream.items(), key=lambda kv: -kv[1])),
+        }
+        return Report(self.mode, self.concurrency, results, duration, sampler, reasons, stats)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Параметры стенда и прогона (общие с replay)."""
+    parser.add_argument("--mode", choices=("download", "callback"), default="download")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Сек. на один запрос")
+    parser.add_argument("--latency", type=float, default=0.05, help="Сек. до ответа сервиса")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument("--redirects", type=int, default=0, help="Редиректов CDN до файла")
+    parser.add_argument("--payload-kb", type=int, default=512)
+    parser.add_argument("--tg-latency", type=float, default=0.02)
+    parser.add_argument("--tg-429-rate", type=float, default=0.0)
+    parser.add_argument("--ytdlp-latency", type=float, default=1.0)
+    parser.add_argument("--ytdlp-failure-rate", type=float, default=0.5)
+    parser.add_argument("--passthrough", action="store_true", help="Разрешить передачу ссылок в Telegram")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить отчет в JSON")
+    parser.add_argument("--log-level", default="CRITICAL", help="Логи бота (отказы провайдеров - ERROR)")
+
+
+def profile_from_args(args) -> fake_upstream.UpstreamProfile:
+    return fake_upstream.UpstreamProfile(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        redirects=args.redirects,
+        payload_bytes=args.payload_kb * 1024,
+        tg_latency=args.tg_latency,
+        tg_429_rate=args.tg_429_rate,
+        ytdlp_latency=args.ytdlp_latency,
+        ytdlp_failure_rate=args.ytdlp_failure_rate,
+        seed=args.seed,
+    )
+
+
+async def run_benchmark(args, requests: list[BenchRequest]) -> Report:
+    # До импорта app: его basicConfig(INFO) тогда ничего не меняет
+    logging.basicConfig(level=args.log_level)
+    async with Harness(
+        profile_from_args(args), mode=args.mode, concurrency=args.concurrency,
+        timeout=args.timeout, passthrough=args.passthrough,
+    ) as harness:
+        return await harness.run(requests)
+
+
+def emit_report(report: Report, json_path: str | None):
+    print(report.format())
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def _parse_mix(raw: str) -> dict[str, float]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name not in URL_MAKERS:
+            raise argparse.ArgumentTypeError(f"Неизвестная платформа: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузок на локальном стенде")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("tiktok=4,youtube=3,instagram=2,facebook=1"),
+                        help="Доли платформ: tiktok=4,youtube=3,...")
+    parser.add_argument("--distinct", type=int, default=None, help="Разных ссылок (по умолчанию все разные)")
+    parser.add_argument("--jpg-share", type=float, default=0.0, help="Доля запросов фото")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    requests = synthetic_requests(args.requests, args.mix, args.distinct, args.jpg_share, args.seed)
+    emit_report(asyncio.run(run_benchmark(args, requests)), args.json_path)
+
+
+if __name__ == "__main__":
+    main()
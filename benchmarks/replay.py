@@ -0,0 +1,99 @@
+"""
+Воспроизведение записанного трафика (traffic_recorder) на локальном стенде.
+Моменты прихода запросов берутся из записи и сжимаются в --speed раз
+(1x, 10x, 100x); доли платформ и форматов, повторы одних и тех же ссылок
+и всплески - как в проде. Каждому хешу ссылки соответствует одна
+синтетическая ссылка его платформы, так что кеш file_id и объединение
+загрузок срабатывают на тех же повторах.
+
+Пользователи не записываются: в режиме callback у каждого запроса свой
+пользователь, поэтому отказы по лимиту (throttled) не воспроизводятся -
+такие записи по умолчанию пропускаются (--include-throttled).
+
+Пример:
+    python -m benchmarks.replay traffic.tsv.gz --speed 10 --latency 0.2 --failure-rate 0.1
+"""
+
+import argparse
+import asyncio
+import random
+
+from benchmarks.harness import (
+    URL_MAKERS,
+    BenchRequest,
+    add_profile_arguments,
+    emit_report,
+    percentile,
+    run_benchmark,
+)
+from traffic_recorder import TrafficRecord, read_records
+
+
+def _other_url(rnd: random.Random) -> str:
+    # Платформа не распознана: ссылка на неизвестный сайт (стенд отдает HTML-страницу)
+    return f"https://video.bench.test/watch/{rnd.getrandbits(48):012x}"
+
+
+def replay_requests(
+    records: list[TrafficRecord],
+    speed: float = 1.0,
+    include_throttled: bool = False,
+) -> list[BenchRequest]:
+    """Запросы с моментами прихода (at) из записи, ускоренной в speed раз."""
+    if not include_throttled:
+        records = [r for r in records if r.outcome != "throttled"]
+    if not records:
+        return []
+    started = records[0].ts
+    urls: dict[tuple[str, str], str] = {}
+    requests = []
+    for r in records:
+        key = (r.platform, r.url_hash)
+        if key not in urls:
+            make_url = URL_MAKERS.get(r.platform, _other_url)
+            urls[key] = make_url(random.Random(r.url_hash))
+        requests.append(BenchRequest(urls[key], r.format_type, at=(r.ts - started) / speed))
+    return requests
+
+
+def describe_records(records: list[TrafficRecord]) -> str:
+    """Итоги самой записи - для сравнения с итогами прогона."""
+    outcomes: dict[str, int] = {}
+    for r in records:
+        outcomes[r.outcome] = outcomes.get(r.outcome, 0) + 1
+    latencies = [r.latency for r in records if r.outcome != "throttled"]
+    span = records[-1].ts - records[0].ts if records else 0.0
+    p50, p95 = (percentile(latencies, q) for q in (0.50, 0.95))
+    return (
+        f"{len(records)} requests over {span:.0f}s, "
+        f"distinct={len({r.url_hash for r in records})}, "
+        f"outcomes: {', '.join(f'{k}={v}' for k, v in sorted(outcomes.items()))}, "
+        f"latency p50={p50 and round(p50, 3)}s p95={p95 and round(p95, 3)}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повтор записанного трафика на локальном стенде")
+    parser.add_argument("path", help="Файл записи (TRAFFIC_RECORD_PATH)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение: 1, 10, 100...")
+    parser.add_argument("--limit", type=int, default=None, help="Только первые N запросов")
+    parser.add_argument("--include-throttled", action="store_true", help="Повторять и отказы по лимиту")
+    add_profile_arguments(parser)
+    # Нагрузка открытая: темп задает запись, а не число одновременных запросов
+    parser.set_defaults(mode="callback", concurrency=1000)
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed должен быть больше 0")
+
+    records = read_records(args.path)[:args.limit]
+    if not records:
+        parser.error(f"В {args.path} нет записей")
+    requests = replay_requests(records, args.speed, args.include_throttled)
+    report = asyncio.run(run_benchmark(args, requests))
+    report.stats["recorded"] = describe_records(records)
+    report.stats["replay"] = f"speed={args.speed:g}x"
+    emit_report(report, args.json_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Circuit breaker на каждый внешний хост.
+closed -> (N ошибок подряд) -> open -> (cooldown) -> half-open -> проба:
+успех закрывает цепь, ошибка снова открывает. Пока цепь открыта,
+запросы к хосту отклоняются сразу, без ожидания таймаута.
+"""
+
+import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Хост временно отключен: цепь открыта."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"circuit open for {host} (retry in {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Состояние цепи для одного хоста."""
+
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = config.CIRCUIT_FAILURE_THRESHOLD,
+        cooldown: float = config.CIRCUIT_COOLDOWN,
+        half_open_probes: int = config.CIRCUIT_HALF_OPEN_PROBES,
+    ):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+
+    def before_request(self):
+        """Проверяет, можно ли идти к хосту. Бросает CircuitOpenError."""
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.cooldown:
+                raise CircuitOpenError(self.host, self.cooldown - elapsed)
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"Circuit {self.host}: half-open, probing")
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                raise CircuitOpenError(self.host, 0)
+            self._probes_in_flight += 1
+
+    def release(self):
+        """Запрос завершился без вердикта (например, отменен)."""
+        if self.state == HALF_OPEN and self._probes_in_flight:
+            self._probes_in_flight -= 1
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit {self.host}: closed")
+        self.state = CLOSED
+        self.failures = 0
+        self._probes_in_flight = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit {self.host}: open after {self.failures} failure(s)")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probes_in_flight = 0
+
+
+class CircuitBreakerRegistry:
+    """Цепи по хостам, создаются по требованию."""
+
+    def __init__(self, enabled: bool = config.CIRCUIT_ENABLED, **breaker_kwargs):
+        self.enabled = enabled
+        self.breaker_kwargs = breaker_kwargs
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, url: str) -> CircuitBreaker | None:
+        if not self.enabled:
+            return None
+        host = urlsplit(url).netloc.lower()
+        if not host:
+            return None
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, **self.breaker_kwargs)
+            self._breakers[host] = breaker
+        return breaker
+
+    def open_hosts(self) -> list[str]:
+        return [host for host, b in self._breakers.items() if b.state != CLOSED]
+
+    def format_summary(self) -> str:
+        hosts = self.open_hosts()
+        return f"открыто {len(hosts)}: {', '.join(hosts[:10])}" if hosts else "все закрыты"
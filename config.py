@@ -1,3 +1,6 @@
+import os
+import socket
+
 # Telegram Bot Token
 TELEGRAM_TOKEN = ""  # <-- пусто
 
@@ -97,3 +100,171 @@ PINTEREST_COOKIES_FILE = "pinterest_cookies.txt"
 # User-Agent strings
 MOBILE_USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Mobile/15E148 Safari/604.1"
 DESKTOP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# HTTP пул соединений (один aiohttp.ClientSession на процесс)
+HTTP_POOL_LIMIT = 100  # Всего одновременных соединений
+HTTP_POOL_LIMIT_PER_HOST = 8  # Соединений на один хост
+HTTP_KEEPALIVE_TIMEOUT = 30  # Сек. держим простаивающее соединение открытым
+HTTP_DNS_CACHE_TTL = 300  # Сек. кеша DNS
+
+# Параллельный перебор зеркал: сколько кандидатов опрашиваем одновременно
+# (первый найденный URL побеждает, остальные запросы отменяются)
+RACE_ENABLED = True
+RACE_FANOUT = {
+    "youtube": 3,
+    "tiktok": 4,
+    "instagram": 3,
+    "pinterest": 3,
+    "facebook": 2,
+}
+RACE_FANOUT_DEFAULT = 2
+
+# Табло здоровья провайдеров (адаптивный порядок зеркал)
+PROVIDER_HEALTH_FILE = "provider_health.json"  # Где хранить статистику между перезапусками
+PROVIDER_HEALTH_WINDOW = 50  # Сколько последних попыток учитывать на провайдера
+PROVIDER_HEALTH_PRIOR_LATENCY = 5.0  # Сек., ожидаемая задержка нового провайдера
+PROVIDER_HEALTH_SAVE_INTERVAL = 60  # Сек. между сохранениями на диск
+
+# Circuit breaker на каждый внешний хост
+CIRCUIT_ENABLED = True
+CIRCUIT_FAILURE_THRESHOLD = 3  # Ошибок подряд до размыкания цепи
+CIRCUIT_COOLDOWN = 60  # Сек. хост пропускается мгновенно, затем пробный запрос
+CIRCUIT_HALF_OPEN_PROBES = 1  # Одновременных пробных запросов в half-open
+
+# Кеш результатов: (URL, формат) -> Telegram file_id
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_BACKEND = "memory"  # memory | sqlite | redis
+RESULT_CACHE_TTL = 7 * 24 * 3600  # Сек. хранения file_id
+RESULT_CACHE_MAX_ENTRIES = 10000  # LRU-лимит записей (memory/sqlite)
+RESULT_CACHE_SQLITE_PATH = "result_cache.db"
+RESULT_CACHE_REDIS_URL = "redis://localhost:6379/0"  # fakeredis://cache - сервер в процессе (без Redis)
+
+# Канонизация ссылок (ключ для кеша и объединения одинаковых запросов)
+CANONICAL_CACHE_SIZE = 5000  # Сколько раскрытых коротких ссылок помнить
+CANONICAL_RESOLVE_TIMEOUT = 10  # Сек. на раскрытие короткой ссылки
+
+# Пул загрузок yt-dlp
+DOWNLOAD_EXECUTOR = "thread"  # thread | process (процесс на задачу: не делит GIL с event loop, убивается после отмены)
+DOWNLOAD_WORKERS = 4  # Одновременных загрузок
+DOWNLOAD_QUEUE_SIZE = 50  # Ожидающих задач; сверх этого - отказ "бот перегружен"
+DOWNLOAD_PLATFORM_LIMITS = {
+    "youtube": 2,
+    "instagram": 2,
+    "tiktok": 2,
+    "facebook": 2,
+    "pinterest": 2,
+}
+DOWNLOAD_PLATFORM_LIMIT_DEFAULT = 2
+DOWNLOAD_CANCEL_GRACE = 10  # Сек. на остановку yt-dlp после таймаута (process - затем kill), потом чистка файлов
+
+# Потоковое скачивание по прямой ссылке
+DIRECT_DOWNLOAD_CHUNK_SIZE = 256 * 1024  # Байт за одну запись на диск
+ALT_API_HTML_MAX_BYTES = 2 * 1024 * 1024  # Сколько HTML зеркала просматривать в поиске ссылок
+ALT_API_HTML_CHUNK_SIZE = 64 * 1024  # Байт HTML за одно чтение (в памяти - только текущий кусок)
+
+# Временные файлы загрузок: папка на задачу, квота диска, уборка
+STORAGE_DIR = os.path.join(os.path.expanduser("~"), "Downloads", "telegram_bot")
+STORAGE_QUOTA_BYTES = 2 * 1024 * 1024 * 1024  # Общий лимит на все задачи
+STORAGE_JOB_RESERVE_BYTES = 100 * 1024 * 1024  # Резерв места под одну задачу при допуске
+STORAGE_ADMISSION_TIMEOUT = 30  # Сек. ожидания свободного места, затем отказ "бот перегружен"
+STORAGE_ORPHAN_TTL = 3600  # Сек., после которых неактивные файлы считаются брошенными
+STORAGE_JANITOR_INTERVAL = 300  # Сек. между проходами уборщика
+
+# Мелкие файлы без диска: в памяти до SMALL_MEDIA_MAX_BYTES, в tmpfs до TMPFS_MAX_BYTES
+SMALL_MEDIA_MAX_BYTES = 5 * 1024 * 1024  # Фото и короткие клипы - из памяти через BufferedInputFile
+TMPFS_DIR = "/dev/shm/telegram_bot"  # None - не использовать tmpfs
+TMPFS_MAX_BYTES = 25 * 1024 * 1024  # Средние файлы (известного размера) - в RAM-диск
+TMPFS_MIN_FREE_BYTES = 256 * 1024 * 1024  # Сколько оставлять свободным в tmpfs
+
+# Передача прямой ссылки в Telegram (он скачивает файл сам, без нашего трафика)
+URL_PASSTHROUGH_ENABLED = True
+URL_PASSTHROUGH_MAX_BYTES = 20 * 1024 * 1024  # Лимит Bot API на файлы по URL
+URL_PASSTHROUGH_PHOTO_MAX_BYTES = 5 * 1024 * 1024  # Лимит Bot API на фото по URL
+URL_PASSTHROUGH_HEAD_TIMEOUT = 10  # Сек. на HEAD-проверку ссылки
+# Ссылки этих хостов привязаны к IP запросившего - Telegram их не скачает
+URL_PASSTHROUGH_EXCLUDED_HOSTS = ("googlevideo.com",)
+
+# Режим работы: polling (один экземпляр) | webhook (aiohttp-сервер, можно несколько реплик)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный https-адрес (TLS терминирует прокси)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Проверяется в X-Telegram-Bot-Api-Secret-Token
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = 40  # Одновременных соединений от Telegram
+# При нескольких репликах - False, иначе остановка одной снимет webhook у всех
+WEBHOOK_DELETE_ON_SHUTDOWN = True
+
+# Очередь задач: прием апдейтов отделен от скачивания
+# BOT_ROLE: all - все в одном процессе | intake - только апдейты | worker - только загрузки
+BOT_ROLE = os.getenv("BOT_ROLE", "all")
+# Имя процесса-воркера в журнале задач: свои прерванные задачи он подхватывает
+# сразу после перезапуска. Должно быть постоянным между перезапусками и разным
+# у процессов (несколько worker на хосте: NODE_ID=host-1, host-2...)
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname()
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")  # memory | sqlite | redis
+JOB_WORKERS = 8  # Одновременных задач на процесс (yt-dlp дополнительно ограничен DOWNLOAD_WORKERS)
+JOB_QUEUE_SQLITE_PATH = "job_queue.db"
+# fakeredis://jobs - сервер в процессе (fakeredis[lua]): проверка без Redis, только один процесс
+JOB_QUEUE_REDIS_URL = os.getenv("JOB_QUEUE_REDIS_URL", "redis://localhost:6379/0")
+JOB_QUEUE_POLL_INTERVAL = 0.5  # Сек. между опросами SQLite другими процессами
+JOB_QUEUE_VISIBILITY_TIMEOUT = 900  # Сек., после которых взятая, но не завершенная задача возвращается
+JOB_QUEUE_HEARTBEAT_INTERVAL = 60  # Сек. между продлениями взятия задач, которые держит узел
+
+# Журнал задач и FSM, переживающие перезапуск
+JOB_STORE_PATH = "jobs.db"
+JOB_MAX_ATTEMPTS = 2  # Попыток на задачу (перезапуск посреди загрузки - тоже попытка)
+JOB_STORE_RETENTION = 7 * 24 * 3600  # Сек. хранения завершенных записей
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")  # memory | sqlite | redis
+FSM_STORAGE_SQLITE_PATH = "fsm_state.db"
+FSM_STORAGE_REDIS_URL = os.getenv("FSM_STORAGE_REDIS_URL", "redis://localhost:6379/1")
+
+# Справедливая очередь: частота задач на пользователя, лимит на чат, веса
+FAIR_USER_RATE = 0.1  # Задач в секунду на пользователя в среднем (1 за 10 сек.)
+FAIR_USER_BURST = 5  # Сколько задач подряд можно поставить сразу
+FAIR_CHAT_CONCURRENCY = 2  # Одновременных задач на чат
+FAIR_USER_WEIGHTS = {}  # user_id -> вес в round-robin (по умолчанию 1)
+# Сколько готовых к запуску задач узел держит наперед (ждущие лимита на чат
+# не считаются): свободный воркер всегда найдет задачу, остальные - другим узлам
+FAIR_PREFETCH = JOB_WORKERS
+FAIR_LOCAL_LIMIT = 100  # Всего задач в локальной очереди, вместе с ждущими лимита на чат
+FAIR_POSITION_UPDATE_INTERVAL = 5  # Сек. между правками "Вы #N в очереди"
+FAIR_POSITION_SHARED_LIMIT = 50  # Сколько задач общей очереди получают "Вы #N в очереди"
+
+# Лимиты исходящих запросов к Telegram Bot API
+TG_GLOBAL_RATE = 25  # Сообщений в секунду на бота (лимит Telegram ~30)
+TG_GLOBAL_BURST = 25
+TG_CHAT_RATE = 1  # В секунду на личный чат
+TG_CHAT_BURST = 3
+TG_GROUP_RATE = 20 / 60  # В секунду на группу (лимит Telegram 20 в минуту)
+TG_GROUP_BURST = 5
+TG_MAX_RETRIES = 3  # Повторов после 429 RetryAfter
+
+# Прогресс загрузки в сообщении "⏳ Скачиваю..."
+PROGRESS_EDIT_INTERVAL = 4  # Сек. между правками сообщения (лимит правок Telegram)
+
+# Метрики Prometheus. BOT_MODE=webhook: /metrics на том же aiohttp-сервере,
+# что и webhook (WEBAPP_PORT; прокси наружу отдает только WEBHOOK_PATH).
+# Остальные процессы (polling, BOT_ROLE=worker) - отдельный сервер на
+# METRICS_HOST:METRICS_PORT, свой порт у каждого процесса (несколько worker
+# на хосте: METRICS_PORT=9100, 9101...); если порт занят - без метрик
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Трассировка задач (span'ы по этапам загрузки)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")  # none, jsonl или otlp
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "traces.jsonl")
+TRACING_OTLP_URL = os.getenv("TRACING_OTLP_URL", "http://127.0.0.1:4318/v1/traces")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "savebot")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))  # Доля задач с трассой
+TRACING_MAX_SPANS_PER_TRACE = 500
+TRACING_EXPORT_INTERVAL = 5  # Сек. между записью пачек span'ов (файл или OTLP-коллектор)
+TRACING_MAX_BUFFER = 10000  # Span'ов в ожидании отправки, лишние отбрасываются
+
+# Запись трафика для воспроизведения в бенчмарках (benchmarks.replay)
+TRAFFIC_RECORD_ENABLED = os.getenv("TRAFFIC_RECORD_ENABLED", "0") == "1"
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", "traffic.tsv.gz")  # .gz - сжатый файл
+TRAFFIC_RECORD_SAMPLE_RATE = float(os.getenv("TRAFFIC_RECORD_SAMPLE_RATE", "1.0"))  # Доля ссылок
+TRAFFIC_RECORD_SALT = os.getenv("TRAFFIC_RECORD_SALT", "")  # Пусто - случайная соль на запуск
+TRAFFIC_RECORD_FLUSH_EVERY = 50  # Записей в пачке на диск
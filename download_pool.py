@@ -0,0 +1,358 @@
+"""
+Планировщик блокирующих загрузок yt-dlp.
+Свой пул (потоки или процессы) вместо executor по умолчанию:
+ограниченная очередь с отказом при переполнении, лимиты на платформу
+и счетчики для мониторинга. Задачи по таймауту действительно останавливаются:
+logger и hooks yt-dlp проверяют флаг отмены (и на извлечении, и на скачивании),
+недокачанные файлы удаляются. Слот пула занят, пока задача реально не
+завершилась; в режиме process задача идет в своем процессе, и не
+остановившийся за DOWNLOAD_CANCEL_GRACE процесс убивается.
+"""
+
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class CancelToken:
+    """
+    Флаг отмены задачи + файлы, которые она успела создать, + прогресс
+    (downloaded/total/speed/eta для сообщения пользователю).
+    Для ProcessPool создается на прокси multiprocessing.Manager (передается в процесс).
+    """
+
+    def __init__(self, manager=None):
+        self._event = manager.Event() if manager is not None else threading.Event()
+        self.files = manager.list() if manager is not None else []
+        self.progress = manager.dict() if manager is not None else {}
+
+    def cancel(self):
+        self._event.set()
+
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def track(self, path: str):
+        if path and path not in self.files:
+            self.files.append(path)
+
+
+def remove_partial_files(paths) -> int:
+    """Удаляет файлы задачи вместе с .part/.ytdl и фрагментами. Возвращает число удаленных."""
+    removed = 0
+    for path in list(paths):
+        candidates = {path, f"{path}.part", f"{path}.ytdl"}
+        candidates.update(glob.glob(glob.escape(path) + ".part-Frag*"))
+        candidates.update(glob.glob(glob.escape(path) + "-Frag*"))
+        for candidate in candidates:
+            try:
+                os.remove(candidate)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+class _CancelLogger:
+    """
+    Logger для yt-dlp: сообщения - в logging, и на каждом проверка отмены.
+    Извлечение (запросы страниц, повторы extractor_retries) пишет в logger
+    на каждом шаге, а progress hooks до скачивания не вызываются.
+    """
+
+    def __init__(self, cancel_token: CancelToken, exc_type: type[Exception]):
+        self._cancel_token = cancel_token
+        self._exc_type = exc_type
+        self._log = logging.getLogger("yt_dlp")
+
+    def _check(self):
+        if self._cancel_token.cancelled():
+            raise self._exc_type("cancelled by timeout")
+
+    def debug(self, msg):
+        self._check()
+        self._log.debug(msg)
+
+    def info(self, msg):
+        self._check()
+        self._log.info(msg)
+
+    def warning(self, msg):
+        self._check()
+        self._log.warning(msg)
+
+    def error(self, msg):
+        self._log.error(msg)
+
+
+def run_ytdlp(url: str, ydl_opts: dict, cancel_token: CancelToken | None = None) -> str:
+    """Скачивает через yt-dlp и возвращает путь к файлу (функция модуля - для ProcessPool)."""
+    import yt_dlp  # Ленивый импорт
+
+    opts = dict(ydl_opts)
+    if cancel_token is not None:
+        if cancel_token.cancelled():
+            raise yt_dlp.utils.DownloadCancelled("cancelled before start")
+        seen = set()
+        last_progress = [0.0]
+        download_started = [False]
+        # Время начала фаз (unix) - для трассировки: извлечение -> скачивание -> постобработка
+        cancel_token.progress["started_at"] = time.time()
+
+        def check_cancel(d):
+            for key in ("tmpfilename", "filename"):
+                path = d.get(key)
+                if path and path not in seen:
+                    seen.add(path)
+                    cancel_token.track(path)
+            if "postprocessor" not in d:
+                if not download_started[0]:
+                    download_started[0] = True
+                    cancel_token.progress["download_started_at"] = time.time()
+                if d.get("status") == "finished":
+                    cancel_token.progress["download_finished_at"] = time.time()
+            # Hook вызывается на каждый кусок - прогресс отдаем не чаще раза в полсекунды
+            now = time.monotonic()
+            if d.get("downloaded_bytes") and now - last_progress[0] >= 0.5:
+                last_progress[0] = now
+                cancel_token.progress.update({
+                    "downloaded": d["downloaded_bytes"],
+                    "total": d.get("total_bytes") or d.get("total_bytes_estimate"),
+                    "speed": d.get("speed"),
+                    "eta": d.get("eta"),
+                })
+            if cancel_token.cancelled():
+                raise yt_dlp.utils.DownloadCancelled("cancelled by timeout")
+
+        def match_filter(info, incomplete=False):
+            # Между извлечением и скачиванием
+            if cancel_token.cancelled():
+                raise yt_dlp.utils.DownloadCancelled("cancelled by timeout")
+            return None
+
+        opts["progress_hooks"] = [*opts.get("progress_hooks", []), check_cancel]
+        opts["postprocessor_hooks"] = [*opts.get("postprocessor_hooks", []), check_cancel]
+        opts.setdefault("logger", _CancelLogger(cancel_token, yt_dlp.utils.DownloadCancelled))
+        opts.setdefault("match_filter", match_filter)
+
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        file_path = ydl.prepare_filename(info)
+        if cancel_token is not None:
+            cancel_token.track(file_path)
+        return file_path
+
+
+class QueueFullError(Exception):
+    """Очередь загрузок переполнена - новая задача отклонена."""
+
+
+class DownloadKilledError(Exception):
+    """Процесс задачи убит: не остановился после отмены."""
+
+
+class _Child:
+    """Процесс одной задачи (режим process) - чтобы его можно было убить."""
+
+    def __init__(self):
+        self.process: multiprocessing.Process | None = None
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+
+
+def _child_main(conn, fn: Callable[..., Any], args: tuple):
+    try:
+        result = (True, fn(*args))
+    except BaseException as e:
+        result = (False, e)
+    try:
+        conn.send(result)
+    except Exception:
+        # Результат или исключение не сериализуются
+        conn.send((False, RuntimeError(repr(result[1])[:500])))
+    conn.close()
+
+
+def _run_in_child(child: _Child, fn: Callable[..., Any], args: tuple) -> Any:
+    """Выполняет fn(*args) в отдельном процессе и ждет результат (в потоке пула)."""
+    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_child_main, args=(send_conn, fn, args), daemon=True)
+    child.process = process
+    if child.killed:
+        raise DownloadKilledError("cancelled before start")
+    process.start()
+    send_conn.close()
+    try:
+        ok, value = recv_conn.recv()
+    except EOFError:
+        raise DownloadKilledError(f"download process exited with code {process.exitcode}") from None
+    finally:
+        process.join()
+        recv_conn.close()
+    if not ok:
+        raise value
+    return value
+
+
+class DownloadScheduler:
+    """Пул загрузок с ограниченной очередью и лимитами по платформам."""
+
+    def __init__(
+        self,
+        workers: int = config.DOWNLOAD_WORKERS,
+        max_queue: int = config.DOWNLOAD_QUEUE_SIZE,
+        executor_kind: str = config.DOWNLOAD_EXECUTOR,
+        platform_limits: dict[str, int] = config.DOWNLOAD_PLATFORM_LIMITS,
+        platform_limit_default: int = config.DOWNLOAD_PLATFORM_LIMIT_DEFAULT,
+        cancel_grace: float = config.DOWNLOAD_CANCEL_GRACE,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_kind = executor_kind
+        self.platform_limits = platform_limits
+        self.platform_limit_default = platform_limit_default
+        self.cancel_grace = cancel_grace
+        self._executor: Executor | None = None
+        self._manager = None
+        self._children: set[_Child] = set()
+        self._slots = asyncio.Semaphore(workers)
+        self._platform_slots: dict[str, asyncio.Semaphore] = {}
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def start(self) -> Executor:
+        """Создает пул (вызывается из main(), либо при первой задаче)."""
+        if self._executor is None:
+            if self.executor_kind not in ("process", "thread"):
+                raise ValueError(f"Неизвестный DOWNLOAD_EXECUTOR: {self.executor_kind}")
+            # В режиме process поток пула только запускает процесс задачи и ждет его
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ytdlp")
+            logger.info(f"Download pool started: {self.executor_kind} x{self.workers}, queue={self.max_queue}")
+        return self._executor
+
+    def new_cancel_token(self) -> CancelToken:
+        """Токен отмены, пригодный для текущего типа пула."""
+        if self.executor_kind == "process":
+            if self._manager is None:
+                self._manager = multiprocessing.Manager()
+            return CancelToken(self._manager)
+        return CancelToken()
+
+    def _platform_slot(self, platform: str | None) -> asyncio.Semaphore:
+        key = platform or "other"
+        slot = self._platform_slots.get(key)
+        if slot is None:
+            slot = asyncio.Semaphore(self.platform_limits.get(key, self.platform_limit_default))
+            self._platform_slots[key] = slot
+        return slot
+
+    async def submit(
+        self, platform: str | None, fn: Callable[..., Any], *args,
+        timeout: float | None = None, cancel_token: CancelToken | None = None,
+    ) -> Any:
+        """
+        Ставит fn(*args) в очередь и ждет результат. timeout - на само выполнение
+        (без ожидания в очереди). При переполнении очереди - QueueFullError.
+        cancel_token (тот же, что передан в args) взводится при таймауте/отмене,
+        после чего задача получает время cancel_grace на остановку, а ее файлы удаляются.
+        Слоты освобождаются, только когда задача действительно завершилась:
+        в пуле никогда не больше workers задач, и своей очереди у него нет.
+        """
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"download queue is full ({self.queued})")
+
+        executor = self.start()
+        platform_slot = self._platform_slot(platform)
+        self.queued += 1
+        try:
+            # Слоты держит сама задача: отпускаются в finished(), когда она завершится
+            await platform_slot.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                platform_slot.release()
+                raise
+        finally:
+            self.queued -= 1
+        child = _Child() if self.executor_kind == "process" else None
+        loop = asyncio.get_running_loop()
+        try:
+            if child is not None:
+                self._children.add(child)
+                future = loop.run_in_executor(executor, _run_in_child, child, fn, args)
+            else:
+                future = loop.run_in_executor(executor, fn, *args)
+        except BaseException:
+            self._slots.release()
+            platform_slot.release()
+            self._children.discard(child)
+            raise
+        self.running += 1
+
+        def finished(_):
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+            platform_slot.release()
+            self._children.discard(child)
+
+        future.add_done_callback(finished)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if cancel_token is not None:
+                await self._stop(future, cancel_token, child)
+            raise
+
+    async def _stop(self, future: asyncio.Future, cancel_token: CancelToken, child: _Child | None = None):
+        """Взводит отмену, ждет остановки задачи (процесс - убивает) и убирает ее файлы."""
+        self.cancelled += 1
+        cancel_token.cancel()
+        done, _ = await asyncio.wait([future], timeout=self.cancel_grace)
+        if not done and child is not None:
+            logger.warning("yt-dlp process did not stop within grace period, killing it")
+            child.kill()
+            done, _ = await asyncio.wait([future], timeout=self.cancel_grace)
+        if not done:
+            # Поток не прервать: слот пула остается занят, пока yt-dlp не вернется
+            logger.warning("yt-dlp job did not stop within grace period, cleaning up later")
+            future.add_done_callback(lambda f: remove_partial_files(cancel_token.files))
+        elif not future.cancelled():
+            future.exception()  # Ожидаемый DownloadCancelled - не логируем как "never retrieved"
+        removed = remove_partial_files(cancel_token.files)
+        logger.info(f"Cancelled yt-dlp job, removed {removed} file(s)")
+
+    def format_stats(self) -> str:
+        return (
+            f"running={self.running}/{self.workers}, queued={self.queued}/{self.max_queue}, "
+            f"done={self.completed}, rejected={self.rejected}, cancelled={self.cancelled}"
+        )
+
+    def shutdown(self):
+        """Останавливает пул, не дожидаясь незапущенных задач; процессы задач убиваются."""
+        for child in list(self._children):
+            child.kill()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
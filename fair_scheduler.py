@@ -0,0 +1,209 @@
+"""
+Справедливая очередь задач между пользователями.
+Token bucket на пользователя ограничивает частоту новых задач,
+задачи выбираются взвешенным round-robin по пользователям (а не FIFO),
+число одновременных задач на чат ограничено. Один пользователь
+со множеством ссылок не задерживает всех остальных.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+import config
+from job_queue import Job
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1) -> float:
+        """Сек. до появления нужного числа токенов."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate) if self.rate else float("inf")
+
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+def _user_key(job: Job) -> int:
+    return job.user_id if job.user_id is not None else job.chat_id
+
+
+class FairScheduler:
+    """Очереди по пользователям, взвешенный round-robin и лимит задач на чат."""
+
+    def __init__(
+        self,
+        user_rate: float = config.FAIR_USER_RATE,
+        user_burst: float = config.FAIR_USER_BURST,
+        chat_concurrency: int = config.FAIR_CHAT_CONCURRENCY,
+        user_weights: dict[int, int] = config.FAIR_USER_WEIGHTS,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.chat_concurrency = chat_concurrency
+        self.user_weights = user_weights
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: OrderedDict[int, deque[Job]] = OrderedDict()
+        self._credits: dict[int, int] = {}
+        self._running_per_chat: dict[int, int] = {}
+        self._running: dict[str, Job] = {}
+        self._changed = asyncio.Condition()
+        self.running = 0
+        self.throttled = 0
+
+    # -------- Частота новых задач --------
+    def allow(self, user_id: int) -> tuple[bool, float]:
+        """(можно ли поставить задачу, через сколько сек. можно будет)."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self._buckets[user_id] = bucket
+        if bucket.try_acquire():
+            return True, 0.0
+        self.throttled += 1
+        # Полные корзины не нужны - забываем, чтобы словарь не рос
+        for key in [k for k, b in self._buckets.items() if k != user_id and b.full()]:
+            del self._buckets[key]
+        return False, bucket.retry_after()
+
+    def _weight(self, user: int) -> int:
+        return max(1, self.user_weights.get(user, 1))
+
+    # -------- Очередь --------
+    async def submit(self, job: Job):
+        user = _user_key(job)
+        queue = self._queues.get(user)
+        if queue is None:
+            queue = self._queues[user] = deque()
+            self._credits[user] = self._weight(user)
+        queue.append(job)
+        async with self._changed:
+            self._changed.notify_all()
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def ready(self) -> int:
+        """Ожидающие задачи, которые можно начать сразу (чат не уперся в лимит)."""
+        free: dict[int, int] = {}
+        count = 0
+        for queue in self._queues.values():
+            for job in queue:
+                slots = free.get(job.chat_id)
+                if slots is None:
+                    slots = self.chat_concurrency - self._running_per_chat.get(job.chat_id, 0)
+                if slots > 0:
+                    count += 1
+                free[job.chat_id] = slots - 1
+        return count
+
+    def held(self) -> list[Job]:
+        """Задачи узла: ожидающие и выполняемые."""
+        return [job for queue in self._queues.values() for job in queue] + list(self._running.values())
+
+    def _pick(self) -> Job | None:
+        """Следующая задача по взвешенному round-robin с учетом лимита на чат."""
+        for _ in range(len(self._queues)):
+            user, queue = next(iter(self._queues.items()))
+            job = next(
+                (j for j in queue if self._running_per_chat.get(j.chat_id, 0) < self.chat_concurrency),
+                None,
+            )
+            if job is None:
+                # Все чаты пользователя заняты - ход следующему
+                self._queues.move_to_end(user)
+                self._credits[user] = self._weight(user)
+                continue
+            queue.remove(job)
+            self._credits[user] -= 1
+            if not queue:
+                del self._queues[user]
+                del self._credits[user]
+            elif self._credits[user] <= 0:
+                self._queues.move_to_end(user)
+                self._credits[user] = self._weight(user)
+            return job
+        return None
+
+    async def next(self) -> Job:
+        """Ждет и возвращает следующую задачу (слот занят до done())."""
+        async with self._changed:
+            while True:
+                job = self._pick()
+                if job is not None:
+                    self._running_per_chat[job.chat_id] = self._running_per_chat.get(job.chat_id, 0) + 1
+                    self._running[job.job_id] = job
+                    self.running += 1
+                    self._changed.notify_all()
+                    return job
+                await self._changed.wait()
+
+    async def done(self, job: Job):
+        count = self._running_per_chat.get(job.chat_id, 0) - 1
+        if count > 0:
+            self._running_per_chat[job.chat_id] = count
+        else:
+            self._running_per_chat.pop(job.chat_id, None)
+        self._running.pop(job.job_id, None)
+        self.running -= 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    def drain(self) -> list[Job]:
+        """Забирает все ожидающие задачи (остановка: вернуть их в общую очередь)."""
+        jobs = [job for queue in self._queues.values() for job in queue]
+        self._queues.clear()
+        self._credits.clear()
+        return jobs
+
+    def positions(self) -> list[tuple[Job, int]]:
+        """
+        Место каждой ожидающей задачи (1 - следующая), если очередь
+        будет разбираться тем же round-robin (без учета лимита на чат).
+        """
+        ring = [(user, list(queue), self._credits[user]) for user, queue in self._queues.items()]
+        result: list[tuple[Job, int]] = []
+        position = 0
+        while ring:
+            next_ring = []
+            for user, jobs, credits in ring:
+                for job in jobs[:credits]:
+                    position += 1
+                    result.append((job, position))
+                rest = jobs[credits:]
+                if rest:
+                    next_ring.append((user, rest, self._weight(user)))
+            ring = next_ring
+        return result
+
+    async def wait_changed(self):
+        """Ждет любого изменения очереди (для обновления сообщений о месте)."""
+        async with self._changed:
+            await self._changed.wait()
+
+    def format_stats(self) -> str:
+        return (
+            f"running={self.running}, waiting={self.pending()}, "
+            f"users={len(self._queues)}, throttled={self.throttled}"
+        )
@@ -0,0 +1,77 @@
+"""
+Хранилище FSM (состояние диалога и введенная ссылка), переживающее перезапуск.
+aiogram по умолчанию держит его в памяти - после рестарта пользователь
+теряет уже отправленную ссылку. Бэкенды: память, SQLite, Redis (штатный aiogram).
+"""
+
+import json
+import sqlite3
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import config
+
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в файле SQLite: одна строка (state, data) на ключ."""
+
+    def __init__(self, path: str = config.FSM_STORAGE_SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}')"
+        )
+        self._conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        self._conn.execute(
+            "INSERT INTO fsm (key, state) VALUES (?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET state = excluded.state",
+            (_key(key), value),
+        )
+        self._conn.commit()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        row = self._conn.execute("SELECT state FROM fsm WHERE key = ?", (_key(key),)).fetchone()
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO fsm (key, data) VALUES (?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            (_key(key), json.dumps(data)),
+        )
+        # Пустые записи (после state.clear()) не копим
+        self._conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'", (_key(key),))
+        self._conn.commit()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        row = self._conn.execute("SELECT data FROM fsm WHERE key = ?", (_key(key),)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+def create_fsm_storage(name: str = config.FSM_STORAGE) -> BaseStorage:
+    """Создает хранилище FSM по имени из конфига."""
+    if name == "memory":
+        return MemoryStorage()
+    if name == "sqlite":
+        return SQLiteStorage()
+    if name == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("Для FSM_STORAGE='redis' нужен пакет redis") from e
+        return RedisStorage.from_url(config.FSM_STORAGE_REDIS_URL)
+    raise ValueError(f"Неизвестный FSM_STORAGE: {name}")
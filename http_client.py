@@ -0,0 +1,160 @@
+"""
+Общий пул HTTP-соединений для всех методов скачивания.
+Один aiohttp.ClientSession на процесс: keep-alive, кеш DNS и лимиты на хост.
+Каждый запрос проходит через circuit breaker своего хоста.
+"""
+
+import asyncio
+import contextlib
+import logging
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import config
+import tracing
+from circuit_breaker import CircuitBreakerRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class HttpSessionManager:
+    """Процессный aiohttp.ClientSession с настроенным TCPConnector и статистикой."""
+
+    def __init__(
+        self,
+        limit: int = config.HTTP_POOL_LIMIT,
+        limit_per_host: int = config.HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = config.HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = config.HTTP_DNS_CACHE_TTL,
+        breakers: CircuitBreakerRegistry | None = None,
+        request_class: type[aiohttp.ClientRequest] = aiohttp.ClientRequest,
+        resolver: aiohttp.abc.AbstractResolver | None = None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.breakers = breakers
+        # Подменяются в бенчмарках: запросы уходят в локальный стенд
+        self.request_class = request_class
+        self.resolver = resolver
+        self._session: aiohttp.ClientSession | None = None
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        """Счетчики запросов, новых/переиспользованных соединений и DNS."""
+        trace = aiohttp.TraceConfig()
+
+        def counter(key):
+            async def _inc(session, ctx, params):
+                self.stats[key] += 1
+            return _inc
+
+        trace.on_request_start.append(counter("requests"))
+        trace.on_connection_create_end.append(counter("connections_created"))
+        trace.on_connection_reuseconn.append(counter("connections_reused"))
+        trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Создает сессию (вызывается из main())."""
+        return self.get_session()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая ее при первом обращении."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                enable_cleanup_closed=True,
+                resolver=self.resolver,
+            )
+            # Cookies не храним между запросами: разные пользователи и зеркала
+            # не должны видеть чужие сессии (как было с сессией на попытку)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                trace_configs=[self._build_trace_config()],
+                request_class=self.request_class,
+            )
+            logger.info(
+                "HTTP pool started: limit=%s, per_host=%s, keepalive=%ss, dns_ttl=%ss",
+                self.limit, self.limit_per_host, self.keepalive_timeout, self.dns_cache_ttl,
+            )
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """
+        Запрос через общую сессию (используется как `async with`).
+        Если цепь хоста открыта - сразу CircuitOpenError. 5xx/429, ошибки
+        соединения и таймауты (в том числе при чтении тела) считаются сбоем
+        хоста, остальное - успехом. Вердикт записывается один раз, при выходе
+        из блока: ответ уже прочитан или чтение оборвалось.
+        """
+        breaker = self.breakers.get(url) if self.breakers else None
+        if breaker:
+            breaker.before_request()
+
+        host_ok = None  # None - без вердикта (отмена, ошибка до ответа не по вине хоста)
+        try:
+            with tracing.span("http", method=method, host=urlsplit(url).netloc) as span:
+                async with self.get_session().request(method, url, **kwargs) as response:
+                    if span is not None:
+                        span.set(status=response.status)
+                    status_ok = response.status < 500 and response.status != 429
+                    try:
+                        yield response
+                    except Exception:
+                        # Ошибка вызывающего кода - хост ответил, вердикт по статусу
+                        host_ok = status_ok
+                        raise
+                    host_ok = status_ok
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            host_ok = False
+            raise
+        finally:
+            if breaker:
+                if host_ok is None:
+                    breaker.release()
+                elif host_ok:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def reuse_ratio(self) -> float:
+        """Доля запросов, обслуженных уже открытым соединением."""
+        total = self.stats["connections_created"] + self.stats["connections_reused"]
+        return self.stats["connections_reused"] / total if total else 0.0
+
+    def format_stats(self) -> str:
+        s = self.stats
+        return (
+            f"requests={s['requests']}, new={s['connections_created']}, "
+            f"reused={s['connections_reused']} ({self.reuse_ratio():.0%}), "
+            f"dns hit/miss={s['dns_cache_hits']}/{s['dns_cache_misses']}"
+        )
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула."""
+        if self._session is not None and not self._session.closed:
+            logger.info("HTTP pool stats: %s", self.format_stats())
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,383 @@
+"""
+Очередь задач на скачивание.
+Обработчики Telegram только ставят задачу (ссылка, формат, чат, сообщение),
+а воркеры - в этом же процессе или на других узлах - качают и отправляют.
+Бэкенды: asyncio.Queue в памяти, SQLite (переживает перезапуск, общий
+для процессов одной машины), Redis-совместимый сервер (для нескольких узлов).
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Задача на скачивание: что качать и куда отправить."""
+
+    def __init__(
+        self,
+        url: str,
+        format_type: str,
+        chat_id: int,
+        message_id: int,
+        user_id: int | None = None,
+        job_id: str | None = None,
+        created_at: float | None = None,
+    ):
+        self.url = url
+        self.format_type = format_type
+        self.chat_id = chat_id
+        self.message_id = message_id  # Сообщение "⏳ Скачиваю..." для правки
+        self.user_id = user_id
+        self.job_id = job_id or uuid.uuid4().hex
+        self.created_at = created_at or time.time()
+
+    def to_json(self) -> str:
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Job":
+        return cls(**json.loads(raw))
+
+
+class MemoryQueue:
+    """asyncio.Queue: только для одного процесса (BOT_ROLE=all)."""
+
+    durable = False  # Задачи не переживают перезапуск
+
+    def __init__(self):
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+
+    async def put(self, job: Job):
+        self._queue.put_nowait(job)
+
+    async def get(self) -> Job:
+        return await self._queue.get()
+
+    async def ack(self, job: Job):
+        self._queue.task_done()
+
+    async def release(self, job: Job):
+        self._queue.put_nowait(job)
+
+    async def touch(self, jobs: list[Job]):
+        pass
+
+    async def peek(self, limit: int) -> list[Job]:
+        return list(itertools.islice(self._queue._queue, limit))
+
+    async def size(self) -> int:
+        return self._queue.qsize()
+
+    async def close(self):
+        pass
+
+
+class SQLiteQueue:
+    """
+    Таблица задач в SQLite. Задача забирается атомарно (BEGIN IMMEDIATE),
+    поэтому из одного файла могут читать несколько процессов-воркеров.
+    Незавершенные задачи (воркер упал) возвращаются в очередь через visibility_timeout.
+    Запросы идут в отдельном потоке: ожидание блокировки файла другим
+    процессом не останавливает event loop.
+    """
+
+    durable = True
+
+    def __init__(
+        self,
+        path: str = config.JOB_QUEUE_SQLITE_PATH,
+        poll_interval: float = config.JOB_QUEUE_POLL_INTERVAL,
+        visibility_timeout: float = config.JOB_QUEUE_VISIBILITY_TIMEOUT,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        # Один поток на соединение: запросы выполняются по очереди
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+        self._conn = sqlite3.connect(path, isolation_level=None, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT UNIQUE NOT NULL,"
+            " payload TEXT NOT NULL, claimed_at REAL)"
+        )
+        self._wakeup = asyncio.Event()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _put(self, job: Job):
+        self._conn.execute(
+            "INSERT INTO job_queue (job_id, payload) VALUES (?, ?)"
+            " ON CONFLICT(job_id) DO UPDATE SET claimed_at = NULL",
+            (job.job_id, job.to_json()),
+        )
+
+    async def put(self, job: Job):
+        await self._run(self._put, job)
+        self._wakeup.set()
+
+    def _claim(self) -> Job | None:
+        expired = time.time() - self.visibility_timeout
+        available = "SELECT id, payload FROM job_queue WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT 1"
+        # Пустая очередь - без блокировки на запись (опрос идет от каждого воркера)
+        if self._conn.execute(available, (expired,)).fetchone() is None:
+            return None
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(available, (expired,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE job_queue SET claimed_at = ? WHERE id = ?", (time.time(), row[0]))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return Job.from_json(row[1]) if row else None
+
+    async def get(self) -> Job:
+        while True:
+            job = await self._run(self._claim)
+            if job is not None:
+                return job
+            # Новые задачи этого процесса будят сразу, чужие - по опросу
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _ack(self, job: Job):
+        self._conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job.job_id,))
+
+    async def ack(self, job: Job):
+        await self._run(self._ack, job)
+
+    async def release(self, job: Job):
+        # put снимает отметку о взятии, а удаленную задачу вставляет заново
+        await self.put(job)
+
+    def _touch(self, jobs: list[Job]):
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE job_queue SET claimed_at = ? WHERE job_id = ? AND claimed_at IS NOT NULL",
+            [(now, job.job_id) for job in jobs],
+        )
+
+    async def touch(self, jobs: list[Job]):
+        await self._run(self._touch, jobs)
+
+    def _peek(self, limit: int) -> list[Job]:
+        rows = self._conn.execute(
+            "SELECT payload FROM job_queue WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+            (time.time() - self.visibility_timeout, limit),
+        ).fetchall()
+        return [Job.from_json(row[0]) for row in rows]
+
+    async def peek(self, limit: int) -> list[Job]:
+        return await self._run(self._peek, limit)
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM job_queue WHERE claimed_at IS NULL").fetchone()[0]
+
+    async def size(self) -> int:
+        return await self._run(self._size)
+
+    async def close(self):
+        await self._run(self._conn.close)
+        self._executor.shutdown()
+
+
+class RedisQueue:
+    """
+    Список в Redis-совместимом сервере. Задача атомарно (Lua) переносится
+    из списка в ZSET "в работе" с временем взятия и удаляется из него после ack.
+    Взятые дольше visibility_timeout назад (воркер упал) возвращаются в очередь
+    при опросе любым воркером - как в SQLiteQueue.
+    """
+
+    durable = True
+
+    # Забрать задачу: LPOP + ZADD со временем взятия одним шагом
+    _CLAIM = """
+local raw = redis.call('LPOP', KEYS[1])
+if raw then redis.call('ZADD', KEYS[2], ARGV[1], raw) end
+return raw
+"""
+    # Вернуть в очередь задачи, взятые раньше ARGV[1]
+    _RESTORE = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, raw in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], raw)
+    redis.call('RPUSH', KEYS[1], raw)
+end
+return #expired
+"""
+    # Вернуть задачу в начало очереди: из "в работе" или, если ее нет нигде, заново
+    _RELEASE = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 1 or not redis.call('LPOS', KEYS[1], ARGV[1]) then
+    redis.call('LPUSH', KEYS[1], ARGV[1])
+end
+"""
+
+    def __init__(
+        self,
+        url: str = config.JOB_QUEUE_REDIS_URL,
+        key: str = "savebot:jobs",
+        poll_interval: float = config.JOB_QUEUE_POLL_INTERVAL,
+        visibility_timeout: float = config.JOB_QUEUE_VISIBILITY_TIMEOUT,
+    ):
+        self.key = key
+        self.claims_key = f"{key}:claims"
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self._client = redis_client.connect(url, "JOB_QUEUE_BACKEND")
+        self._claim = self._client.register_script(self._CLAIM)
+        self._restore = self._client.register_script(self._RESTORE)
+        self._release = self._client.register_script(self._RELEASE)
+        self._raw: dict[str, str] = {}
+        self._wakeup = asyncio.Event()
+        self._restored_at = 0.0
+
+    async def put(self, job: Job):
+        await self._client.rpush(self.key, job.to_json())
+        self._wakeup.set()
+
+    async def _restore_expired(self):
+        """Не чаще раза в poll_interval: задачи упавших воркеров - обратно в очередь."""
+        now = time.time()
+        if now - self._restored_at < self.poll_interval:
+            return
+        self._restored_at = now
+        restored = await self._restore(keys=[self.key, self.claims_key], args=[now - self.visibility_timeout])
+        if restored:
+            logger.warning(f"Requeued {restored} job(s) claimed more than {self.visibility_timeout}s ago")
+
+    async def get(self) -> Job:
+        while True:
+            await self._restore_expired()
+            raw = await self._claim(keys=[self.key, self.claims_key], args=[time.time()])
+            if raw is not None:
+                job = Job.from_json(raw)
+                self._raw[job.job_id] = raw
+                return job
+            # Новые задачи этого процесса будят сразу, чужие - по опросу
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack(self, job: Job):
+        raw = self._raw.pop(job.job_id, None) or job.to_json()
+        await self._client.zrem(self.claims_key, raw)
+
+    async def release(self, job: Job):
+        raw = self._raw.pop(job.job_id, None) or job.to_json()
+        await self._release(keys=[self.key, self.claims_key], args=[raw])
+        self._wakeup.set()
+
+    async def touch(self, jobs: list[Job]):
+        claims = {self._raw[job.job_id]: time.time() for job in jobs if job.job_id in self._raw}
+        if claims:
+            # XX: только еще взятые, задачу, уже возвращенную в очередь, не трогаем
+            await self._client.zadd(self.claims_key, claims, xx=True)
+
+    async def peek(self, limit: int) -> list[Job]:
+        return [Job.from_json(raw) for raw in await self._client.lrange(self.key, 0, limit - 1)]
+
+    async def size(self) -> int:
+        return await self._client.llen(self.key)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+BACKENDS = {
+    "memory": MemoryQueue,
+    "sqlite": SQLiteQueue,
+    "redis": RedisQueue,
+}
+
+
+def create_backend(name: str = config.JOB_QUEUE_BACKEND):
+    """Создает бэкенд по имени из конфига."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный JOB_QUEUE_BACKEND: {name}")
+
+
+class JobQueue:
+    """Очередь задач со счетчиками для /status."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+
+    def _backend(self):
+        """Бэкенд из конфига создается при первом обращении (внутри event loop)."""
+        if self.backend is None:
+            self.backend = create_backend()
+        return self.backend
+
+    async def put(self, job: Job):
+        await self._backend().put(job)
+        self.enqueued += 1
+
+    async def get(self) -> Job:
+        return await self._backend().get()
+
+    async def ack(self, job: Job, ok: bool = True):
+        await self._backend().ack(job)
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+
+    async def release(self, job: Job):
+        """
+        Возвращает взятую, но не выполненную задачу в очередь (остановка
+        воркера, восстановление после падения). В SQLite/Redis повторный
+        вызов не создает дубликат.
+        """
+        await self._backend().release(job)
+
+    async def touch(self, jobs: list[Job]):
+        """Продлевает взятие задач, которые держит узел (не вернутся по visibility timeout)."""
+        if jobs:
+            await self._backend().touch(jobs)
+
+    async def peek(self, limit: int) -> list[Job]:
+        """Первые limit ожидающих задач общей очереди по порядку."""
+        return await self._backend().peek(limit)
+
+    async def size(self) -> int:
+        return await self._backend().size()
+
+    @property
+    def durable(self) -> bool:
+        """Задачи переживают перезапуск процесса (их не нужно ставить заново)."""
+        return self._backend().durable
+
+    async def format_stats(self) -> str:
+        return (
+            f"waiting={await self.size()}, enqueued={self.enqueued}, "
+            f"done={self.processed}, failed={self.failed}"
+        )
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
@@ -0,0 +1,195 @@
+"""
+Журнал задач на скачивание в SQLite: статус, попытки, какие провайдеры
+пробовали, сообщение "⏳ Скачиваю..." для правки. После перезапуска
+незавершенные задачи продолжаются или завершаются с понятной ошибкой.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from job_queue import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Задача, которую выполняет текущий воркер (для note_provider из глубины загрузки)
+_current_job_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_job_id", default=None)
+
+
+class JobStore:
+    """
+    Записи о задачах; все операции - короткие запросы к локальному SQLite.
+    Файл общий для процессов-воркеров одной машины (WAL, ожидание блокировки).
+    Запросы идут в отдельном потоке: ожидание чужой блокировки файла не
+    останавливает event loop. Провайдеры задачи копятся в памяти и пишутся
+    один раз в finish(). У выполняемой задачи записан node_id воркера:
+    после перезапуска узел сразу подхватывает свои задачи, чужие - только зависшие.
+    """
+
+    def __init__(
+        self,
+        path: str = config.JOB_STORE_PATH,
+        stale_after: float = config.JOB_QUEUE_VISIBILITY_TIMEOUT,
+        retention: float = config.JOB_STORE_RETENTION,
+        node_id: str = config.NODE_ID,
+    ):
+        self.path = path
+        self.node_id = node_id
+        self.stale_after = stale_after
+        self.retention = retention
+        # Один поток на соединение: запросы выполняются по очереди
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, payload TEXT NOT NULL,"
+            " chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " providers TEXT NOT NULL DEFAULT '[]', error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            # Файл от версии без владельцев задач
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.commit()
+        self._providers: dict[str, list[str]] = {}  # job_id -> провайдеры текущей попытки
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _create(self, job: Job):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR IGNORE INTO jobs (job_id, payload, chat_id, message_id, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job.job_id, job.to_json(), job.chat_id, job.message_id, QUEUED, now, now),
+        )
+        self._conn.commit()
+
+    async def create(self, job: Job):
+        await self._run(self._create, job)
+
+    def _begin(self, job: Job) -> bool:
+        row = self._conn.execute(
+            "SELECT status, updated_at FROM jobs WHERE job_id = ?", (job.job_id,)
+        ).fetchone()
+        if row is None:
+            self._create(job)
+        else:
+            status, updated_at = row
+            if status in (DONE, FAILED):
+                return False
+            if status == RUNNING and time.time() - updated_at < self.stale_after:
+                return False
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, updated_at = ? WHERE job_id = ?",
+            (RUNNING, self.node_id, time.time(), job.job_id),
+        )
+        self._conn.commit()
+        return True
+
+    async def begin(self, job: Job) -> bool:
+        """
+        Отмечает начало попытки. False - задачу выполнять не нужно
+        (уже завершена или прямо сейчас выполняется другим воркером).
+        """
+        if not await self._run(self._begin, job):
+            return False
+        _current_job_id.set(job.job_id)
+        self._providers[job.job_id] = []
+        return True
+
+    def note_provider(self, provider: str):
+        """Запоминает провайдера, через которого пробует текущая задача (без записи в файл)."""
+        providers = self._providers.get(_current_job_id.get())
+        if providers is not None and provider not in providers:
+            providers.append(provider)
+
+    def _finish(self, job: Job, status: str, error: str | None, tried: list[str] | None):
+        if tried is None:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job.job_id),
+            )
+        else:
+            row = self._conn.execute("SELECT providers FROM jobs WHERE job_id = ?", (job.job_id,)).fetchone()
+            providers = json.loads(row[0]) if row else []
+            providers += [p for p in tried if p not in providers]
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, providers = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, json.dumps(providers), time.time(), job.job_id),
+            )
+        self._conn.commit()
+
+    async def finish(self, job: Job, ok: bool, error: str | None = None):
+        tried = self._providers.pop(job.job_id, None)
+        _current_job_id.set(None)
+        await self._run(self._finish, job, DONE if ok else FAILED, error, tried)
+
+    def _requeue(self, job: Job):
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+            (QUEUED, time.time(), job.job_id),
+        )
+        self._conn.commit()
+
+    async def requeue(self, job: Job):
+        """Задача снова ждет в очереди (прервана остановкой или восстановлена)."""
+        self._providers.pop(job.job_id, None)
+        await self._run(self._requeue, job)
+
+    def _outstanding(self) -> list[tuple[Job, str, int, list[str]]]:
+        rows = self._conn.execute(
+            "SELECT payload, status, attempts, providers FROM jobs"
+            " WHERE status = ? OR (status = ? AND (owner = ? OR updated_at < ?)) ORDER BY created_at",
+            (QUEUED, RUNNING, self.node_id, time.time() - self.stale_after),
+        ).fetchall()
+        return [(Job.from_json(p), status, attempts, json.loads(prov)) for p, status, attempts, prov in rows]
+
+    async def outstanding(self) -> list[tuple[Job, str, int, list[str]]]:
+        """
+        Незавершенные задачи: (задача, статус, попыток, провайдеры).
+        Выполняемые - свои (этот узел перезапущен, их точно никто не выполняет)
+        и чужие, зависшие дольше stale_after: свежие чужие сейчас выполняет
+        живой воркер другого процесса.
+        """
+        return await self._run(self._outstanding)
+
+    def _purge(self) -> int:
+        cur = self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+            (DONE, FAILED, QUEUED, time.time() - self.retention),
+        )
+        self._conn.commit()
+        return cur.rowcount
+
+    async def purge(self) -> int:
+        """Удаляет завершенные и так и не начатые записи старше retention."""
+        return await self._run(self._purge)
+
+    def _counts(self) -> dict[str, int]:
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    async def counts(self) -> dict[str, int]:
+        return await self._run(self._counts)
+
+    async def format_stats(self) -> str:
+        counts = await self.counts()
+        return ", ".join(f"{status}={counts.get(status, 0)}" for status in (QUEUED, RUNNING, DONE, FAILED))
+
+    async def close(self):
+        await self._run(self._conn.close)
+        self._executor.shutdown()
@@ -0,0 +1,161 @@
+"""
+Поиск ссылки на медиа в HTML зеркал за один проход по потоку.
+Страница подается кусками по мере чтения: ссылки из атрибутов
+(href, src, data-video-url, og:video...) оцениваются сразу, в памяти -
+только хвост куска на случай разрыва атрибута и лучший кандидат.
+Как только найдена ссылка, в которой сомнений нет (расширение нужного
+формата на хосте CDN), чтение страницы прекращается.
+"""
+
+import codecs
+import html
+import re
+from urllib.parse import urlsplit
+
+MAX_URL_LENGTH = 2048
+MAX_FILE_SIZE = 50 * 1024 * 1024  # Лимит Telegram: ссылки с подписью "120 MB" не берем
+
+# Ссылка в кавычках (поиск по литералу "http" - быстрый), затем имя атрибута перед ней
+_URL_RE = re.compile(r'https?://[^"\'\s<>]{1,%d}(?=["\'])' % MAX_URL_LENGTH)
+_ATTR_BEFORE_RE = re.compile(r'([A-Za-z][\w-]{0,30})\s*=\s*["\']$')
+_ATTR_LOOKBEHIND = 40
+LINK_ATTRS = {"href", "src", "data-src", "data-video-url", "data-url", "content"}
+# Размер рядом со ссылкой ("Скачать (12.5 MB)")
+_SIZE_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(KB|MB|GB|КБ|МБ|ГБ)', re.IGNORECASE)
+_SIZE_UNITS = {"kb": 1024, "кб": 1024, "mb": 1024 ** 2, "мб": 1024 ** 2, "gb": 1024 ** 3, "гб": 1024 ** 3}
+_SIZE_WINDOW = 160  # Символов после ссылки, где ищется размер
+# Хвост куска, который разбирается вместе со следующим: ссылка у конца куска
+# (с атрибутом перед ней и окном размера после) оценивается целиком
+_CARRY = _ATTR_LOOKBEHIND + MAX_URL_LENGTH + _SIZE_WINDOW + 64
+
+# Сайты, ссылки на которые не медиа: сами платформы, зеркала, шрифты/скрипты/аналитика
+BLOCKED_DOMAINS = frozenset({
+    "twitter.com", "facebook.com", "instagram.com", "youtube.com", "googlevideo.com",
+    "fonts.googleapis.com",
+})
+BLOCKED_KEYWORDS = (
+    "ssstwitter", "snapinsta", "savefrom", "snaptik", "musicaldown", "ssstik",
+    "cdnjs", "jquery", "cloudflare", "analytics",
+)
+_BLOCKED_RE = re.compile("|".join(map(re.escape, BLOCKED_KEYWORDS)))
+
+VIDEO_EXTS = (".mp4", ".webm", ".mov", ".m4v")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+SKIP_EXTS = (".html", ".htm", ".php", ".css", ".js", ".json", ".xml", ".svg", ".ico", ".woff", ".woff2")
+MEDIA_HINTS = ("cdn", "video", "media", "tiktok", "scontent", "fbcdn", "pinimg")
+MEDIA_ATTRS = {"data-video-url", "data-url", "content"}
+
+SCORE_FORMAT_EXT = 60  # Расширение запрошенного формата
+SCORE_OTHER_EXT = 15  # Медиа, но другого формата
+SCORE_HOST_HINT = 15  # Хост похож на CDN
+SCORE_PATH_HINT = 5
+SCORE_MEDIA_ATTR = 10
+SCORE_SIZE_HINT = 5
+HIGH_CONFIDENCE = SCORE_FORMAT_EXT + SCORE_HOST_HINT
+
+
+def is_blocked(host: str) -> bool:
+    """Хост из черного списка: домен (с поддоменами) или ключевое слово в имени."""
+    suffix = host
+    while suffix:
+        if suffix in BLOCKED_DOMAINS:
+            return True
+        _, _, suffix = suffix.partition(".")
+    return _BLOCKED_RE.search(host) is not None
+
+
+def _size_hint(text: str) -> int | None:
+    match = _SIZE_RE.search(text)
+    if not match:
+        return None
+    return int(float(match.group(1).replace(",", ".")) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def score_link(url: str, attr: str, format_type: str, context: str = "") -> int:
+    """Оценка кандидата (0 - не медиа). context - текст сразу после ссылки."""
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+    except ValueError:
+        return 0
+    path = parts.path.lower()
+    if not host or path.endswith(SKIP_EXTS) or is_blocked(host):
+        return 0
+
+    score = 0
+    if path.endswith(VIDEO_EXTS):
+        score += SCORE_FORMAT_EXT if format_type == "mp4" else SCORE_OTHER_EXT
+    elif path.endswith(IMAGE_EXTS):
+        score += SCORE_FORMAT_EXT if format_type == "jpg" else SCORE_OTHER_EXT
+    if any(hint in host for hint in MEDIA_HINTS):
+        score += SCORE_HOST_HINT
+    if "video" in path or "download" in path:
+        score += SCORE_PATH_HINT
+    if score == 0:
+        # Ни расширения, ни признаков медиа - обычная ссылка страницы
+        return 0
+    if attr in MEDIA_ATTRS:
+        score += SCORE_MEDIA_ATTR
+    size = _size_hint(context) if context else None
+    if size is not None:
+        if size > MAX_FILE_SIZE:
+            return 0
+        score += SCORE_SIZE_HINT
+    return score
+
+
+class MediaLinkExtractor:
+    """
+    Лучшая ссылка на медиа в потоке HTML. feed() возвращает True, когда
+    найдена ссылка с оценкой не ниже HIGH_CONFIDENCE - дальше читать не нужно.
+    При равной оценке побеждает ссылка, встреченная раньше.
+    """
+
+    def __init__(self, format_type: str = "mp4", high_confidence: int = HIGH_CONFIDENCE):
+        self.format_type = format_type
+        self.high_confidence = high_confidence
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._tail = ""
+        self.best: str | None = None
+        self.best_score = 0
+        self.links = 0  # Просмотрено ссылок
+        self.done = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> bool:
+        if self.done:
+            return True
+        text = self._tail + self._decoder.decode(chunk, final)
+        if not final and len(text) < 2 * _CARRY:
+            # Мелкие куски копятся: иначе хвост разбирался бы заново на каждом
+            self._tail = text
+            return False
+        # Ссылки у самого конца ждут следующего куска - окно размера после них еще не прочитано
+        limit = len(text) if final else len(text) - _SIZE_WINDOW
+        consumed = 0
+        for match in _URL_RE.finditer(text):
+            if match.end() > limit:
+                break
+            consumed = match.end()
+            attr = _ATTR_BEFORE_RE.search(text, max(0, match.start() - _ATTR_LOOKBEHIND), match.start())
+            if attr is None or attr.group(1).lower() not in LINK_ATTRS:
+                continue
+            self.links += 1
+            url = match.group()
+            if "&" in url:
+                url = html.unescape(url)
+            score = score_link(url, attr.group(1).lower(), self.format_type, text[consumed + 1:consumed + _SIZE_WINDOW])
+            if score > self.best_score:
+                self.best, self.best_score = url, score
+                if score >= self.high_confidence:
+                    self.done = True
+                    self._tail = ""
+                    return True
+        # Хвост без разобранных ссылок - вдруг в нем начало атрибута
+        self._tail = "" if final else text[max(consumed, len(text) - _CARRY):]
+        return False
+
+    def close(self) -> str | None:
+        """Конец страницы: лучшая найденная ссылка или None."""
+        if not self.done:
+            self.feed(b"", final=True)
+        return self.best
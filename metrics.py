@@ -0,0 +1,171 @@
+"""
+Метрики в текстовом формате Prometheus (без внешних зависимостей).
+Счетчики и гистограммы с метками обновляются из кода загрузки,
+значения пулов/очередей/кеша снимаются функциями в момент запроса /metrics.
+"""
+
+import math
+import time
+from typing import Callable
+
+# Границы гистограмм длительности (сек.): от быстрых API до долгих yt-dlp
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонный счетчик с метками."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, _labels_text(self.labels, key), value
+
+
+class Histogram:
+    """Гистограмма с накопительными bucket'ами, как в Prometheus."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: dict[tuple, list] = {}  # key -> [counts по bucket'ам, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """with metric.time(stage=...): - измеряет длительность блока."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket", _labels_text(self.labels, key, f'le="{_fmt(bound)}"'), cumulative
+            yield f"{self.name}_sum", _labels_text(self.labels, key), total
+            yield f"{self.name}_count", _labels_text(self.labels, key), count
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+
+
+class CallbackGauge:
+    """Значение снимается функцией при каждом запросе /metrics."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        yield self.name, "", self.fn()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, **kwargs))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float], kind: str = "gauge") -> CallbackGauge:
+        return self.register(CallbackGauge(name, help_text, fn, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# -------- Конвейер загрузки --------
+DOWNLOADS = REGISTRY.counter(
+    "savebot_downloads_total", "Запросы на скачивание по платформе и результату",
+    ("platform", "result", "reason"),
+)
+PROVIDER_ATTEMPTS = REGISTRY.counter(
+    "savebot_provider_attempts_total", "Попытки скачивания через провайдера",
+    ("provider", "result"),
+)
+PROVIDER_LATENCY = REGISTRY.histogram(
+    "savebot_provider_duration_seconds", "Длительность попытки через провайдера", ("provider",),
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "savebot_stage_duration_seconds", "Длительность этапов: extract, download, upload",
+    ("stage", "provider"),
+)
+BYTES_DOWNLOADED = REGISTRY.counter(
+    "savebot_downloaded_bytes_total", "Скачано байт", ("source",),
+)
+BYTES_UPLOADED = REGISTRY.counter(
+    "savebot_uploaded_bytes_total", "Отправлено в Telegram байт (mode=url - скачал сам Telegram)", ("mode",),
+)
+UPLOADS = REGISTRY.counter(
+    "savebot_uploads_total", "Отправки файлов пользователю", ("mode", "result"),
+)
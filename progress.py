@@ -0,0 +1,134 @@
+"""
+Прогресс скачивания в сообщении "⏳ Скачиваю...".
+Загрузчики только обновляют счетчики (дешево, на каждый кусок),
+а репортер раз в PROGRESS_EDIT_INTERVAL собирает их и правит сообщение,
+если текст изменился - лимит правок Telegram не расходуется впустую.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import time
+from typing import Awaitable, Callable
+
+import config
+
+_current: contextvars.ContextVar["ProgressReporter | None"] = contextvars.ContextVar("current_progress", default=None)
+
+
+def _mb(size: float) -> str:
+    return f"{size / 1024 / 1024:.1f}"
+
+
+class ProgressReporter:
+    """Прогресс одной задачи и периодическая правка ее сообщения."""
+
+    def __init__(
+        self,
+        edit: Callable[[str], Awaitable],
+        label: str,
+        interval: float = config.PROGRESS_EDIT_INTERVAL,
+    ):
+        self.edit = edit
+        self.label = label
+        self.interval = interval
+        self.downloaded = 0
+        self.total: int | None = None
+        self.speed: float | None = None
+        self.eta: float | None = None
+        self.provider: str | None = None
+        self._shared: dict | None = None
+        self._last_text: str | None = None
+        self._last_sample: tuple[float, int] | None = None
+
+    def update(self, downloaded: int | None = None, total: int | None = None, provider: str | None = None):
+        if provider is not None and provider != self.provider:
+            # Новый источник - счетчики предыдущего уже не актуальны
+            self.provider = provider
+            self.downloaded, self.total, self.speed, self.eta = 0, None, None, None
+            self._shared = None
+            self._last_sample = None
+        if downloaded is not None:
+            self.downloaded = downloaded
+        if total:
+            self.total = total
+
+    def attach(self, shared: dict):
+        """Счетчики из progress hook yt-dlp (dict или прокси Manager.dict() для ProcessPool)."""
+        self._shared = shared
+
+    def _sync(self):
+        if self._shared is not None:
+            try:
+                shared = dict(self._shared)
+            except Exception:
+                shared = {}
+            if shared.get("downloaded"):
+                self.downloaded = shared["downloaded"]
+                self.total = shared.get("total") or self.total
+                self.speed = shared.get("speed")
+                self.eta = shared.get("eta")
+                return
+        # Для потоковых загрузок скорость и ETA считаем сами
+        now = time.monotonic()
+        if self._last_sample is not None:
+            elapsed = now - self._last_sample[0]
+            if elapsed > 0 and self.downloaded >= self._last_sample[1]:
+                self.speed = (self.downloaded - self._last_sample[1]) / elapsed
+        self._last_sample = (now, self.downloaded)
+        if self.speed and self.total:
+            self.eta = max(0.0, (self.total - self.downloaded) / self.speed)
+
+    def render(self) -> str | None:
+        if not self.downloaded:
+            return None
+        head = f"⏳ Скачиваю {self.label}..."
+        if self.total:
+            head += f" {min(100, self.downloaded * 100 // self.total)}%"
+            parts = [f"{_mb(self.downloaded)}/{_mb(self.total)} MB"]
+        else:
+            parts = [f"{_mb(self.downloaded)} MB"]
+        if self.speed:
+            parts.append(f"{_mb(self.speed)} MB/s")
+        if self.eta is not None and self.total:
+            parts.append(f"~{int(self.eta)} сек")
+        text = f"{head}\n\n{' • '.join(parts)}"
+        if self.provider:
+            text += f"\nИсточник: {self.provider}"
+        return text
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._sync()
+            text = self.render()
+            if text and text != self._last_text:
+                self._last_text = text
+                try:
+                    await self.edit(text)
+                except Exception:
+                    pass
+
+    @contextlib.asynccontextmanager
+    async def running(self):
+        """Репортер текущей задачи на время `async with`; по выходу правок больше нет."""
+        token = _current.set(self)
+        task = asyncio.create_task(self.run())
+        try:
+            yield self
+        finally:
+            task.cancel()
+            _current.reset(token)
+
+
+def report(downloaded: int | None = None, total: int | None = None, provider: str | None = None):
+    """Обновляет прогресс текущей задачи (вне задачи - ничего не делает)."""
+    reporter = _current.get()
+    if reporter is not None:
+        reporter.update(downloaded, total, provider)
+
+
+def attach(shared: dict):
+    reporter = _current.get()
+    if reporter is not None:
+        reporter.attach(shared)
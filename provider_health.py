@@ -0,0 +1,167 @@
+"""
+Табло здоровья провайдеров (зеркал и API).
+Для каждого хоста хранит последние исходы запросов, задержки и последнюю ошибку,
+по ним упорядочивает кандидатов по ожидаемому времени до успеха.
+Состояние сохраняется в JSON, чтобы не терять статистику при перезапуске.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def provider_key(endpoint: str) -> str:
+    """Ключ провайдера - хост (в URL зеркал бывает ID видео или query)."""
+    return urlsplit(endpoint).netloc.lower() or endpoint
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class ProviderHealth:
+    """Статистика по провайдерам и адаптивный порядок перебора."""
+
+    def __init__(
+        self,
+        path: str | None = config.PROVIDER_HEALTH_FILE,
+        window: int = config.PROVIDER_HEALTH_WINDOW,
+        prior_latency: float = config.PROVIDER_HEALTH_PRIOR_LATENCY,
+    ):
+        self.path = path
+        self.window = window
+        self.prior_latency = prior_latency
+        # host -> {"outcomes": deque[(ok, latency)], "last_failure", "last_error", "last_success"}
+        self._providers: dict[str, dict] = {}
+        self._dirty = False
+
+    def _entry(self, key: str) -> dict:
+        entry = self._providers.get(key)
+        if entry is None:
+            entry = {
+                "outcomes": deque(maxlen=self.window),
+                "last_failure": None,
+                "last_error": None,
+                "last_success": None,
+            }
+            self._providers[key] = entry
+        return entry
+
+    def record(self, endpoint: str, ok: bool, latency: float, error: str | None = None):
+        """Записывает исход одной попытки."""
+        entry = self._entry(provider_key(endpoint))
+        entry["outcomes"].append((bool(ok), round(latency, 3)))
+        now = time.time()
+        if ok:
+            entry["last_success"] = now
+        else:
+            entry["last_failure"] = now
+            entry["last_error"] = (error or "")[:200] or None
+        self._dirty = True
+
+    def stats(self, endpoint: str) -> dict:
+        """Успешность, p50/p95 задержки и последняя ошибка провайдера."""
+        return self._stats(provider_key(endpoint))
+
+    def _stats(self, key: str) -> dict:
+        entry = self._providers.get(key)
+        if not entry or not entry["outcomes"]:
+            return {"attempts": 0, "success_rate": None, "p50": None, "p95": None,
+                    "last_failure": None, "last_error": None}
+        outcomes = entry["outcomes"]
+        ok_latencies = [lat for ok, lat in outcomes if ok]
+        return {
+            "attempts": len(outcomes),
+            "success_rate": len(ok_latencies) / len(outcomes),
+            "p50": _percentile(ok_latencies, 0.5),
+            "p95": _percentile(ok_latencies, 0.95),
+            "last_failure": entry["last_failure"],
+            "last_error": entry["last_error"],
+        }
+
+    def expected_time_to_success(self, endpoint: str) -> float:
+        """
+        Средняя цена попытки / вероятность успеха (сглаживание Лапласа).
+        Сортировка по этой величине минимизирует ожидаемое время
+        последовательного перебора; новые провайдеры получают нейтральный приор.
+        """
+        return self._score(provider_key(endpoint))
+
+    def _score(self, key: str) -> float:
+        entry = self._providers.get(key)
+        outcomes = entry["outcomes"] if entry else ()
+        successes = sum(1 for ok, _ in outcomes if ok)
+        p_success = (successes + 1) / (len(outcomes) + 2)
+        cost = _percentile([lat for _, lat in outcomes], 0.5) or self.prior_latency
+        return cost / p_success
+
+    def rank(self, candidates) -> list:
+        """Кандидаты в порядке ожидаемого времени до успеха (при равенстве - исходный порядок)."""
+        return sorted(candidates, key=self.expected_time_to_success)
+
+    def format_summary(self, limit: int = 5) -> str:
+        """Краткая сводка: лучшие и худшие провайдеры."""
+        if not self._providers:
+            return "нет данных"
+        ranked = sorted(self._providers, key=self._score)
+
+        def fmt(key):
+            rate = self._stats(key)["success_rate"] or 0.0
+            return f"{key} {rate:.0%}"
+
+        best = ", ".join(fmt(k) for k in ranked[:limit])
+        worst = ", ".join(fmt(k) for k in ranked[-limit:][::-1]) if len(ranked) > limit else ""
+        return best + (f" | хуже всех: {worst}" if worst else "")
+
+    # -------- Персистентность --------
+    def load(self):
+        """Загружает состояние с диска (если файл есть)."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for key, data in raw.items():
+                entry = self._entry(key)
+                entry["outcomes"].extend((bool(ok), float(lat)) for ok, lat in data.get("outcomes", []))
+                entry["last_failure"] = data.get("last_failure")
+                entry["last_error"] = data.get("last_error")
+                entry["last_success"] = data.get("last_success")
+            logger.info(f"Provider health loaded: {len(raw)} providers from {self.path}")
+        except Exception as e:
+            logger.warning(f"Provider health load failed: {str(e)}")
+
+    def save(self):
+        """Атомарно сохраняет состояние на диск."""
+        if not self.path or not self._dirty:
+            return
+        data = {
+            key: {**entry, "outcomes": list(entry["outcomes"])}
+            for key, entry in self._providers.items()
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"Provider health save failed: {str(e)}")
+
+    async def autosave(self, interval: float = config.PROVIDER_HEALTH_SAVE_INTERVAL):
+        """Фоновая задача: периодически сбрасывает состояние на диск."""
+        while True:
+            await asyncio.sleep(interval)
+            self.save()
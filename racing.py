@@ -0,0 +1,93 @@
+"""
+Параллельный ("гоночный") перебор зеркал.
+Запускает первые N кандидатов одновременно, берет первый успешный результат
+и отменяет остальные. На место каждого упавшего запускается следующий.
+С табло здоровья кандидаты упорядочиваются по ожидаемому времени до успеха,
+а исход каждой завершенной попытки записывается в статистику.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable
+from urllib.parse import urlsplit
+
+import metrics
+import tracing
+from circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+async def race(
+    candidates: Iterable[Any],
+    attempt: Callable[[Any], Awaitable[Any]],
+    fan_out: int = 1,
+    name: str = "race",
+    health=None,
+) -> tuple[Any, Any] | None:
+    """
+    Возвращает (кандидат, результат) первого attempt() с непустым результатом
+    или None, если не сработал ни один. attempt() сигналит о неудаче,
+    возвращая None/пустое значение или бросая исключение.
+    fan_out=1 - обычный последовательный перебор.
+    health - ProviderHealth (кандидаты должны быть URL).
+    """
+    # Порядок задает приоритет, дубли убираем
+    ordered = list(dict.fromkeys(candidates))
+    if health is not None:
+        ordered = health.rank(ordered)
+    queue = iter(ordered)
+    running: dict[asyncio.Task, Any] = {}
+    race_started = time.monotonic()
+
+    async def timed(candidate):
+        started = time.monotonic()
+        try:
+            with tracing.span("race.attempt", race=name, candidate=urlsplit(str(candidate)).netloc or str(candidate)):
+                result = await attempt(candidate)
+        except (asyncio.CancelledError, CircuitOpenError):
+            # Проигравший в гонке или пропущенный по открытой цепи - попытки не было
+            raise
+        except Exception as e:
+            if health is not None:
+                health.record(candidate, False, time.monotonic() - started, f"{type(e).__name__}: {e}")
+            raise
+        if health is not None:
+            health.record(candidate, bool(result), time.monotonic() - started,
+                          None if result else "no media found")
+        return result
+
+    def launch_next() -> bool:
+        for candidate in queue:
+            running[asyncio.create_task(timed(candidate))] = candidate
+            return True
+        return False
+
+    for _ in range(max(1, fan_out)):
+        if not launch_next():
+            break
+
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                candidate = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning(f"{name} {candidate} exception: {str(e)[:200]}")
+                    result = None
+
+                if result:
+                    if running:
+                        logger.info(f"{name}: {candidate} won, cancelling {len(running)} other attempt(s)")
+                    return candidate, result
+                launch_next()
+        return None
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        metrics.STAGE_LATENCY.observe(time.monotonic() - race_started, stage="extract", provider=name)
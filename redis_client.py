@@ -0,0 +1,26 @@
+"""
+Клиенты Redis-совместимых серверов (очередь задач, кеш результатов).
+Адрес fakeredis://<имя> - сервер внутри процесса (пакет fakeredis[lua]):
+общий бэкенд можно запустить и проверить локально без внешних сервисов.
+Клиенты с одинаковым адресом fakeredis:// видят одни и те же данные.
+"""
+
+_fake_servers: dict = {}
+
+
+def connect(url: str, setting: str):
+    """Асинхронный клиент (ответы - str). setting - параметр конфига для текста ошибки."""
+    if url.startswith("fakeredis://"):
+        try:
+            import fakeredis
+        except ImportError as e:
+            raise RuntimeError(f"Для {setting}=fakeredis:// нужен пакет fakeredis[lua]") from e
+        server = _fake_servers.get(url)
+        if server is None:
+            server = _fake_servers[url] = fakeredis.FakeServer()
+        return fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError as e:
+        raise RuntimeError(f"Для {setting}='redis' нужен пакет redis") from e
+    return redis_asyncio.from_url(url, decode_responses=True)
@@ -0,0 +1,209 @@
+"""
+Кеш результатов: (URL, формат) -> Telegram file_id уже отправленного файла.
+Повторный запрос той же ссылки отвечается пересылкой file_id - без скачивания
+и загрузки. TTL + LRU, бэкенды: память, SQLite, Redis-совместимый сервер.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+import config
+import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(url: str, format_type: str) -> str:
+    """Ключ кеша: формат + URL без фрагмента."""
+    return f"{format_type}:{url.strip().split('#', 1)[0]}"
+
+
+class MemoryBackend:
+    """In-memory LRU (OrderedDict) с TTL на запись."""
+
+    def __init__(self, max_entries: int = config.RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._data[key] = (value, time.time() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Файл SQLite: переживает перезапуск, LRU по времени последнего доступа."""
+
+    def __init__(
+        self,
+        path: str = config.RESULT_CACHE_SQLITE_PATH,
+        max_entries: int = config.RESULT_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS result_cache_accessed ON result_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    async def get(self, key: str) -> str | None:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            await self.delete(key)
+            return None
+        self._conn.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return row[0]
+
+    async def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl, now),
+        )
+        # Сначала просроченные, затем самые давно неиспользуемые
+        self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM result_cache WHERE key IN ("
+            " SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    async def delete(self, key: str):
+        self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    async def close(self):
+        self._conn.close()
+
+
+class RedisBackend:
+    """
+    Redis-совместимый сервер (Redis, KeyDB, fakeredis:// в процессе - redis_client).
+    TTL - через EX, LRU - политикой сервера (maxmemory-policy allkeys-lru).
+    """
+
+    def __init__(self, url: str = config.RESULT_CACHE_REDIS_URL, prefix: str = "savebot:result:"):
+        self.prefix = prefix
+        self._client = redis_client.connect(url, "RESULT_CACHE_BACKEND")
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def delete(self, key: str):
+        await self._client.delete(self.prefix + key)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+    "redis": RedisBackend,
+}
+
+
+def create_backend(name: str = config.RESULT_CACHE_BACKEND):
+    """Создает бэкенд по имени из конфига."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный RESULT_CACHE_BACKEND: {name}")
+
+
+class ResultCache:
+    """Кеш file_id отправленных файлов со статистикой попаданий."""
+
+    def __init__(self, backend=None, ttl: float = config.RESULT_CACHE_TTL, enabled: bool = config.RESULT_CACHE_ENABLED):
+        self.enabled = enabled
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _backend(self):
+        """Бэкенд из конфига создается при первом обращении."""
+        if self.backend is None:
+            self.backend = create_backend()
+        return self.backend
+
+    async def get(self, url: str, format_type: str) -> dict | None:
+        """Возвращает {"file_id", "kind"} или None."""
+        if not self.enabled:
+            return None
+        try:
+            raw = await self._backend().get(cache_key(url, format_type))
+        except Exception as e:
+            logger.warning(f"Result cache get failed: {str(e)}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, url: str, format_type: str, file_id: str, kind: str):
+        if not self.enabled:
+            return
+        value = json.dumps({"file_id": file_id, "kind": kind})
+        try:
+            await self._backend().set(cache_key(url, format_type), value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Result cache set failed: {str(e)}")
+
+    async def delete(self, url: str, format_type: str):
+        if not self.enabled:
+            return
+        try:
+            await self._backend().delete(cache_key(url, format_type))
+        except Exception as e:
+            logger.warning(f"Result cache delete failed: {str(e)}")
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def format_stats(self) -> str:
+        return f"hits={self.hits}, misses={self.misses} ({self.hit_ratio():.0%})"
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
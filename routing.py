@@ -0,0 +1,271 @@
+"""
+Маршрутизация ссылок: платформа по хосту и выражения для разбора ответов
+провайдеров. Хост разбирается один раз и ищется в индексе по суффиксам
+(m.tiktok.com -> tiktok.com), так что "facebook.com" в query-параметре
+ссылки на другой сайт платформу не меняет. Все выражения компилируются
+при загрузке модуля.
+
+Платформа - запись в реестре: домены, короткие домены (раскрываются
+редиректом при канонизации), таймаут и опции yt-dlp, зеркала для
+download_via_alternative_api. Новая платформа - register_platform().
+"""
+
+import re
+from urllib.parse import urlsplit
+
+import config
+
+TIMEOUT_DEFAULT = 90
+
+
+class Platform:
+    """Правила загрузки для одной платформы."""
+
+    def __init__(
+        self,
+        name: str,
+        domains: list[str],
+        short_domains: list[str] | None = None,
+        timeout: int = TIMEOUT_DEFAULT,
+        ydl_opts: dict | None = None,
+        alt_apis: list[str] | None = None,
+    ):
+        self.name = name
+        self.domains = domains  # Вместе с поддоменами
+        self.short_domains = short_domains or []  # Раскрываются редиректом (только сам хост)
+        self.timeout = timeout  # Сек. на загрузку yt-dlp
+        self.ydl_opts = ydl_opts or {}  # Поверх базовых опций download_content
+        self.alt_apis = alt_apis  # None - config.UNIVERSAL_APIS
+
+
+PLATFORMS: dict[str, Platform] = {}
+_domain_index: dict[str, str] = {}  # домен -> платформа
+_short_hosts: set[str] = set()
+
+
+def register_platform(platform: Platform):
+    """Добавляет платформу (или заменяет одноименную) в реестр и индекс доменов."""
+    old = PLATFORMS.pop(platform.name, None)
+    if old is not None:
+        for domain in old.domains + old.short_domains:
+            _domain_index.pop(domain, None)
+        _short_hosts.difference_update(old.short_domains)
+    PLATFORMS[platform.name] = platform
+    for domain in platform.domains + platform.short_domains:
+        _domain_index[domain.lower()] = platform.name
+    _short_hosts.update(d.lower() for d in platform.short_domains)
+
+
+def host_of(url: str) -> str:
+    """Хост ссылки в нижнем регистре ("" - не разобрать)."""
+    try:
+        return urlsplit(url.strip()).hostname or ""
+    except ValueError:
+        return ""
+
+
+def platform_for_host(host: str) -> str | None:
+    """Платформа по хосту: сам хост, затем его родительские домены."""
+    host = host.rstrip(".")
+    while host:
+        name = _domain_index.get(host)
+        if name is not None:
+            return name
+        _, _, host = host.partition(".")
+    return None
+
+
+def detect_platform(url: str) -> str | None:
+    """Определяет платформу по хосту ссылки."""
+    return platform_for_host(host_of(url))
+
+
+def get_platform(name: str | None) -> Platform | None:
+    return PLATFORMS.get(name) if name else None
+
+
+def is_short_host(host: str) -> bool:
+    """Короткий домен, который нужно раскрыть редиректом (vt.tiktok.com, fb.watch...)."""
+    return host in _short_hosts
+
+
+def get_timeout(platform: str | None) -> int:
+    """Таймаут загрузки yt-dlp для платформы."""
+    entry = get_platform(platform)
+    return entry.timeout if entry else TIMEOUT_DEFAULT
+
+
+# ==================== ВСТРОЕННЫЕ ПЛАТФОРМЫ ====================
+register_platform(Platform(
+    "tiktok",
+    domains=["tiktok.com"],
+    short_domains=["vt.tiktok.com", "vm.tiktok.com"],
+    timeout=120,
+    ydl_opts={
+        'extractor_args': {
+            'tiktok': {
+                'api_hostname': 'api16-normal-c-useast1a.tiktokv.com',
+                'enable_headers': True,
+                'app_name': 'musical_ly',
+                'device_id': '7234567890123456789',
+            }
+        },
+        'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
+        'http_headers': {
+            'User-Agent': config.MOBILE_USER_AGENT,
+            'Referer': 'https://www.tiktok.com/',
+        },
+        'socket_timeout': 60,
+        'retries': 3,
+    },
+    alt_apis=config.TIKTOK_APIS,
+))
+
+register_platform(Platform(
+    "instagram",
+    domains=["instagram.com"],
+    timeout=180,
+    ydl_opts={
+        'extractor_args': {'instagram': {'include_ads': False, 'enable_headers': True}},
+        'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
+        'http_headers': {
+            'User-Agent': config.DESKTOP_USER_AGENT,
+            'Referer': 'https://www.instagram.com/',
+        },
+    },
+    alt_apis=config.INSTAGRAM_APIS,
+))
+
+register_platform(Platform(
+    "pinterest",
+    domains=["pinterest.com"],
+    short_domains=["pin.it"],
+    timeout=120,
+    ydl_opts={
+        'format': 'best[ext=jpg]/best[ext=jpeg]/best[ext=png]/best',
+        'http_headers': {
+            'User-Agent': config.DESKTOP_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        },
+        'socket_timeout': 90,
+    },
+    alt_apis=config.PINTEREST_APIS,
+))
+
+register_platform(Platform(
+    "facebook",
+    domains=["facebook.com"],
+    short_domains=["fb.watch"],
+    timeout=120,
+    ydl_opts={
+        'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]',
+        'http_headers': {
+            'User-Agent': config.DESKTOP_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,video/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        },
+        'socket_timeout': 90,
+    },
+    alt_apis=config.FACEBOOK_APIS,
+))
+
+register_platform(Platform(
+    "youtube",
+    domains=["youtube.com", "youtu.be"],
+    ydl_opts={
+        # Формат без HLS/m3u8 чтобы избежать 403 на фрагментах
+        'format': 'worst[protocol=https][ext=mp4]/worst[protocol=https]/worst[ext=mp4]/worst',
+        'socket_timeout': 60,
+        'retries': 3,
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['android', 'web'],
+                'player_skip': ['webpage', 'config', 'js'],
+            }
+        },
+    },
+))
+
+# Twitter/X, VK, Reddit и Vimeo yt-dlp разбирает сам; при ошибке - Cobalt и UNIVERSAL_APIS
+register_platform(Platform(
+    "twitter",
+    domains=["twitter.com", "x.com"],
+    ydl_opts={'format': 'best[filesize<50M][ext=mp4]/best[ext=mp4]/best'},
+))
+
+register_platform(Platform(
+    "vk",
+    domains=["vk.com", "vk.ru", "vkvideo.ru"],
+    timeout=120,
+    ydl_opts={
+        'format': 'best[filesize<50M][ext=mp4]/worst[ext=mp4]/best',
+        'http_headers': {
+            'User-Agent': config.DESKTOP_USER_AGENT,
+            'Referer': 'https://vk.com/',
+        },
+    },
+))
+
+register_platform(Platform(
+    "reddit",
+    domains=["reddit.com"],
+    short_domains=["redd.it"],
+    # Видео Reddit - отдельные дорожки; без ffmpeg берем готовый mp4 со звуком, если есть
+    ydl_opts={'format': 'best[filesize<50M][ext=mp4]/best[ext=mp4]/best'},
+))
+
+register_platform(Platform(
+    "vimeo",
+    domains=["vimeo.com"],
+    timeout=120,
+    ydl_opts={
+        'format': 'best[protocol=https][ext=mp4]/best[ext=mp4]/best',
+        'http_headers': {'Referer': 'https://vimeo.com/'},
+    },
+))
+
+
+# ==================== РАЗБОР ОТВЕТОВ ПРОВАЙДЕРОВ ====================
+# Прямые ссылки на медиа в тексте (страницы редиректов, ответы зеркал)
+MEDIA_URL_RE = re.compile(r'https?://[^\s"\'<>]+\.(?:mp4|webm|jpg|jpeg|png)')
+HREF_VIDEO_RE = re.compile(r'href="(https?://[^"]+\.mp4[^"]*)"', re.IGNORECASE)
+HREF_PHOTO_RE = re.compile(r'href="(https?://[^"]+\.(?:jpg|jpeg|png)[^"]*)"', re.IGNORECASE)
+
+# SSSTik/SnapTik
+SSSTIK_TOKEN_RE = re.compile(r'name="_token" value="([^"]+)"')
+DATA_VIDEO_URL_RE = re.compile(r'data-video-url="([^"]+)"')
+
+# ImgInn
+IMGINN_VIDEO_RE = re.compile(r'src="(https?://[^"]+instagram[^"]+\.mp4[^"]*)"')
+IMGINN_PHOTO_RE = re.compile(r'src="(https?://[^"]+instagram[^"]+\.(?:jpg|jpeg)[^"]*)"')
+
+# Страницы Facebook-загрузчиков (по порядку надежности)
+FACEBOOK_VIDEO_RES = [
+    re.compile(r'href="(https?://[^"]+facebook[^"]*\.mp4[^"]*)"', re.IGNORECASE),
+    re.compile(r'href="(https?://[^"]+video[^"]*\.mp4[^"]*)"', re.IGNORECASE),
+    re.compile(r'src="(https?://[^"]+\.mp4[^"]*)"', re.IGNORECASE),
+    re.compile(r'url["\']?\s*[:=]\s*["\'](https?://[^"\']+facebook[^"\']+)["\']', re.IGNORECASE),
+]
+
+_INSTAGRAM_SHORTCODE_RE = re.compile(r'/p/([^/]+)')
+_YOUTUBE_ID_RES = [
+    re.compile(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*'),
+    re.compile(r'(?:shorts\/)([0-9A-Za-z_-]{11})'),
+    re.compile(r'(?:youtu\.be\/)([0-9A-Za-z_-]{11})'),
+]
+
+
+def instagram_shortcode(url: str) -> str | None:
+    """Код публикации Instagram из ссылки /p/<код>/."""
+    match = _INSTAGRAM_SHORTCODE_RE.search(url)
+    return match.group(1) if match else None
+
+
+def youtube_video_id(url: str) -> str | None:
+    """ID видео YouTube (watch?v=, /shorts/, youtu.be/)."""
+    for pattern in _YOUTUBE_ID_RES:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
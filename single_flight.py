@@ -0,0 +1,57 @@
+"""
+Объединение одинаковых запросов (single-flight).
+Пока для ключа идет вызов, повторные вызовы с тем же ключом не запускают
+работу заново, а ждут результат первого.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class LeaderCancelled(Exception):
+    """Ведущий вызов отменен - ждущие повторяют вызов сами."""
+
+
+class SingleFlight:
+    """Один вызов на ключ; остальные ждущие получают тот же результат."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Возвращает (результат, shared). shared=True - результат получен
+        от чужого вызова. Исключение ведущего получают все ждущие; если
+        ведущего отменили, один из ждущих становится ведущим со своим fn.
+        """
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            try:
+                # shield: отмена одного ждущего не должна отменять общий вызов
+                return await asyncio.shield(future), True
+            except LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        # Исключение без ждущих не должно попадать в лог "never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Отмена касается только ведущего (остановка его воркера, таймаут)
+            future.set_exception(LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
@@ -0,0 +1,233 @@
+"""
+Хранилище временных файлов загрузок.
+Каждая задача получает свою папку (нет перезаписи файлов с одинаковым
+названием у разных пользователей), общий объем ограничен квотой
+с допуском задач по резерву места, фоновый уборщик удаляет брошенные файлы.
+Мелкие файлы остаются в памяти (InMemoryFile), средние - в tmpfs (/dev/shm),
+проверенные публичные ссылки передаются Telegram как есть (RemoteFile).
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import shutil
+import time
+import uuid
+
+import config
+
+logger = logging.getLogger(__name__)
+
+JOB_DIR_PREFIX = "job-"
+
+# Папка текущей задачи (видна во всех вызовах download_* этой задачи)
+_current_job_dir: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_job_dir", default=None)
+
+
+class StorageFullError(Exception):
+    """Квота диска исчерпана - новая задача не допущена."""
+
+
+class InMemoryFile:
+    """Скачанный файл целиком в памяти - отправляется без записи на диск."""
+
+    def __init__(self, data: bytes, filename: str):
+        self.data = data
+        self.filename = filename
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class RemoteFile:
+    """Публичная прямая ссылка на медиа - Telegram скачает ее сам, без нашего трафика."""
+
+    def __init__(self, url: str, size: int, platform: str | None = None):
+        self.url = url
+        self.size = size
+        self.platform = platform
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StorageManager:
+    """Папки задач, квота диска и уборка брошенных файлов."""
+
+    def __init__(
+        self,
+        base_dir: str = config.STORAGE_DIR,
+        quota_bytes: int = config.STORAGE_QUOTA_BYTES,
+        job_reserve_bytes: int = config.STORAGE_JOB_RESERVE_BYTES,
+        admission_timeout: float = config.STORAGE_ADMISSION_TIMEOUT,
+        orphan_ttl: float = config.STORAGE_ORPHAN_TTL,
+        janitor_interval: float = config.STORAGE_JANITOR_INTERVAL,
+        tmpfs_dir: str | None = config.TMPFS_DIR,
+        tmpfs_max_bytes: int = config.TMPFS_MAX_BYTES,
+        tmpfs_min_free_bytes: int = config.TMPFS_MIN_FREE_BYTES,
+    ):
+        self.base_dir = base_dir
+        self.quota_bytes = quota_bytes
+        self.job_reserve_bytes = job_reserve_bytes
+        self.admission_timeout = admission_timeout
+        self.orphan_ttl = orphan_ttl
+        self.janitor_interval = janitor_interval
+        self.tmpfs_dir = tmpfs_dir
+        self.tmpfs_max_bytes = tmpfs_max_bytes
+        self.tmpfs_min_free_bytes = tmpfs_min_free_bytes
+        self._active: set[str] = set()
+        self._admission = asyncio.Condition()
+        self.rejected = 0
+        self.reclaimed_bytes = 0
+
+    # -------- Учет места --------
+    def used_bytes(self) -> int:
+        """Занято на диске + резерв под активные задачи (берется максимум из двух)."""
+        if not os.path.isdir(self.base_dir):
+            return 0
+        total = 0
+        with os.scandir(self.base_dir) as entries:
+            for entry in entries:
+                try:
+                    size = _dir_size(entry.path) if entry.is_dir() else entry.stat().st_size
+                except OSError:
+                    continue
+                if entry.path in self._active:
+                    size = max(size, self.job_reserve_bytes)
+                total += size
+        return total
+
+    def _can_admit(self) -> bool:
+        return self.used_bytes() + self.job_reserve_bytes <= self.quota_bytes
+
+    # -------- Папки задач --------
+    @contextlib.asynccontextmanager
+    async def job(self):
+        """
+        Папка задачи на время `async with`, затем удаляется целиком.
+        Если квота занята дольше admission_timeout - StorageFullError.
+        """
+        async with self._admission:
+            try:
+                await asyncio.wait_for(self._admission.wait_for(self._can_admit), self.admission_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise StorageFullError(f"storage quota exhausted ({self.used_bytes()} bytes)")
+            job_dir = self._create_job_dir()
+            self._active.add(job_dir)
+
+        token = _current_job_dir.set(job_dir)
+        try:
+            yield job_dir
+        finally:
+            _current_job_dir.reset(token)
+            self._active.discard(job_dir)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            if self.tmpfs_dir:
+                shutil.rmtree(self._tmpfs_twin(job_dir), ignore_errors=True)
+            async with self._admission:
+                self._admission.notify_all()
+
+    def _create_job_dir(self) -> str:
+        job_dir = os.path.join(self.base_dir, f"{JOB_DIR_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(job_dir, exist_ok=True)
+        return job_dir
+
+    def current_dir(self) -> str:
+        """Папка текущей задачи; вне задачи - отдельная папка, которую потом уберет уборщик."""
+        job_dir = _current_job_dir.get()
+        if job_dir is None or not os.path.isdir(job_dir):
+            job_dir = self._create_job_dir()
+            _current_job_dir.set(job_dir)
+        return job_dir
+
+    def _tmpfs_twin(self, job_dir: str) -> str:
+        """Папка задачи в tmpfs (то же имя, что и на диске)."""
+        return os.path.join(self.tmpfs_dir, os.path.basename(job_dir))
+
+    def _tmpfs_fits(self, size: int) -> bool:
+        if not self.tmpfs_dir or size > self.tmpfs_max_bytes:
+            return False
+        try:
+            os.makedirs(self.tmpfs_dir, exist_ok=True)
+            return shutil.disk_usage(self.tmpfs_dir).free - size >= self.tmpfs_min_free_bytes
+        except OSError:
+            return False
+
+    def unique_path(self, prefix: str, ext: str, size_hint: int | None = None) -> str:
+        """
+        Уникальное имя файла в папке текущей задачи.
+        Если известный размер помещается в лимит tmpfs - путь в tmpfs (без нагрузки на диск).
+        """
+        job_dir = self.current_dir()
+        if size_hint and self._tmpfs_fits(size_hint):
+            job_dir = self._tmpfs_twin(job_dir)
+            os.makedirs(job_dir, exist_ok=True)
+        return os.path.join(job_dir, f"{prefix}_{uuid.uuid4().hex[:12]}{ext}")
+
+    # -------- Уборка --------
+    def reclaim_orphans(self, max_age: float | None = None) -> int:
+        """Удаляет неактивные папки и файлы старше max_age. Возвращает освобожденные байты."""
+        max_age = self.orphan_ttl if max_age is None else max_age
+        freed = self._reclaim_dir(self.base_dir, max_age, self._active)
+        if self.tmpfs_dir:
+            freed += self._reclaim_dir(self.tmpfs_dir, max_age, {self._tmpfs_twin(d) for d in self._active})
+        if freed:
+            self.reclaimed_bytes += freed
+            logger.info(f"Storage janitor reclaimed {freed / 1024 / 1024:.1f}MB")
+        return freed
+
+    @staticmethod
+    def _reclaim_dir(base_dir: str, max_age: float, active: set[str]) -> int:
+        if not os.path.isdir(base_dir):
+            return 0
+        now = time.time()
+        freed = 0
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                if entry.path in active:
+                    continue
+                try:
+                    if now - entry.stat().st_mtime < max_age:
+                        continue
+                    if entry.is_dir():
+                        size = _dir_size(entry.path)
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        size = entry.stat().st_size
+                        os.remove(entry.path)
+                    freed += size
+                except OSError:
+                    continue
+        return freed
+
+    async def janitor(self):
+        """
+        Фоновая задача: убирает брошенные файлы по TTL, в том числе при старте.
+        Папку делят несколько процессов-воркеров, а _active знает только задачи
+        своего процесса - поэтому свежие чужие папки не трогаются и при старте.
+        """
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.reclaim_orphans()
+        while True:
+            await asyncio.sleep(self.janitor_interval)
+            self.reclaim_orphans()
+            async with self._admission:
+                self._admission.notify_all()
+
+    def format_stats(self) -> str:
+        return (
+            f"{self.used_bytes() / 1024 / 1024:.0f}/{self.quota_bytes / 1024 / 1024:.0f}MB, "
+            f"jobs={len(self._active)}, rejected={self.rejected}"
+        )
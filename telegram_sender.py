@@ -0,0 +1,151 @@
+"""
+Ограничитель исходящих запросов к Telegram Bot API (middleware сессии aiogram).
+Глобальный token bucket (~30 сообщений/сек) и bucket на чат (1/сек в личке,
+20/мин в группах), повтор после 429 RetryAfter и приоритеты: отправка
+готовых файлов идет первой, правки статуса ждут и схлопываются
+(из нескольких ожидающих правок одного сообщения уходит последняя).
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    EditMessageCaption,
+    EditMessageText,
+    SendAnimation,
+    SendAudio,
+    SendChatAction,
+    SendDocument,
+    SendMediaGroup,
+    SendPhoto,
+    SendVideo,
+    TelegramMethod,
+)
+
+import config
+from fair_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - важнее)
+LANE_MEDIA = 0
+LANE_MESSAGE = 1
+LANE_PROGRESS = 2
+LANE_NAMES = ("media", "message", "progress")
+
+MEDIA_METHODS = (SendVideo, SendPhoto, SendDocument, SendAnimation, SendAudio, SendMediaGroup)
+PROGRESS_METHODS = (EditMessageText, EditMessageCaption, SendChatAction)
+
+
+def method_lane(method: TelegramMethod) -> int:
+    if isinstance(method, MEDIA_METHODS):
+        return LANE_MEDIA
+    if isinstance(method, PROGRESS_METHODS):
+        return LANE_PROGRESS
+    return LANE_MESSAGE
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Лимиты Bot API на исходящие запросы к чатам."""
+
+    def __init__(
+        self,
+        global_rate: float = config.TG_GLOBAL_RATE,
+        global_burst: float = config.TG_GLOBAL_BURST,
+        chat_rate: float = config.TG_CHAT_RATE,
+        chat_burst: float = config.TG_CHAT_BURST,
+        group_rate: float = config.TG_GROUP_RATE,
+        group_burst: float = config.TG_GROUP_BURST,
+        max_retries: int = config.TG_MAX_RETRIES,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._blocked_until: dict[int | str, float] = {}
+        self._waiting_global = [0, 0, 0]
+        self._edit_versions: dict[tuple, int] = {}
+        self.retries = 0
+        self.superseded = 0
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                for key in [k for k, b in self._chats.items() if b.full()]:
+                    del self._chats[key]
+            # Отрицательный id и @username - группы и каналы
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(
+                self.group_rate if is_group else self.chat_rate,
+                self.group_burst if is_group else self.chat_burst,
+            )
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: int | str, lane: int):
+        """Ждет токен чата, затем глобальный - уступая более приоритетным."""
+        chat = self._chat_bucket(chat_id)
+        while True:
+            blocked = self._blocked_until.get(chat_id, 0) - time.monotonic()
+            if blocked > 0:
+                await asyncio.sleep(blocked)
+                continue
+            self._blocked_until.pop(chat_id, None)
+            if not chat.try_acquire():
+                await asyncio.sleep(chat.retry_after())
+                continue
+            break
+
+        self._waiting_global[lane] += 1
+        try:
+            while True:
+                if not any(self._waiting_global[:lane]) and self._global.try_acquire():
+                    return
+                await asyncio.sleep(max(self._global.retry_after(), 0.01))
+        finally:
+            self._waiting_global[lane] -= 1
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. - без лимитов на чат
+            return await make_request(bot, method)
+
+        lane = method_lane(method)
+        edit_key = None
+        if isinstance(method, EditMessageText):
+            edit_key = (chat_id, method.message_id)
+            version = self._edit_versions.get(edit_key, 0) + 1
+            self._edit_versions[edit_key] = version
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire(chat_id, lane)
+                if edit_key and self._edit_versions.get(edit_key) != version:
+                    # Пока ждали, пришла более свежая правка этого же сообщения
+                    self.superseded += 1
+                    return True
+                try:
+                    return await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.retries += 1
+                    self._blocked_until[chat_id] = time.monotonic() + e.retry_after
+                    logger.warning(
+                        f"Telegram flood control: {type(method).__name__} in {chat_id}, retry in {e.retry_after}s"
+                    )
+        finally:
+            if edit_key and self._edit_versions.get(edit_key) == version:
+                del self._edit_versions[edit_key]
+
+    def format_stats(self) -> str:
+        waiting = ", ".join(f"{name}={n}" for name, n in zip(LANE_NAMES, self._waiting_global))
+        return f"{waiting}, retries={self.retries}, superseded={self.superseded}"
@@ -0,0 +1,93 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake)
+    return fake
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    params = dict(failure_threshold=3, cooldown=60, half_open_probes=1)
+    params.update(kwargs)
+    return CircuitBreaker("mirror.test", **params)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = _breaker()
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_request()
+    assert error.value.retry_in == pytest.approx(60)
+
+
+def test_success_resets_failure_count(clock):
+    breaker = _breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert (breaker.state, breaker.failures) == (CLOSED, 1)
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breaker = _breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    # Одна проба за раз: остальные отклоняются сразу
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_request()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = _breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = _breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 61
+    breaker.before_request()
+    breaker.release()
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+
+
+def test_registry_keys_by_host():
+    registry = CircuitBreakerRegistry(enabled=True, failure_threshold=1)
+    a = registry.get("https://Mirror.test/api?url=1")
+    assert registry.get("https://mirror.test/other") is a
+    assert registry.get("https://other.test/") is not a
+    a.record_failure()
+    assert registry.open_hosts() == ["mirror.test"]
+    assert CircuitBreakerRegistry(enabled=False).get("https://mirror.test/") is None
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from download_pool import CancelToken, DownloadKilledError, DownloadScheduler, QueueFullError, remove_partial_files
+
+
+def _scheduler(**kwargs) -> DownloadScheduler:
+    params = dict(
+        workers=1, max_queue=1, executor_kind="thread", platform_limits={}, platform_limit_default=10,
+        cancel_grace=0.2,
+    )
+    params.update(kwargs)
+    return DownloadScheduler(**params)
+
+
+def _cooperative(cancel_token: CancelToken, path: str) -> str:
+    """Загрузка, которая пишет файл и останавливается по флагу отмены."""
+    cancel_token.track(path)
+    for name in (path, path + ".part", path + ".part-Frag1"):
+        open(name, "w").close()
+    while not cancel_token.cancelled():
+        time.sleep(0.01)
+    raise RuntimeError("cancelled")
+
+
+def _stuck(seconds: float) -> str:
+    """Загрузка, которая флаг отмены не проверяет."""
+    time.sleep(seconds)
+    return "late"
+
+
+def test_timeout_cancels_job_and_removes_its_files(tmp_path):
+    scheduler = _scheduler()
+    path = str(tmp_path / "video.mp4")
+
+    async def scenario():
+        token = scheduler.new_cancel_token()
+        with pytest.raises(asyncio.TimeoutError):
+            await scheduler.submit("tiktok", _cooperative, token, path, timeout=0.1, cancel_token=token)
+        await asyncio.sleep(0)
+        return scheduler.running, scheduler.cancelled
+
+    assert asyncio.run(scenario()) == (0, 1)
+    assert list(tmp_path.iterdir()) == []
+    scheduler.shutdown()
+
+
+def test_stuck_thread_keeps_slot_until_it_returns():
+    scheduler = _scheduler(max_queue=5, cancel_grace=0.05)
+
+    async def scenario():
+        token = scheduler.new_cancel_token()
+        with pytest.raises(asyncio.TimeoutError):
+            await scheduler.submit(None, _stuck, 0.5, timeout=0.05, cancel_token=token)
+        # Поток еще работает: слот пула занят, следующая задача ждет
+        busy = scheduler.running
+        started = time.monotonic()
+        result = await scheduler.submit(None, threading.get_ident)
+        return busy, time.monotonic() - started, result
+
+    busy, waited, result = asyncio.run(scenario())
+    assert busy == 1
+    assert waited >= 0.2
+    assert result
+    scheduler.shutdown()
+
+
+def test_process_mode_kills_job_that_ignores_cancel():
+    scheduler = _scheduler(executor_kind="process", cancel_grace=0.2)
+
+    async def scenario():
+        token = scheduler.new_cancel_token()
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await scheduler.submit(None, _stuck, 30, timeout=0.2, cancel_token=token)
+        stopped = time.monotonic() - started
+        await asyncio.sleep(0.05)
+        # Слот свободен - следующая задача идет сразу
+        result = await scheduler.submit(None, _stuck, 0)
+        return stopped, scheduler.running, result
+
+    stopped, running, result = asyncio.run(scenario())
+    assert stopped < 5
+    assert (running, result) == (0, "late")
+    scheduler.shutdown()
+
+
+def test_shutdown_kills_running_process():
+    scheduler = _scheduler(executor_kind="process")
+
+    async def scenario():
+        job = asyncio.ensure_future(scheduler.submit(None, _stuck, 30))
+        await asyncio.sleep(0.2)
+        scheduler.shutdown()
+        with pytest.raises(DownloadKilledError):
+            await asyncio.wait_for(job, 5)
+        return scheduler.running
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_queue_overflow_is_rejected():
+    scheduler = _scheduler(max_queue=1)
+
+    async def scenario():
+        running = asyncio.ensure_future(scheduler.submit(None, _stuck, 0.2))
+        await asyncio.sleep(0.02)
+        queued = asyncio.ensure_future(scheduler.submit(None, _stuck, 0))
+        await asyncio.sleep(0.02)
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(None, _stuck, 0)
+        return await asyncio.gather(running, queued)
+
+    assert asyncio.run(scenario()) == ["late", "late"]
+    assert scheduler.rejected == 1
+    scheduler.shutdown()
+
+
+def test_platform_limit_serializes_jobs():
+    scheduler = _scheduler(workers=4, max_queue=10, platform_limits={"instagram": 1})
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def job() -> None:
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+
+    async def scenario():
+        await asyncio.gather(*(scheduler.submit("instagram", job) for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert max(peak) == 1
+    scheduler.shutdown()
+
+
+def test_remove_partial_files(tmp_path):
+    path = tmp_path / "v.mp4"
+    for name in ("v.mp4.part", "v.mp4.ytdl", "v.mp4.part-Frag3", "v.mp4-Frag1", "other.mp4"):
+        (tmp_path / name).touch()
+    assert remove_partial_files([str(path)]) == 4
+    assert [p.name for p in tmp_path.iterdir()] == ["other.mp4"]
@@ -0,0 +1,92 @@
+import asyncio
+
+from fair_scheduler import FairScheduler
+from job_queue import Job
+
+
+def _job(user_id: int, chat_id: int | None = None, n: int = 0) -> Job:
+    return Job(f"https://example.com/{user_id}/{n}", "mp4", chat_id or user_id, 1, user_id=user_id)
+
+
+def _scheduler(**kwargs) -> FairScheduler:
+    params = dict(user_rate=1, user_burst=1, chat_concurrency=10, user_weights={})
+    params.update(kwargs)
+    return FairScheduler(**params)
+
+
+async def _drain(scheduler: FairScheduler) -> list[int]:
+    order = []
+    while scheduler.pending():
+        job = await scheduler.next()
+        order.append(job.user_id)
+        await scheduler.done(job)
+    return order
+
+
+def test_round_robin_between_users():
+    async def scenario():
+        scheduler = _scheduler()
+        for n in range(3):
+            await scheduler.submit(_job(1, n=n))
+        await scheduler.submit(_job(2))
+        await scheduler.submit(_job(3))
+        return await _drain(scheduler)
+
+    # Пользователь со множеством ссылок не задерживает остальных
+    assert asyncio.run(scenario()) == [1, 2, 3, 1, 1]
+
+
+def test_user_weight_gives_more_turns():
+    async def scenario():
+        scheduler = _scheduler(user_weights={1: 2})
+        for n in range(4):
+            await scheduler.submit(_job(1, n=n))
+            await scheduler.submit(_job(2, n=n))
+        return await _drain(scheduler)
+
+    assert asyncio.run(scenario()) == [1, 1, 2, 1, 1, 2, 2, 2]
+
+
+def test_chat_cap_skips_busy_chat():
+    async def scenario():
+        scheduler = _scheduler(chat_concurrency=1)
+        await scheduler.submit(_job(1, chat_id=100, n=0))
+        await scheduler.submit(_job(1, chat_id=100, n=1))
+        await scheduler.submit(_job(2, chat_id=200))
+        first = await scheduler.next()
+        # Чат 100 занят: следующей берется задача другого чата
+        second = await scheduler.next()
+        blocked = scheduler._pick()
+        await scheduler.done(first)
+        third = await scheduler.next()
+        return first.chat_id, second.chat_id, blocked, third.chat_id
+
+    assert asyncio.run(scenario()) == (100, 200, None, 100)
+
+
+def test_token_bucket_throttles_bursts():
+    scheduler = _scheduler(user_rate=0.001, user_burst=2)
+    assert scheduler.allow(1)[0]
+    assert scheduler.allow(1)[0]
+    allowed, retry_after = scheduler.allow(1)
+    assert not allowed and retry_after > 0
+    assert scheduler.allow(2)[0]
+    assert scheduler.throttled == 1
+
+
+def test_ready_ignores_jobs_blocked_by_chat_cap():
+    async def scenario():
+        scheduler = _scheduler(chat_concurrency=2)
+        for chat in (100, 200, 300):
+            for n in range(5):
+                await scheduler.submit(_job(chat, chat_id=chat, n=n))
+        before = scheduler.ready()
+        running = [await scheduler.next() for _ in range(6)]
+        blocked = scheduler.ready()
+        await scheduler.submit(_job(4, n=0))
+        light = scheduler.ready()
+        job = await scheduler.next()
+        return before, blocked, light, job.user_id, len(scheduler.held()), len(running)
+
+    # Тяжелые чаты уперлись в лимит: окно предвыборки не занято, легкий пользователь идет сразу
+    assert asyncio.run(scenario()) == (6, 0, 1, 4, 16, 6)
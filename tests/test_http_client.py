@@ -0,0 +1,69 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from circuit_breaker import CLOSED, OPEN, CircuitBreakerRegistry
+from http_client import HttpSessionManager
+
+RESPONSES = {
+    "/ok": b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok",
+    "/busy": b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n",
+    # Тело обрывается на середине
+    "/truncated": b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\nConnection: close\r\n\r\nshort",
+}
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    request = await reader.readuntil(b"\r\n\r\n")
+    path = request.split(b" ", 2)[1].decode()
+    writer.write(RESPONSES[path])
+    await writer.drain()
+    writer.close()
+
+
+async def _fetch(pool: HttpSessionManager, url: str) -> bytes | Exception:
+    try:
+        async with pool.get(url) as response:
+            return await response.read()
+    except aiohttp.ClientError as e:
+        return e
+
+
+@pytest.fixture
+def breakers():
+    return CircuitBreakerRegistry(enabled=True, failure_threshold=2, cooldown=60, half_open_probes=1)
+
+
+def _run(breakers: CircuitBreakerRegistry, paths: list[str], failures_before: int = 0):
+    async def scenario():
+        server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+        base = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        breaker = breakers.get(base)
+        breaker.failures = failures_before
+        pool = HttpSessionManager(breakers=breakers)
+        results = [await _fetch(pool, base + path) for path in paths]
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+        return results, breaker.state, breaker.failures
+
+    return asyncio.run(scenario())
+
+
+def test_success_closes_and_resets(breakers):
+    results, state, failures = _run(breakers, ["/ok"], failures_before=1)
+    assert results == [b"ok"]
+    assert (state, failures) == (CLOSED, 0)
+
+
+def test_server_error_counts_as_failure(breakers):
+    _, state, failures = _run(breakers, ["/busy", "/busy"])
+    assert (state, failures) == (OPEN, 2)
+
+
+def test_broken_body_is_one_failure_not_success_plus_failure(breakers):
+    results, state, failures = _run(breakers, ["/truncated"], failures_before=1)
+    assert isinstance(results[0], aiohttp.ClientPayloadError)
+    # Раньше успех по статусу сбрасывал счетчик, и цепь не открывалась
+    assert (state, failures) == (OPEN, 2)
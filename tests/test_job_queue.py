@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+
+from job_queue import Job, SQLiteQueue
+
+
+def test_sqlite_claim_waits_for_lock_off_the_event_loop(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "queue.db")
+        queue = SQLiteQueue(path, poll_interval=0.01)
+        await queue.put(Job("https://example.com/v/1", "mp4", chat_id=1, message_id=2))
+        # Другой процесс держит блокировку на запись
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        getting = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.2)
+        waiting = not getting.done()
+        other.execute("COMMIT")
+        other.close()
+        job = await asyncio.wait_for(getting, 5)
+        ticking.cancel()
+        await queue.close()
+        return waiting, ticks, job.url
+
+    waiting, ticks, url = asyncio.run(scenario())
+    assert waiting
+    # Пока задача ждет блокировку, event loop работает
+    assert ticks >= 10
+    assert url == "https://example.com/v/1"
+
+
+def test_sqlite_claim_expires_unless_touched(tmp_path):
+    async def scenario():
+        queue = SQLiteQueue(str(tmp_path / "queue.db"), poll_interval=0.01, visibility_timeout=0.3)
+        await queue.put(Job("https://example.com/v/1", "mp4", chat_id=1, message_id=2))
+        job = await queue.get()
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            await queue.touch([job])
+        # Взятие продлено - другим воркерам задача не видна
+        hidden = await queue.peek(10)
+        await asyncio.sleep(0.35)
+        again = await asyncio.wait_for(queue.get(), 1)
+        await queue.ack(again)
+        left = await queue.size(), await queue.peek(10)
+        await queue.close()
+        return job.job_id, hidden, again.job_id, left
+
+    job_id, hidden, again, left = asyncio.run(scenario())
+    assert hidden == []
+    # Воркер перестал продлевать (упал) - задача снова выдается
+    assert again == job_id
+    assert left == (0, [])
@@ -0,0 +1,129 @@
+import asyncio
+
+from job_queue import Job, SQLiteQueue
+from job_store import DONE, QUEUED, RUNNING, JobStore
+
+
+def _open(tmp_path, node_id: str = "node-1") -> tuple[SQLiteQueue, JobStore]:
+    queue = SQLiteQueue(str(tmp_path / "queue.db"), poll_interval=0.01, visibility_timeout=900)
+    store = JobStore(str(tmp_path / "jobs.db"), stale_after=900, node_id=node_id)
+    return queue, store
+
+
+async def _start(queue: SQLiteQueue, store: JobStore) -> Job:
+    """Задача поставлена, взята воркером и начата."""
+    job = Job("https://example.com/v/1", "mp4", chat_id=1, message_id=2, user_id=3)
+    await store.create(job)
+    await queue.put(job)
+    claimed = await queue.get()
+    assert await store.begin(claimed)
+    return claimed
+
+
+def test_job_interrupted_by_shutdown_survives_restart(tmp_path):
+    async def scenario():
+        queue, store = _open(tmp_path)
+        job = await _start(queue, store)
+        # Отмена воркера при остановке (run_job)
+        await store.requeue(job)
+        await queue.release(job)
+        await queue.close()
+        await store.close()
+
+        queue, store = _open(tmp_path)
+        outstanding = [(j.job_id, status) for j, status, _, _ in await store.outstanding()]
+        again = await asyncio.wait_for(queue.get(), 1)
+        await queue.close()
+        await store.close()
+        return job.job_id, outstanding, again.job_id
+
+    job_id, outstanding, again = asyncio.run(scenario())
+    assert outstanding == [(job_id, QUEUED)]
+    assert again == job_id
+
+
+def test_crashed_node_recovers_own_running_job_at_once(tmp_path):
+    async def scenario():
+        queue, store = _open(tmp_path)
+        job = await _start(queue, store)
+        # Процесс упал: ни ack, ни release
+        await queue.close()
+        await store.close()
+
+        other_queue, other_store = _open(tmp_path, node_id="node-2")
+        # Свежая задача чужого узла: ее, возможно, еще выполняют
+        foreign = await other_store.outstanding()
+        await other_store.close()
+        await other_queue.close()
+
+        queue, store = _open(tmp_path)
+        recovered = await store.outstanding()
+        for j, status, _, _ in recovered:
+            await store.requeue(j)
+            await queue.release(j)
+            await queue.release(j)  # Повтор не создает дубликат
+        again = await asyncio.wait_for(queue.get(), 1)
+        left = await queue.size()
+        await queue.close()
+        await store.close()
+        return job.job_id, foreign, [(j.job_id, s) for j, s, _, _ in recovered], again.job_id, left
+
+    job_id, foreign, recovered, again, left = asyncio.run(scenario())
+    assert foreign == []
+    assert recovered == [(job_id, RUNNING)]
+    assert again == job_id
+    assert left == 0
+
+
+def test_stale_job_of_other_node_is_recovered(tmp_path):
+    async def scenario():
+        queue, store = _open(tmp_path)
+        job = await _start(queue, store)
+        await queue.close()
+        await store.close()
+
+        other = JobStore(str(tmp_path / "jobs.db"), stale_after=0, node_id="node-2")
+        recovered = [(j.job_id, status) for j, status, _, _ in await other.outstanding()]
+        # Зависшую задачу можно начать заново, и теперь она числится за node-2
+        restarted = await other.begin(job)
+        await other.close()
+
+        store = JobStore(str(tmp_path / "jobs.db"), stale_after=900, node_id="node-1")
+        again = await store.begin(job)
+        await store.close()
+        return job.job_id, recovered, restarted, again
+
+    job_id, recovered, restarted, again = asyncio.run(scenario())
+    assert recovered == [(job_id, RUNNING)]
+    assert restarted
+    assert not again  # Свежая попытка другого узла не дублируется
+
+
+def test_finish_keeps_providers_of_all_attempts_and_purge(tmp_path):
+    async def scenario():
+        store = JobStore(str(tmp_path / "jobs.db"), stale_after=0, retention=0, node_id="node-1")
+        job = Job("https://example.com/v/1", "mp4", chat_id=1, message_id=2)
+        await store.create(job)
+
+        async def attempt(providers):
+            assert await store.begin(job)
+            for provider in providers:
+                store.note_provider(provider)
+
+        await asyncio.create_task(attempt(["cobalt", "yt-dlp"]))
+        await store.finish(job, ok=False, error="timeout")
+        failed_again = await store.begin(job)
+        await store.requeue(job)
+        await asyncio.create_task(attempt(["yt-dlp", "mirror"]))
+        await store.finish(job, ok=True)
+        row = store._conn.execute("SELECT status, attempts, providers, error FROM jobs").fetchone()
+        stats = await store.format_stats()
+        purged = await store.purge()
+        await store.close()
+        return failed_again, row, stats, purged
+
+    failed_again, row, stats, purged = asyncio.run(scenario())
+    assert not failed_again  # Завершенная задача повторно не начинается
+    assert row == (DONE, 2, '["cobalt", "yt-dlp", "mirror"]', None)
+    assert stats == "queued=0, running=0, done=1, failed=0"
+    assert purged == 1
@@ -0,0 +1,67 @@
+import pytest
+
+import media_links
+from media_links import HIGH_CONFIDENCE, MediaLinkExtractor, is_blocked, score_link
+
+VIDEO = "https://cdn.example.net/media/clip.mp4"
+IMAGE = "https://img.example.net/photo.jpg"
+# Страница длиннее двух хвостов - ссылки разбираются не в первом же куске
+PADDING = "<p>Привет, мир</p>\n" * (2 * media_links._CARRY // 10)
+
+
+def _page(*links: str) -> bytes:
+    return (PADDING + "".join(links) + PADDING).encode()
+
+
+def _extract(page: bytes, chunk_size: int, format_type: str = "mp4") -> tuple[str | None, int]:
+    extractor = MediaLinkExtractor(format_type)
+    for start in range(0, len(page), chunk_size):
+        if extractor.feed(page[start:start + chunk_size]):
+            break
+    return extractor.close(), extractor.links
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 333, 4096, 10 ** 7])
+def test_link_split_across_chunks_is_found(chunk_size):
+    page = _page(
+        '<a href="https://example.com/about">о нас</a>',
+        f'<img src="{IMAGE}">',
+        f'<div data-video-url="{VIDEO}"></div>',
+    )
+    # Результат не зависит от того, где прошли границы кусков (в т.ч. посреди UTF-8 символа)
+    assert _extract(page, chunk_size) == (VIDEO, 3)
+
+
+@pytest.mark.parametrize("chunk_size", [5, 4096, 10 ** 7])
+def test_size_after_link_in_next_chunk_rejects_it(chunk_size):
+    page = _page(
+        f'<a href="{VIDEO}">Скачать</a> (120 MB)',
+        f'<a href="{IMAGE}">Фото</a>',
+    )
+    assert _extract(page, chunk_size)[0] == IMAGE
+
+
+def test_stops_reading_on_confident_link():
+    extractor = MediaLinkExtractor("mp4")
+    assert extractor.feed(_page(f'<a href="{VIDEO}">x</a>'))
+    assert extractor.best_score >= HIGH_CONFIDENCE
+    # Дальнейшие куски не разбираются
+    assert extractor.feed(f'<a href="{IMAGE}">'.encode())
+    assert extractor.close() == VIDEO
+
+
+def test_entities_in_link_are_unescaped():
+    page = _page('<a href="https://cdn.example.net/v.mp4?a=1&amp;b=2">x</a>')
+    assert _extract(page, 100)[0] == "https://cdn.example.net/v.mp4?a=1&b=2"
+
+
+def test_scoring_and_blocklist():
+    assert is_blocked("video.twimg.twitter.com")
+    assert is_blocked("ssstwitter.net")
+    assert not is_blocked("cdn.example.net")
+    assert score_link("https://www.youtube.com/v.mp4", "href", "mp4") == 0
+    assert score_link("https://example.com/app.js", "src", "mp4") == 0
+    assert score_link("https://example.com/page", "href", "mp4") == 0
+    assert score_link(VIDEO, "href", "mp4") > score_link(VIDEO, "href", "jpg") > 0
+    assert score_link(VIDEO, "href", "mp4", " (12 MB)") > score_link(VIDEO, "href", "mp4")
+    assert score_link(VIDEO, "href", "mp4", " (1,2 ГБ)") == 0
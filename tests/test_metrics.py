@@ -0,0 +1,52 @@
+import metrics
+from metrics import Registry
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    downloads = registry.counter("bot_downloads_total", "Загрузки", ("platform", "result"))
+    downloads.inc(platform="tiktok", result="success")
+    downloads.inc(2, platform="tiktok", result="success")
+    downloads.inc(platform='we"ird\\name\n', result="error")
+    registry.gauge("bot_queue", "Очередь", lambda: 1.5)
+
+    assert registry.render() == (
+        "# HELP bot_downloads_total Загрузки\n"
+        "# TYPE bot_downloads_total counter\n"
+        'bot_downloads_total{platform="tiktok",result="success"} 3\n'
+        'bot_downloads_total{platform="we\\"ird\\\\name\\n",result="error"} 1\n'
+        "# HELP bot_queue Очередь\n"
+        "# TYPE bot_queue gauge\n"
+        "bot_queue 1.5\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("bot_seconds", "Длительность", ("stage",), buckets=(1, 0.5))
+    for value in (0.2, 0.7, 0.9, 3):
+        latency.observe(value, stage="download")
+
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE bot_seconds histogram"
+    assert lines[2:] == [
+        'bot_seconds_bucket{stage="download",le="0.5"} 1',
+        'bot_seconds_bucket{stage="download",le="1"} 3',
+        'bot_seconds_bucket{stage="download",le="+Inf"} 4',
+        'bot_seconds_sum{stage="download"} 4.8',
+        'bot_seconds_count{stage="download"} 4',
+    ]
+
+
+def test_timer_observes_block_duration():
+    registry = Registry()
+    latency = registry.histogram("bot_seconds", "Длительность", ("stage",))
+    with latency.time(stage="upload"):
+        pass
+    assert 'bot_seconds_count{stage="upload"} 1' in registry.render()
+
+
+def test_global_registry_has_pipeline_metrics():
+    text = metrics.REGISTRY.render()
+    for name in ("savebot_downloads_total", "savebot_provider_duration_seconds", "savebot_uploads_total"):
+        assert f"# TYPE {name} " in text
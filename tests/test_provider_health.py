@@ -0,0 +1,58 @@
+from provider_health import ProviderHealth, provider_key
+
+
+def _health(tmp_path=None) -> ProviderHealth:
+    path = str(tmp_path / "health.json") if tmp_path else None
+    return ProviderHealth(path=path, window=10, prior_latency=5.0)
+
+
+def test_provider_key_is_host():
+    assert provider_key("https://API.Mirror.test/v1?url=x") == "api.mirror.test"
+
+
+def test_rank_prefers_fast_reliable_providers():
+    health = _health()
+    for _ in range(5):
+        health.record("https://fast.test/a", True, 1.0)
+        health.record("https://slow.test/a", True, 8.0)
+        health.record("https://flaky.test/a", False, 1.0, "HTTP 500")
+    ranked = health.rank(["https://flaky.test/x", "https://slow.test/x", "https://new.test/x", "https://fast.test/x"])
+    # Цена попытки / P(успех): fast 1/(6/7), flaky 1/(1/7), slow 8/(6/7), new - приор 5/(1/2)
+    assert ranked == ["https://fast.test/x", "https://flaky.test/x", "https://slow.test/x", "https://new.test/x"]
+
+
+def test_rank_keeps_order_on_ties():
+    health = _health()
+    candidates = ["https://b.test/", "https://a.test/", "https://c.test/"]
+    assert health.rank(candidates) == candidates
+
+
+def test_stats_window_and_last_error():
+    health = _health()
+    for _ in range(15):
+        health.record("https://m.test/", True, 2.0)
+    health.record("https://m.test/", False, 3.0, "timeout")
+    stats = health.stats("https://m.test/")
+    assert stats["attempts"] == 10
+    assert stats["success_rate"] == 0.9
+    assert stats["p50"] == 2.0
+    assert stats["last_error"] == "timeout"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    health = _health(tmp_path)
+    health.record("https://m.test/", True, 1.5)
+    health.record("https://m.test/", False, 4.0, "HTTP 503")
+    health.save()
+
+    restored = _health(tmp_path)
+    restored.load()
+    assert restored.stats("https://m.test/") == health.stats("https://m.test/")
+    assert restored.expected_time_to_success("https://m.test/") == health.expected_time_to_success("https://m.test/")
+
+
+def test_load_ignores_broken_file(tmp_path):
+    (tmp_path / "health.json").write_text("{not json")
+    health = _health(tmp_path)
+    health.load()
+    assert health.format_summary() == "нет данных"
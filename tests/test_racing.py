@@ -0,0 +1,66 @@
+import asyncio
+
+from provider_health import ProviderHealth
+from racing import race
+
+
+def _attempt(delays: dict, results: dict, log: list, cancelled: list | None = None):
+    async def attempt(candidate):
+        log.append(candidate)
+        try:
+            await asyncio.sleep(delays.get(candidate, 0))
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(candidate)
+            raise
+        result = results.get(candidate)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return attempt
+
+
+def test_sequential_fallback_skips_failures():
+    log = []
+    results = {"a": None, "b": RuntimeError("HTTP 500"), "c": "file.mp4"}
+    winner = asyncio.run(race(["a", "b", "c", "a"], _attempt({}, results, log), fan_out=1))
+    assert winner == ("c", "file.mp4")
+    # Дубликаты убраны, порядок сохранен
+    assert log == ["a", "b", "c"]
+
+
+def test_fan_out_takes_first_success_and_cancels_rest():
+    log, cancelled = [], []
+    delays = {"slow": 1.0, "fast": 0.01, "slower": 2.0}
+    results = {"slow": "slow.mp4", "fast": "fast.mp4", "slower": "slower.mp4"}
+    winner = asyncio.run(race(["slow", "fast", "slower"], _attempt(delays, results, log, cancelled), fan_out=3))
+    assert winner == ("fast", "fast.mp4")
+    assert sorted(cancelled) == ["slow", "slower"]
+
+
+def test_failed_attempt_is_replaced_by_next_candidate():
+    log = []
+    delays = {"a": 0.01, "b": 0.5, "c": 0.02}
+    results = {"a": None, "b": "b.mp4", "c": "c.mp4"}
+    winner = asyncio.run(race(["a", "b", "c"], _attempt(delays, results, log), fan_out=2))
+    # "a" упал первым - на его место запущен "c", и он успел раньше "b"
+    assert winner == ("c", "c.mp4")
+    assert log == ["a", "b", "c"]
+
+
+def test_nothing_works_returns_none():
+    results = {"a": None, "b": ValueError("bad json")}
+    assert asyncio.run(race(["a", "b"], _attempt({}, results, []), fan_out=2)) is None
+
+
+def test_health_orders_candidates_and_records_outcomes():
+    health = ProviderHealth(path=None, window=10, prior_latency=5.0)
+    for _ in range(5):
+        health.record("https://bad.test/", False, 5.0, "HTTP 500")
+    log = []
+    results = {"https://bad.test/x": "bad.mp4", "https://good.test/x": None}
+    asyncio.run(race(["https://bad.test/x", "https://good.test/x"], _attempt({}, results, log), health=health))
+    assert log[0] == "https://good.test/x"
+    assert health.stats("https://good.test/")["attempts"] == 1
+    assert health.stats("https://good.test/")["last_error"] == "no media found"
+    assert health.stats("https://bad.test/")["attempts"] == 6
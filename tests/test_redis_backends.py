@@ -0,0 +1,123 @@
+import asyncio
+import uuid
+
+import pytest
+
+pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты очереди
+
+from job_queue import Job, RedisQueue  # noqa: E402
+from result_cache import RedisBackend  # noqa: E402
+
+
+def _url() -> str:
+    # Свой сервер в процессе на каждый тест
+    return f"fakeredis://test-{uuid.uuid4().hex}"
+
+
+def _job(n: int = 1) -> Job:
+    return Job(f"https://example.com/v/{n}", "mp4", chat_id=1, message_id=2)
+
+
+def test_queue_claim_and_ack():
+    async def scenario():
+        queue = RedisQueue(_url(), poll_interval=0.01)
+        await queue.put(_job(1))
+        await queue.put(_job(2))
+        first = await queue.get()
+        claimed = await queue._client.zcard(queue.claims_key)
+        peek = [j.url for j in await queue.peek(10)]
+        await queue.ack(first)
+        left = await queue._client.zcard(queue.claims_key)
+        second = await queue.get()
+        await queue.close()
+        return first.url, claimed, peek, left, second.url
+
+    first, claimed, peek, left, second = asyncio.run(scenario())
+    assert first == "https://example.com/v/1"
+    assert claimed == 1
+    assert peek == ["https://example.com/v/2"]
+    assert left == 0
+    assert second == "https://example.com/v/2"
+
+
+def test_queue_restores_job_of_dead_worker():
+    async def scenario():
+        url = _url()
+        dead = RedisQueue(url, poll_interval=0.01, visibility_timeout=0.2)
+        alive = RedisQueue(url, poll_interval=0.01, visibility_timeout=0.2)
+        await dead.put(_job())
+        job = await dead.get()  # Воркер взял задачу и упал
+        again = await asyncio.wait_for(alive.get(), 2)
+        await alive.ack(again)
+        size = await alive.size()
+        claims = await alive._client.zcard(alive.claims_key)
+        await dead.close()
+        await alive.close()
+        return job.job_id, again.job_id, size, claims
+
+    job_id, again, size, claims = asyncio.run(scenario())
+    assert again == job_id
+    assert (size, claims) == (0, 0)
+
+
+def test_queue_touch_keeps_claim_alive():
+    async def scenario():
+        url = _url()
+        holder = RedisQueue(url, poll_interval=0.01, visibility_timeout=0.3)
+        other = RedisQueue(url, poll_interval=0.01, visibility_timeout=0.3)
+        await holder.put(_job())
+        job = await holder.get()
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            await holder.touch([job])
+        # Взятию больше visibility_timeout, но оно продлено - очистка его не трогает
+        await other._restore_expired()
+        kept = await other.size(), await other._client.zcard(other.claims_key)
+        await asyncio.sleep(0.35)
+        other._restored_at = 0.0
+        await other._restore_expired()
+        expired = await other.size(), await other._client.zcard(other.claims_key)
+        await holder.close()
+        await other.close()
+        return kept, expired
+
+    kept, expired = asyncio.run(scenario())
+    assert kept == (0, 1)
+    assert expired == (1, 0)
+
+
+def test_queue_release_is_idempotent():
+    async def scenario():
+        queue = RedisQueue(_url(), poll_interval=0.01)
+        await queue.put(_job(1))
+        await queue.put(_job(2))
+        job = await queue.get()
+        await queue.release(job)
+        await queue.release(job)
+        order = [j.url for j in await queue.peek(10)]
+        claims = await queue._client.zcard(queue.claims_key)
+        await queue.close()
+        return order, claims
+
+    order, claims = asyncio.run(scenario())
+    # Возвращенная задача - в начало очереди, без дубликата
+    assert order == ["https://example.com/v/1", "https://example.com/v/2"]
+    assert claims == 0
+
+
+def test_result_cache_redis_backend():
+    async def scenario():
+        cache = RedisBackend(_url())
+        await cache.set("mp4:https://example.com/v/1", '{"file_id": "abc"}', ttl=60)
+        hit = await cache.get("mp4:https://example.com/v/1")
+        ttl = await cache._client.ttl(cache.prefix + "mp4:https://example.com/v/1")
+        await cache.delete("mp4:https://example.com/v/1")
+        gone = await cache.get("mp4:https://example.com/v/1")
+        await cache.close()
+        return hit, ttl, gone
+
+    hit, ttl, gone = asyncio.run(scenario())
+    assert hit == '{"file_id": "abc"}'
+    assert 0 < ttl <= 60
+    assert gone is None
@@ -0,0 +1,50 @@
+import pytest
+
+import routing
+from routing import Platform, detect_platform, get_timeout, instagram_shortcode, youtube_video_id
+
+
+@pytest.mark.parametrize("url, platform", [
+    ("https://www.tiktok.com/@u/video/1", "tiktok"),
+    ("https://vt.tiktok.com/ZSabc/", "tiktok"),
+    ("https://m.facebook.com/watch?v=1", "facebook"),
+    ("https://fb.watch/abc", "facebook"),
+    ("https://youtu.be/dQw4w9WgXcQ", "youtube"),
+    ("https://x.com/u/status/1", "twitter"),
+    ("https://vkvideo.ru/video-1_2", "vk"),
+    ("https://pin.it/abc", "pinterest"),
+    # Домен платформы в query-параметре чужой ссылки платформу не меняет
+    ("https://example.com/redirect?to=https://facebook.com/x", None),
+    ("https://notyoutube.com/watch?v=1", None),
+    ("not a url", None),
+])
+def test_detect_platform_by_host(url, platform):
+    assert detect_platform(url) == platform
+
+
+def test_short_hosts_and_timeouts():
+    assert routing.is_short_host("vm.tiktok.com")
+    assert not routing.is_short_host("www.tiktok.com")
+    assert get_timeout("instagram") == 180
+    assert get_timeout(None) == routing.TIMEOUT_DEFAULT
+
+
+def test_register_platform_replaces_domains():
+    try:
+        routing.register_platform(Platform("bench", domains=["bench.test"], short_domains=["b.test"], timeout=7))
+        assert detect_platform("https://video.bench.test/1") == "bench"
+        routing.register_platform(Platform("bench", domains=["bench2.test"]))
+        assert detect_platform("https://bench.test/1") is None
+        assert not routing.is_short_host("b.test")
+        assert detect_platform("https://bench2.test/1") == "bench"
+    finally:
+        old = routing.PLATFORMS.pop("bench")
+        for domain in old.domains + old.short_domains:
+            routing._domain_index.pop(domain, None)
+
+
+def test_id_extractors():
+    assert youtube_video_id("https://www.youtube.com/shorts/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert youtube_video_id("https://youtu.be/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert instagram_shortcode("https://www.instagram.com/p/Cabc123/") == "Cabc123"
+    assert instagram_shortcode("https://www.instagram.com/reel/Cabc123/") is None
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_followers_share_leader_result():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "file_id"
+
+        results = await asyncio.gather(*(flight.do("url", fetch) for _ in range(3)))
+        return calls, results, flight.in_flight()
+
+    calls, results, in_flight = asyncio.run(scenario())
+    assert calls == 1
+    assert sorted(results, key=lambda r: r[1]) == [("file_id", False), ("file_id", True), ("file_id", True)]
+    assert in_flight == 0
+
+
+def test_leader_error_reaches_followers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("provider down")
+
+        return await asyncio.gather(flight.do("url", fail), flight.do("url", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_leader_cancel_hands_call_to_follower():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return "follower"
+
+        leader = asyncio.create_task(flight.do("url", slow))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("url", fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, flight.in_flight()
+
+    result, in_flight = asyncio.run(scenario())
+    # Отмена ведущего не отменяет ждущего: он вызывает свой fn сам
+    assert result == ("follower", False)
+    assert in_flight == 0
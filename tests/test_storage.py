@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from storage import JOB_DIR_PREFIX, StorageFullError, StorageManager
+
+
+def _storage(tmp_path, **kwargs) -> StorageManager:
+    params = dict(
+        base_dir=str(tmp_path / "downloads"), quota_bytes=1000, job_reserve_bytes=400,
+        admission_timeout=0.2, orphan_ttl=60, janitor_interval=60, tmpfs_dir=None,
+    )
+    params.update(kwargs)
+    return StorageManager(**params)
+
+
+def _write(path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+
+def _age(path: str, seconds: float):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_job_dir_is_private_and_removed(tmp_path):
+    storage = _storage(tmp_path)
+
+    async def scenario():
+        async with storage.job() as first, storage.job() as second:
+            path = storage.unique_path("video", ".mp4")
+            _write(path, 10)
+            inside = os.path.dirname(path), first != second, storage.used_bytes()
+        return first, inside
+
+    first, (parent, distinct, used) = asyncio.run(scenario())
+    assert os.path.basename(first).startswith(JOB_DIR_PREFIX)
+    # Файл лег в папку внутренней задачи; резерв считается за каждую активную
+    assert distinct and parent != first
+    assert used == 800
+    assert os.listdir(storage.base_dir) == []
+
+
+def test_admission_waits_for_space(tmp_path):
+    storage = _storage(tmp_path, admission_timeout=1.0)
+
+    async def scenario():
+        order = []
+        release = asyncio.Event()
+
+        async def holder(n: int):
+            async with storage.job():
+                order.append(f"start{n}")
+                await release.wait()
+
+        holders = [asyncio.create_task(holder(n)) for n in range(2)]
+        await asyncio.sleep(0.05)
+
+        async def waiter():
+            async with storage.job():
+                order.append("waiter")
+
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.05)
+        order.append("release")
+        release.set()
+        await asyncio.gather(*holders, waiting)
+        return order
+
+    # Третья задача не влезает в квоту и ждет освобождения места
+    assert asyncio.run(scenario()) == ["start0", "start1", "release", "waiter"]
+
+
+def test_admission_rejects_when_quota_stays_full(tmp_path):
+    storage = _storage(tmp_path, admission_timeout=0.1)
+    _write(os.path.join(storage.base_dir, "stray.bin"), 700)
+
+    async def rejected():
+        with pytest.raises(StorageFullError):
+            async with storage.job():
+                pass
+
+    asyncio.run(rejected())
+    assert storage.rejected == 1
+
+
+def test_janitor_reclaims_only_old_inactive_entries(tmp_path):
+    storage = _storage(tmp_path, tmpfs_dir=str(tmp_path / "shm"), tmpfs_max_bytes=100, tmpfs_min_free_bytes=0)
+    old_dir = os.path.join(storage.base_dir, "job-old")
+    fresh_dir = os.path.join(storage.base_dir, "job-fresh")
+    _write(os.path.join(old_dir, "a.mp4"), 100)
+    _write(os.path.join(fresh_dir, "b.mp4"), 50)
+    _write(os.path.join(storage.tmpfs_dir, "job-old", "c.mp4"), 30)
+    _write(os.path.join(storage.base_dir, "old.part"), 20)
+    for path in (old_dir, os.path.join(storage.tmpfs_dir, "job-old"), os.path.join(storage.base_dir, "old.part")):
+        _age(path, 3600)
+
+    async def scenario():
+        async with storage.job() as active:
+            _age(active, 3600)  # Старая, но активная папка не трогается
+            freed = storage.reclaim_orphans()
+            return freed, sorted(os.listdir(storage.base_dir)), os.path.basename(active)
+
+    freed, left, active = asyncio.run(scenario())
+    assert freed == 150
+    assert left == sorted(["job-fresh", active])
+    assert os.listdir(storage.tmpfs_dir) == []
+    assert storage.reclaimed_bytes == 150
+
+
+def test_small_files_go_to_tmpfs_twin(tmp_path):
+    storage = _storage(tmp_path, tmpfs_dir=str(tmp_path / "shm"), tmpfs_max_bytes=100, tmpfs_min_free_bytes=0)
+
+    async def scenario():
+        async with storage.job() as job_dir:
+            small = storage.unique_path("v", ".mp4", size_hint=50)
+            big = storage.unique_path("v", ".mp4", size_hint=500)
+            _write(small, 50)
+            return job_dir, small, big
+
+    job_dir, small, big = asyncio.run(scenario())
+    assert os.path.dirname(small) == os.path.join(storage.tmpfs_dir, os.path.basename(job_dir))
+    assert os.path.dirname(big) == job_dir
+    # Двойник в tmpfs удаляется вместе с задачей
+    assert not os.path.exists(os.path.dirname(small))
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText, GetUpdates, SendMessage, SendVideo
+
+from telegram_sender import LANE_MEDIA, LANE_MESSAGE, LANE_PROGRESS, OutboundLimiter, method_lane
+
+
+def _limiter(**kwargs) -> OutboundLimiter:
+    params = dict(
+        global_rate=1000, global_burst=1000, chat_rate=1000, chat_burst=1000,
+        group_rate=1000, group_burst=1000, max_retries=2,
+    )
+    params.update(kwargs)
+    return OutboundLimiter(**params)
+
+
+def _edit(text: str, chat_id: int = 1) -> EditMessageText:
+    return EditMessageText(chat_id=chat_id, message_id=10, text=text)
+
+
+class FakeApi:
+    """Записывает отправленные запросы; первые failures ответов - 429."""
+
+    def __init__(self, failures: int = 0):
+        self.sent = []
+        self.failures = failures
+
+    async def __call__(self, bot, method):
+        if self.failures:
+            self.failures -= 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        self.sent.append(method)
+        return method
+
+
+def test_method_lanes():
+    assert method_lane(SendVideo(chat_id=1, video="file-id")) == LANE_MEDIA
+    assert method_lane(SendMessage(chat_id=1, text="hi")) == LANE_MESSAGE
+    assert method_lane(_edit("50%")) == LANE_PROGRESS
+
+
+def test_waiting_progress_edits_collapse_to_latest():
+    # Токен чата раз в 0.1с: три правки встают в очередь друг за другом
+    limiter = _limiter(chat_rate=10, chat_burst=1)
+    api = FakeApi()
+
+    async def scenario():
+        return await asyncio.gather(*(limiter(api, None, _edit(f"{p}%")) for p in (10, 20, 30)))
+
+    results = asyncio.run(scenario())
+    # Первая ушла сразу, вторую вытеснила третья, пока обе ждали токен чата
+    assert [m.text for m in api.sent] == ["10%", "30%"]
+    assert limiter.superseded == 1
+    assert results[1] is True
+    assert limiter._edit_versions == {}
+
+
+def test_media_goes_before_waiting_progress():
+    # Глобальный лимит исчерпан: первой после паузы уходит отправка файла
+    limiter = _limiter(global_rate=20, global_burst=1)
+    api = FakeApi()
+
+    async def scenario():
+        await limiter(api, None, SendMessage(chat_id=1, text="first"))
+        progress = asyncio.ensure_future(limiter(api, None, _edit("50%", chat_id=2)))
+        await asyncio.sleep(0)
+        media = asyncio.ensure_future(limiter(api, None, SendVideo(chat_id=3, video="file-id")))
+        await asyncio.gather(progress, media)
+
+    asyncio.run(scenario())
+    assert [type(m).__name__ for m in api.sent] == ["SendMessage", "SendVideo", "EditMessageText"]
+
+
+def test_retry_after_is_retried_then_raised():
+    limiter = _limiter(max_retries=2)
+    api = FakeApi(failures=2)
+    asyncio.run(limiter(api, None, SendMessage(chat_id=-100, text="hi")))
+    assert (len(api.sent), limiter.retries) == (1, 2)
+
+    api = FakeApi(failures=3)
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(limiter(api, None, SendMessage(chat_id=1, text="hi")))
+    assert api.sent == []
+
+
+def test_requests_without_chat_bypass_limits():
+    limiter = _limiter(global_rate=0, global_burst=0)
+    api = FakeApi()
+    asyncio.run(limiter(api, None, GetUpdates()))
+    assert len(api.sent) == 1
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from tracing import JsonLinesExporter, Tracer
+
+
+def test_spans_nest_under_trace_and_export_in_batches(tmp_path):
+    path = tmp_path / "traces.jsonl"
+
+    async def scenario():
+        exporter = JsonLinesExporter(str(path), interval=60)
+        tracer = Tracer(exporter, sample_rate=1.0, max_spans=100)
+        with tracer.trace("job", job_id="j1"):
+            with tracing.span("provider", provider="cobalt"):
+                tracing.annotate(bytes=10)
+            with pytest.raises(ValueError):
+                with tracing.span("http"):
+                    raise ValueError("boom")
+        # До flush файл не пишется - export не трогает диск в event loop
+        written_early = path.exists()
+        await tracer.close()
+        return written_early
+
+    assert asyncio.run(scenario()) is False
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    by_name = {s["name"]: s for s in spans}
+    assert set(by_name) == {"job", "provider", "http"}
+    root = by_name["job"]
+    assert {s["trace_id"] for s in spans} == {root["trace_id"]}
+    assert by_name["provider"]["parent_id"] == root["span_id"]
+    assert by_name["provider"]["attributes"] == {"provider": "cobalt", "bytes": 10}
+    assert by_name["http"]["status"] == "error"
+    assert by_name["http"]["error"] == "ValueError: boom"
+
+
+def test_span_outside_trace_is_noop():
+    with tracing.span("http") as span:
+        assert span is None
+
+
+def test_buffer_limit_drops_extra_spans(tmp_path):
+    exporter = JsonLinesExporter(str(tmp_path / "t.jsonl"), max_buffer=2)
+    tracer = Tracer(exporter, sample_rate=1.0, max_spans=100)
+    for _ in range(3):
+        with tracer.trace("job"):
+            pass
+    assert exporter.dropped == 1
@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from url_canonical import UrlCanonicalizer, normalize_url
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("https://youtu.be/dQw4w9WgXcQ?si=abc", "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://m.youtube.com/shorts/dQw4w9WgXcQ", "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("http://youtube.com/watch?feature=share&v=dQw4w9WgXcQ", "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+    ("https://www.instagram.com/reels/Cabc123/?igshid=xyz", "https://www.instagram.com/reel/Cabc123"),
+    ("https://vm.tiktok.com/ZM123/", "https://www.tiktok.com/ZM123"),
+    ("https://www.tiktok.com/@user/video/123?is_from_webapp=1&sender_device=pc", "https://www.tiktok.com/@user/video/123"),
+    ("https://x.com/user/status/1?s=20", "https://www.x.com/user/status/1"),
+    ("https://example.com/v/1/?utm_source=tg&b=2&a=1#t=10", "https://example.com/v/1?a=1&b=2"),
+])
+def test_normalize_url(url, canonical):
+    assert normalize_url(url) == canonical
+
+
+class FakeResponse:
+    def __init__(self, status: int, url: str):
+        self.status = status
+        self.url = url
+
+
+class FakeHttp:
+    """Редиректы коротких ссылок: HEAD не поддерживается, GET раскрывает."""
+
+    def __init__(self, redirects: dict):
+        self.redirects = redirects
+        self.calls = []
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        if method == "HEAD":
+            yield FakeResponse(405, url)
+        else:
+            yield FakeResponse(200, self.redirects.get(url, url))
+
+
+def test_short_link_is_resolved_once_and_cached():
+    http = FakeHttp({"https://vt.tiktok.com/ZSabc/": "https://www.tiktok.com/@u/video/42?_r=1&u_code=x"})
+    canonicalizer = UrlCanonicalizer(http=http, max_cached=10)
+
+    async def scenario():
+        first = await canonicalizer.canonicalize("https://vt.tiktok.com/ZSabc/")
+        second = await canonicalizer.canonicalize("https://vt.tiktok.com/ZSabc/")
+        plain = await canonicalizer.canonicalize("https://www.tiktok.com/@u/video/42")
+        return first, second, plain
+
+    first, second, plain = asyncio.run(scenario())
+    assert first == second == plain == "https://www.tiktok.com/@u/video/42"
+    assert http.calls == [("HEAD", "https://vt.tiktok.com/ZSabc/"), ("GET", "https://vt.tiktok.com/ZSabc/")]
+
+
+def test_resolve_failure_keeps_original_url():
+    class BrokenHttp:
+        @contextlib.asynccontextmanager
+        async def request(self, method, url, **kwargs):
+            raise OSError("network down")
+            yield
+
+    canonicalizer = UrlCanonicalizer(http=BrokenHttp())
+    assert asyncio.run(canonicalizer.canonicalize("https://pin.it/abc")) == "https://pin.it/abc"
@@ -0,0 +1,333 @@
+"""
+Трассировка задач: одна трасса на запрос пользователя, вложенные span'ы
+на попытки провайдеров, зеркала в гонке, HTTP-запросы, редиректы,
+фазы yt-dlp и отправку в Telegram. Завершенная трасса уходит в экспортер:
+JSON-lines файл (строка на span) или коллектор OTLP/HTTP (JSON).
+Вне трассы span() ничего не делает - модули вызывают его без проверок.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Отрезок работы внутри трассы (время - unix, сек.)."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "events", "start", "end", "status", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: str | None, attributes: dict, start: float | None = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.events: list[tuple[float, str, dict]] = []
+        self.start = start or time.time()
+        self.end: float | None = None
+        self.status = "ok"
+        self.error: str | None = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name: str, **attributes):
+        self.events.append((time.time(), name, attributes))
+
+    def fail(self, error: str, status: str = "error"):
+        self.status = status
+        self.error = error[:300]
+
+    def finish(self, end: float | None = None):
+        if self.end is None:
+            self.end = end or time.time()
+            self.trace.add(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(((self.end or self.start) - self.start) * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": [{"time": round(t, 6), "name": n, "attributes": a} for t, n, a in self.events],
+        }
+
+
+class Trace:
+    """Завершенные span'ы одной трассы (не больше max_spans - память ограничена)."""
+
+    def __init__(self, max_spans: int):
+        self.trace_id = os.urandom(16).hex()
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        self.dropped = 0
+
+    def add(self, span: Span):
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Вложенный span текущей трассы на время блока `with`.
+    Исключение помечает span ошибкой, отмена (проигравший в гонке) - cancelled.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except asyncio.CancelledError:
+        current.fail("cancelled", status="cancelled")
+        raise
+    except Exception as e:
+        current.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.finish()
+        _current.reset(token)
+
+
+def add_span(name: str, start: float, end: float, **attributes):
+    """Готовый span с известными началом и концом (фазы, измеренные в другом процессе)."""
+    parent = _current.get()
+    if parent is not None and start and end and end >= start:
+        Span(parent.trace, name, parent.span_id, attributes, start=start).finish(end)
+
+
+def annotate(**attributes):
+    """Дописывает атрибуты в текущий span (вне трассы - ничего)."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+class JsonLinesExporter:
+    """
+    Дописывает span'ы в файл, по JSON-объекту на строку. Как и OTLP - пачками
+    раз в interval, запись файла идет в потоке, а не в event loop.
+    """
+
+    def __init__(
+        self,
+        path: str = config.TRACING_JSONL_PATH,
+        interval: float = config.TRACING_EXPORT_INTERVAL,
+        max_buffer: int = config.TRACING_MAX_BUFFER,
+    ):
+        self.path = path
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self._buffer: list[Span] = []
+        self.dropped = 0
+
+    def export(self, spans: list[Span]):
+        room = self.max_buffer - len(self._buffer)
+        self._buffer.extend(spans[:max(0, room)])
+        self.dropped += max(0, len(spans) - max(0, room))
+
+    def _write(self, spans: list[Span]):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for s in spans:
+                    f.write(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Trace export to {self.path} failed: {e}")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        spans, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, spans)
+
+    async def run(self):
+        """Фоновая запись (задача из main())."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def close(self):
+        await self.flush()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class OtlpHttpExporter:
+    """
+    Пачки span'ов в коллектор по OTLP/HTTP (JSON) - OpenTelemetry Collector,
+    Jaeger, Tempo. Отправка в фоне раз в interval; не успевшие уйти
+    span'ы сверх max_buffer отбрасываются.
+    """
+
+    def __init__(
+        self,
+        url: str = config.TRACING_OTLP_URL,
+        interval: float = config.TRACING_EXPORT_INTERVAL,
+        max_buffer: int = config.TRACING_MAX_BUFFER,
+        service_name: str = config.TRACING_SERVICE_NAME,
+    ):
+        self.url = url
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.service_name = service_name
+        self._buffer: list[Span] = []
+        self._session: aiohttp.ClientSession | None = None
+        self.dropped = 0
+
+    def export(self, spans: list[Span]):
+        room = self.max_buffer - len(self._buffer)
+        self._buffer.extend(spans[:max(0, room)])
+        self.dropped += max(0, len(spans) - max(0, room))
+
+    def _payload(self, spans: list[Span]) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "savebot"},
+                "spans": [{
+                    "traceId": s.trace.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or "",
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(int(s.start * 1e9)),
+                    "endTimeUnixNano": str(int((s.end or s.start) * 1e9)),
+                    "attributes": _otlp_attributes(s.attributes),
+                    "events": [
+                        {"timeUnixNano": str(int(t * 1e9)), "name": n, "attributes": _otlp_attributes(a)}
+                        for t, n, a in s.events
+                    ],
+                    "status": {"code": 1} if s.status == "ok" else {"code": 2, "message": s.error or s.status},
+                } for s in spans],
+            }],
+        }]}
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        spans, self._buffer = self._buffer, []
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.post(self.url, json=self._payload(spans)) as response:
+                if response.status >= 300:
+                    logger.warning(f"OTLP export failed: status {response.status}")
+        except Exception as e:
+            logger.warning(f"OTLP export failed: {str(e)[:200]}")
+
+    async def run(self):
+        """Фоновая отправка (задача из main())."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def close(self):
+        await self.flush()
+        if self._session is not None:
+            await self._session.close()
+
+
+EXPORTERS = {
+    "jsonl": JsonLinesExporter,
+    "otlp": OtlpHttpExporter,
+}
+
+
+def create_exporter(name: str = config.TRACING_EXPORTER):
+    """Создает экспортер по имени из конфига ("none" - трассировка выключена)."""
+    if name == "none":
+        return None
+    try:
+        return EXPORTERS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный TRACING_EXPORTER: {name}")
+
+
+class Tracer:
+    """Начинает трассы и отдает завершенные в экспортер."""
+
+    def __init__(
+        self,
+        exporter=None,
+        sample_rate: float = config.TRACING_SAMPLE_RATE,
+        max_spans: int = config.TRACING_MAX_SPANS_PER_TRACE,
+    ):
+        self.exporter = exporter if exporter is not None else create_exporter()
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        self.traces = 0
+
+    @contextlib.contextmanager
+    def trace(self, name: str, **attributes):
+        """Корневой span новой трассы; по выходу вся трасса экспортируется."""
+        if self.exporter is None or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = Trace(self.max_spans)
+        root = Span(trace, name, None, attributes)
+        token = _current.set(root)
+        try:
+            yield root
+        except asyncio.CancelledError:
+            root.fail("cancelled", status="cancelled")
+            raise
+        except Exception as e:
+            root.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            if trace.dropped:
+                root.set(dropped_spans=trace.dropped)
+            # Корень пишется всегда, даже если лимит span'ов исчерпан
+            root.end = time.time()
+            trace.spans.append(root)
+            self.traces += 1
+            self.exporter.export(trace.spans)
+
+    async def run(self):
+        if self.exporter is not None:
+            await self.exporter.run()
+
+    async def close(self):
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    def format_stats(self) -> str:
+        if self.exporter is None:
+            return "off"
+        return f"{config.TRACING_EXPORTER}, traces={self.traces}"
@@ -0,0 +1,123 @@
+"""
+Запись живого трафика callback_handler для воспроизведения в бенчмарках
+(benchmarks.replay). На запрос - строка TSV: время, платформа, хеш
+каноничной ссылки, формат, итог и задержка. Сами ссылки и пользователи
+не пишутся: хеш с солью только позволяет отличить повторы одной ссылки
+(кеш, объединение запросов) от разных.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+
+import config
+
+logger = logging.getLogger(__name__)
+
+HEADER = "#savebot-traffic v1\tts\tplatform\turl_hash\tformat\toutcome\tlatency_ms"
+
+
+class TrafficRecord:
+    """Один запрос пользователя (ts - unix, сек.; latency - от кнопки до итога)."""
+
+    __slots__ = ("ts", "platform", "url_hash", "format_type", "outcome", "latency")
+
+    def __init__(self, ts: float, platform: str, url_hash: str, format_type: str, outcome: str, latency: float):
+        self.ts = ts
+        self.platform = platform
+        self.url_hash = url_hash
+        self.format_type = format_type
+        self.outcome = outcome
+        self.latency = latency
+
+    def to_line(self) -> str:
+        return (
+            f"{self.ts:.3f}\t{self.platform}\t{self.url_hash}\t{self.format_type}"
+            f"\t{self.outcome}\t{round(self.latency * 1000)}\n"
+        )
+
+    @classmethod
+    def from_line(cls, line: str) -> "TrafficRecord":
+        ts, platform, url_hash, format_type, outcome, latency_ms = line.rstrip("\n").split("\t")
+        return cls(float(ts), platform, url_hash, format_type, outcome, int(latency_ms) / 1000)
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_records(path: str) -> list[TrafficRecord]:
+    """Записи из файла по времени (несколько сессий записи в одном файле - подряд)."""
+    records = []
+    with _open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            try:
+                records.append(TrafficRecord.from_line(line))
+            except ValueError:
+                logger.warning(f"{path}:{number}: skipped malformed record")
+    records.sort(key=lambda r: r.ts)
+    return records
+
+
+class TrafficRecorder:
+    """
+    Копит записи в памяти и дописывает в файл пачками по flush_every
+    (.gz - сжатый файл, пачка - отдельный gzip-член). Соль по умолчанию
+    случайная на процесс: хеши разных запусков не сопоставить.
+    """
+
+    def __init__(
+        self,
+        path: str = config.TRAFFIC_RECORD_PATH,
+        enabled: bool = config.TRAFFIC_RECORD_ENABLED,
+        sample_rate: float = config.TRAFFIC_RECORD_SAMPLE_RATE,
+        salt: str = config.TRAFFIC_RECORD_SALT,
+        flush_every: int = config.TRAFFIC_RECORD_FLUSH_EVERY,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self.flush_every = flush_every
+        self._buffer: list[TrafficRecord] = []
+        self.recorded = 0
+
+    def url_hash(self, canonical_url: str) -> str:
+        return hashlib.sha256(self._salt + canonical_url.encode()).hexdigest()[:16]
+
+    def record(self, platform: str | None, canonical_url: str, format_type: str, ts: float, outcome: str, latency: float):
+        if not self.enabled:
+            return
+        url_hash = self.url_hash(canonical_url)
+        # Выборка по ссылке, а не по запросу: повторы попавшей ссылки пишутся все
+        if int(url_hash[:8], 16) >= self.sample_rate * 0x100000000:
+            return
+        self._buffer.append(TrafficRecord(
+            ts, platform or "other", url_hash, format_type, outcome, max(0.0, latency)
+        ))
+        self.recorded += 1
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        try:
+            new_file = not os.path.exists(self.path)
+            with _open(self.path, "a") as f:
+                if new_file:
+                    f.write(HEADER + "\n")
+                f.writelines(r.to_line() for r in records)
+        except OSError as e:
+            logger.warning(f"Traffic record to {self.path} failed: {e}")
+
+    def format_stats(self) -> str:
+        if not self.enabled:
+            return "off"
+        return f"{self.path}, records={self.recorded}"
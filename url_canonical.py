@@ -0,0 +1,135 @@
+"""
+Каноническая форма ссылок: одна и та же публикация - один ключ
+для кеша результатов и объединения одинаковых запросов.
+Убирает трекинговые параметры, раскрывает короткие ссылки
+(короткие домены платформ из routing), сводит shorts к watch.
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+
+import config
+import routing
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые не влияют на контент
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "igshid", "igsh", "si", "feature", "ref", "ref_src", "ref_url",
+    "_r", "_t", "is_from_webapp", "sender_device", "sender_web_id", "is_copy_url",
+    "mibextid", "tt_from", "u_code", "embeds_referring_euri",
+}
+TRACKING_PREFIXES = ("utm_", "share_", "__")
+
+# Какие query-параметры значимы для платформы (остальные отбрасываются)
+KEEP_PARAMS = {
+    "youtube.com": {"v"},
+    "tiktok.com": set(),
+    "instagram.com": set(),
+    "pinterest.com": set(),
+    "facebook.com": {"v", "story_fbid", "id", "fbid"},
+    "twitter.com": set(),
+    "x.com": set(),
+    "vk.com": {"z"},
+    "reddit.com": set(),
+    "vimeo.com": set(),
+}
+
+_YT_ID = re.compile(r"^[0-9A-Za-z_-]{11}$")
+
+
+def _base_domain(host: str) -> str:
+    """www.m.youtube.com -> youtube.com (только для известных платформ)."""
+    for domain in KEEP_PARAMS:
+        if host == domain or host.endswith("." + domain):
+            return domain
+    return host
+
+
+def normalize_url(url: str) -> str:
+    """Синхронная нормализация без сетевых запросов."""
+    parts = urlsplit(url.strip())
+    scheme = "https" if parts.scheme in ("http", "https", "") else parts.scheme
+    host = parts.hostname or ""
+    path = parts.path or "/"
+    query = parse_qsl(parts.query, keep_blank_values=False)
+
+    # YouTube: youtu.be/ID, /shorts/ID, /embed/ID, /live/ID -> watch?v=ID
+    if host == "youtu.be" or host.endswith(".youtu.be"):
+        video_id = path.strip("/").split("/")[0]
+        if _YT_ID.match(video_id):
+            return f"https://www.youtube.com/watch?v={video_id}"
+    domain = _base_domain(host)
+    if domain == "youtube.com":
+        segments = path.strip("/").split("/")
+        if len(segments) >= 2 and segments[0] in ("shorts", "embed", "live", "v") and _YT_ID.match(segments[1]):
+            return f"https://www.youtube.com/watch?v={segments[1]}"
+        video_id = dict(query).get("v", "")
+        if path.rstrip("/") == "/watch" and _YT_ID.match(video_id):
+            return f"https://www.youtube.com/watch?v={video_id}"
+
+    if domain in KEEP_PARAMS:
+        host = f"www.{domain}"
+        keep = KEEP_PARAMS[domain]
+        query = [(k, v) for k, v in query if k in keep]
+        if domain == "instagram.com":
+            # /reels/ и /reel/ - одна и та же публикация
+            path = re.sub(r"^/reels/", "/reel/", path)
+    else:
+        query = [
+            (k, v) for k, v in query
+            if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+        ]
+
+    if len(path) > 1:
+        path = path.rstrip("/")
+    port = f":{parts.port}" if parts.port and parts.port not in (80, 443) else ""
+    return urlunsplit((scheme, host + port, path, urlencode(sorted(query)), ""))
+
+
+class UrlCanonicalizer:
+    """Нормализация + раскрытие коротких ссылок с LRU-кешем редиректов."""
+
+    def __init__(self, http=None, max_cached: int = config.CANONICAL_CACHE_SIZE):
+        self.http = http
+        self.max_cached = max_cached
+        self._resolved: OrderedDict[str, str] = OrderedDict()
+
+    async def _resolve_short(self, url: str) -> str:
+        cached = self._resolved.get(url)
+        if cached:
+            self._resolved.move_to_end(url)
+            return cached
+
+        resolved = url
+        timeout = aiohttp.ClientTimeout(total=config.CANONICAL_RESOLVE_TIMEOUT)
+        headers = {'User-Agent': config.MOBILE_USER_AGENT}
+        try:
+            # HEAD дешевле, но часть сервисов отвечает на него ошибкой - тогда GET
+            for method in ("HEAD", "GET"):
+                async with self.http.request(
+                    method, url, headers=headers, allow_redirects=True, timeout=timeout
+                ) as response:
+                    if response.status < 400:
+                        resolved = str(response.url)
+                        break
+        except Exception as e:
+            logger.warning(f"Short URL resolve failed for {url}: {str(e)[:100]}")
+            return url
+
+        if resolved == url:
+            return url
+        self._resolved[url] = resolved
+        while len(self._resolved) > self.max_cached:
+            self._resolved.popitem(last=False)
+        return resolved
+
+    async def canonicalize(self, url: str) -> str:
+        """Каноническая ссылка (при необходимости - с раскрытием редиректа)."""
+        if routing.is_short_host(routing.host_of(url)) and self.http is not None:
+            url = await self._resolve_short(url.strip())
+        return normalize_url(url)